@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -84,6 +86,12 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Take the write lock when a transaction starts so that booking
+            # overlap checks and inserts are serialized between workers.
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
@@ -142,10 +150,78 @@ ADMINS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # Only views with a ``throttle_scope`` are limited; see api.throttling.
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.ScopedTokenBucketThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'login': '10/min',
+        'login_account': '5/min',
+        'booking': '30/min',
+        'public_booking': '5/min',
+        'search': '120/min',
+    },
 }
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'haircut',
+    },
+    # Calendar versions must be seen by every worker process of the host, or a
+    # booking made in one would leave the others serving stale pages.
+    'calendar': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'haircut-calendar'),
+        'OPTIONS': {'MAX_ENTRIES': 100_000},
+    },
+    # Resolved API tokens, so a deleted token or deactivated user is dropped in every worker at once.
+    'tokens': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'haircut-tokens'),
+        'OPTIONS': {'MAX_ENTRIES': 100_000},
+    },
+    # Throttle buckets must be seen by every worker process of the host.
+    'throttle': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'haircut-throttle'),
+        'OPTIONS': {'MAX_ENTRIES': 100_000},
+    },
+}
+
+THROTTLE_CACHE = 'throttle'
+# Lock files that make the read and update of a throttle bucket atomic across processes.
+THROTTLE_LOCK_DIR = os.path.join(tempfile.gettempdir(), 'haircut-throttle-locks')
+CALENDAR_VERSION_CACHE = 'calendar'
+TOKEN_CACHE = 'tokens'
+
+# Tests swap every cache for a private in-memory one instead of the shared directories above.
+TEST_RUNNER = 'HairCut_1.test_runner.LocalCacheTestRunner'
+
+# Calendar entries are invalidated by per-master version bumps; the timeout only bounds memory use.
+CALENDAR_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Resolved API tokens are dropped on changes by signals; the timeout only bounds how long unused ones are kept.
+TOKEN_CACHE_TIMEOUT = 60
+
+# Anonymous public API: how many days ahead clients may book, and how long listings
+# and precomputed availability are served from the cache.
+PUBLIC_BOOKING_DAYS = 14
+PUBLIC_CACHE_TIMEOUT = 60
+
+# Delta sync tombstones are purged after this many days; older sync tokens get 410 and a full resync.
+SYNC_TOMBSTONE_RETENTION_DAYS = 30
+
+# Live calendar updates hold a connection per open page and need the ASGI server
+# (HairCut_1.asgi); under WSGI every stream would pin a worker thread for good.
+CALENDAR_EVENTS_ENABLED = False
+
+# Shared append-only file that fans calendar events out to every worker process;
+# leave unset to deliver events only within the process that produced them.
+CALENDAR_EVENTS_BROKER_PATH = None
@@ -0,0 +1,31 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class LocalCacheTestRunner(DiscoverRunner):
+    """Run the tests with every cache alias in process memory.
+
+    The file-based caches and throttle locks are shared by all processes of
+    the host; tests clearing them would wipe the state of running servers.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._lock_dir = tempfile.mkdtemp(prefix="haircut-test-locks-")
+        self._local_caches = override_settings(
+            THROTTLE_LOCK_DIR=self._lock_dir,
+            CACHES={
+                alias: {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": f"test-{alias}"}
+                for alias in settings.CACHES
+            }
+        )
+        self._local_caches.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._local_caches.disable()
+        shutil.rmtree(self._lock_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
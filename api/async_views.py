@@ -0,0 +1,158 @@
+"""Async versions of the hottest read endpoints.
+
+DRF dispatches synchronously, so under ASGI every API request occupies a
+worker thread. These views authenticate and query with the async ORM and
+return the same JSON as their DRF counterparts in ``api.views``.
+"""
+
+from datetime import timedelta
+
+from django.contrib.auth.models import AnonymousUser
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views import View
+from rest_framework.request import Request
+
+from calendarapp import cache as calendar_cache
+from calendarapp.occupancy import afree_slots
+from calendarapp.models import Appointment
+from calendarapp.ranges import local_date_range
+from calendarapp.recurrence import aexpand_series, with_occurrences
+from clients.models import Client
+
+from .authentication import aget_token
+from .pagination import KeysetPagination
+from .permissions import IsMasterUser
+from .serializers import (
+    AppointmentFilterSerializer,
+    AppointmentSerializer,
+    AvailabilityQuerySerializer,
+    ClientSerializer,
+    FreeSlotSerializer,
+    MasterProfileSerializer,
+    serialize_calendar_items,
+)
+from .views import filter_appointments, filter_occurrences
+
+
+def json_response(data, status=200):
+    return JsonResponse(data, status=status, safe=False, json_dumps_params={"ensure_ascii": False})
+
+
+async def aauthenticate(request):
+    """User of a ``Token`` header or the session, like the DRF authentication classes."""
+    keyword, _, key = request.headers.get("Authorization", "").partition(" ")
+    if keyword == "Token" and key.strip():
+        token = await aget_token(key.strip())
+        if token is None or not token.user.is_active:
+            return AnonymousUser()
+        return token.user
+    return await request.auser()
+
+
+class AsyncMasterAPIView(View):
+    """Base of the async API views: authentication and ``IsMasterUser`` without DRF dispatch."""
+
+    permission_classes = [IsMasterUser]
+    http_method_names = ["get", "head", "options"]
+
+    async def dispatch(self, request, *args, **kwargs):
+        request.user = await aauthenticate(request)
+        for permission in (permission_class() for permission_class in self.permission_classes):
+            if await permission.ahas_permission(request, self):
+                continue
+            if not request.user.is_authenticated:
+                response = json_response({"detail": "Authentication credentials were not provided."}, status=401)
+                response["WWW-Authenticate"] = "Token"
+                return response
+            return json_response({"detail": "You do not have permission to perform this action."}, status=403)
+        return await super().dispatch(request, *args, **kwargs)
+
+    async def conditional(self, request, build):
+        """Answer with 304 when the master's calendar is unchanged, else with ``await build()``."""
+        master_id = request.user.masterprofile.pk
+        etag = quote_etag(
+            await calendar_cache.aget_etag(master_id, request.get_full_path(), request.META.get("HTTP_ACCEPT", ""))
+        )
+        last_modified = int((await calendar_cache.aget_changed_at(master_id)).timestamp())
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = await build()
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        return response
+
+
+class AsyncAppointmentListView(AsyncMasterAPIView):
+    """Async ``GET /api/appointments/`` with the same filters, pagination and caching."""
+
+    async def get(self, request):
+        filters = AppointmentFilterSerializer(data=request.GET)
+        if not filters.is_valid():
+            return json_response(filters.errors, status=400)
+        return await self.conditional(request, lambda: self._build(request, filters.validated_data))
+
+    async def _build(self, request, params):
+        master = request.user.masterprofile
+        name = calendar_cache.make_name("api:async:appointments", request.GET.urlencode())
+        data = await calendar_cache.aget_or_compute(master.pk, name, lambda: self._list(request, master, params))
+        return json_response(data)
+
+    async def _list(self, request, master, params):
+        queryset = filter_appointments(
+            Appointment.objects.filter(master=master).select_related("client").order_by("starts_at", "id"),
+            params,
+        )
+        if "first_day" not in params:
+            paginator = KeysetPagination()
+            page = await paginator.apaginate_queryset(queryset, Request(request))
+            return {"next": paginator.get_next_link(), "results": AppointmentSerializer(page, many=True).data}
+
+        window = local_date_range(params["first_day"], params["last_day"])
+        appointments = [appointment async for appointment in queryset.aiterator()]
+        occurrences = filter_occurrences(await aexpand_series([master.pk], *window), params)
+        return {"next": None, "results": serialize_calendar_items(with_occurrences(appointments, occurrences))}
+
+
+class AsyncMasterProfileView(AsyncMasterAPIView):
+    async def get(self, request):
+        async def build():
+            return json_response(MasterProfileSerializer(request.user.masterprofile).data)
+
+        return await self.conditional(request, build)
+
+
+class AsyncMasterAvailabilityView(AsyncMasterAPIView):
+    async def get(self, request):
+        query = AvailabilityQuerySerializer(data=request.GET)
+        if not query.is_valid():
+            return json_response(query.errors, status=400)
+        service_date = query.validated_data["date"]
+        duration = timedelta(minutes=query.validated_data["duration"])
+        slots = [
+            {"starts_at": slot, "ends_at": slot + duration}
+            for slot in await afree_slots(request.user.masterprofile, service_date, duration)
+        ]
+        return json_response(
+            {
+                "date": service_date.isoformat(),
+                "duration_minutes": query.validated_data["duration"],
+                "slots": FreeSlotSerializer(slots, many=True).data,
+            }
+        )
+
+
+class AsyncClientDetailView(AsyncMasterAPIView):
+    async def get(self, request, pk):
+        master = request.user.masterprofile
+        clients = Client.objects.filter(master_links__master=master)
+
+        async def build():
+            try:
+                client = await clients.aget(pk=pk)
+            except Client.DoesNotExist:
+                return json_response({"detail": "No Client matches the given query."}, status=404)
+            return json_response(ClientSerializer(client).data)
+
+        return await self.conditional(request, build)
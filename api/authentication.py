@@ -0,0 +1,82 @@
+"""Token authentication that keeps resolved tokens in the cache.
+
+``TokenAuthentication`` joins the token to its user on every request, and
+the permission check and views then load the master profile. Here the token
+is read once with the user, profile and profession and kept for
+``TOKEN_CACHE_TIMEOUT`` seconds, so ``request.user.masterprofile`` costs
+no query on later requests. Entries are keyed by a digest of the token and
+live in the host-shared ``TOKEN_CACHE``, so when ``api.signals`` drops them
+after the token, user or profile changes, no worker process keeps
+accepting the old token.
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+TOKEN_KEY = "auth:token:{digest}"
+USER_TOKEN_KEY = "auth:user:{user_id}"
+
+
+def _store():
+    return caches[settings.TOKEN_CACHE]
+
+
+def token_cache_key(key):
+    return TOKEN_KEY.format(digest=hashlib.sha256(key.encode()).hexdigest())
+
+
+def _tokens():
+    return Token.objects.select_related("user", "user__masterprofile", "user__masterprofile__profession")
+
+
+def _entries(token):
+    cache_key = token_cache_key(token.key)
+    return {cache_key: token, USER_TOKEN_KEY.format(user_id=token.user_id): cache_key}
+
+
+def get_token(key):
+    """Token of ``key`` with its user and master profile loaded, or ``None``."""
+    store = _store()
+    token = store.get(token_cache_key(key))
+    if token is None:
+        token = _tokens().filter(key=key).first()
+        if token is not None:
+            store.set_many(_entries(token), timeout=settings.TOKEN_CACHE_TIMEOUT)
+    return token
+
+
+async def aget_token(key):
+    """Async version of ``get_token``."""
+    store = _store()
+    token = await store.aget(token_cache_key(key))
+    if token is None:
+        token = await _tokens().filter(key=key).afirst()
+        if token is not None:
+            await store.aset_many(_entries(token), timeout=settings.TOKEN_CACHE_TIMEOUT)
+    return token
+
+
+def forget_user(user_id, key=None):
+    """Drop the cached token of the user, e.g. after their profile changed."""
+    store = _store()
+    user_key = USER_TOKEN_KEY.format(user_id=user_id)
+    stale = {user_key, store.get(user_key), key and token_cache_key(key)}
+    store.delete_many([cache_key for cache_key in stale if cache_key])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """``TokenAuthentication`` reading tokens through ``get_token``."""
+
+    def authenticate_credentials(self, key):
+        token = get_token(key)
+        if token is None:
+            raise exceptions.AuthenticationFailed(_("Invalid token."))
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_("User inactive or deleted."))
+        return token.user, token
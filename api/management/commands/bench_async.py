@@ -0,0 +1,107 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+ENDPOINTS = {
+    "appointments": ("api:appointment-list", "api:async-appointment-list"),
+    "availability": ("api:master-availability", "api:async-master-availability"),
+    "profile": ("api:master-profile", "api:async-master-profile"),
+}
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare requests/sec and p99 latency of an API endpoint served by the sync views "
+        "under WSGI, the sync views under ASGI and the async views under ASGI, in-process."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("email", help="E-mail of the master whose data is requested.")
+        parser.add_argument("--endpoint", choices=sorted(ENDPOINTS), default="appointments")
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--concurrency", type=int, default=20)
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(email=options["email"])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"User {options['email']} does not exist.")
+        token, _ = Token.objects.get_or_create(user=user)
+        headers = {"authorization": f"Token {token.key}"}
+        sync_name, async_name = ENDPOINTS[options["endpoint"]]
+        params = {"date": timezone.localdate().isoformat()} if options["endpoint"] == "availability" else {}
+        total, concurrency = options["requests"], options["concurrency"]
+
+        # The in-process test clients always send "Host: testserver".
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+            runs = [
+                ("WSGI, sync views", self._run_wsgi(reverse(sync_name), params, headers, total, concurrency)),
+                ("ASGI, sync views", self._run_asgi(reverse(sync_name), params, headers, total, concurrency)),
+                ("ASGI, async views", self._run_asgi(reverse(async_name), params, headers, total, concurrency)),
+            ]
+        self.stdout.write(f"{'server':<20}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+        for label, (elapsed, latencies) in runs:
+            self.stdout.write(
+                f"{label:<20}{len(latencies) / elapsed:>10.1f}"
+                f"{percentile(latencies, 0.5) * 1000:>10.1f}{percentile(latencies, 0.99) * 1000:>10.1f}"
+            )
+
+    def _run_wsgi(self, path, params, headers, total, concurrency):
+        def worker(count):
+            client = Client()
+            latencies = []
+            try:
+                for _ in range(count):
+                    started = time.perf_counter()
+                    response = client.get(path, params, headers=headers)
+                    latencies.append(time.perf_counter() - started)
+                    self._check(path, response)
+            finally:
+                connection.close()
+            return latencies
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(worker, self._split(total, concurrency)))
+        return time.perf_counter() - started, [latency for result in results for latency in result]
+
+    def _run_asgi(self, path, params, headers, total, concurrency):
+        async def worker(count):
+            client = AsyncClient()
+            latencies = []
+            for _ in range(count):
+                started = time.perf_counter()
+                response = await client.get(path, params, headers=headers)
+                latencies.append(time.perf_counter() - started)
+                self._check(path, response)
+            return latencies
+
+        async def run():
+            return await asyncio.gather(*(worker(count) for count in self._split(total, concurrency)))
+
+        started = time.perf_counter()
+        results = asyncio.run(run())
+        return time.perf_counter() - started, [latency for result in results for latency in result]
+
+    @staticmethod
+    def _split(total, concurrency):
+        return [total // concurrency + (index < total % concurrency) for index in range(concurrency)]
+
+    @staticmethod
+    def _check(path, response):
+        if response.status_code != 200:
+            raise CommandError(f"{path} answered {response.status_code}: {response.content[:200]!r}")
@@ -0,0 +1,92 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination that seeks past the last ``(starts_at, id)`` seen.
+
+    Unlike OFFSET pagination the cost of a page does not grow with its depth,
+    and rows inserted before the cursor never shift the following pages.
+    """
+
+    ordering = ("starts_at", "id")
+    page_size = 100
+    max_page_size = 500
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        return self.set_page([row async for row in self.page_queryset(queryset, request)])
+
+    def page_queryset(self, queryset, request):
+        """Unevaluated query for the requested page plus one row to detect a next page."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        field = self.ordering[0].lstrip("-")
+        queryset = queryset.order_by(*self.ordering)
+
+        position = self.decode_cursor(request)
+        if position is not None:
+            value, pk = position
+            lookup = "lt" if self.ordering[0].startswith("-") else "gt"
+            queryset = queryset.filter(
+                Q(**{f"{field}__{lookup}": value}) | Q(**{field: value, f"pk__{lookup}": pk})
+            )
+
+        return queryset[: self.page_size + 1]
+
+    def set_page(self, rows):
+        self.has_next = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+        field = self.ordering[0].lstrip("-")
+        self.next_position = (getattr(rows[-1], field), rows[-1].pk) if self.has_next else None
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            requested = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(requested, self.max_page_size))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            raw_value, raw_pk = urlsafe_b64decode(encoded.encode("ascii")).decode("ascii").rsplit("|", 1)
+            return datetime.fromisoformat(raw_value), int(raw_pk)
+        except (BinasciiError, UnicodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position):
+        value, pk = position
+        encoded = urlsafe_b64encode(f"{value.isoformat()}|{pk}".encode("ascii")).decode("ascii")
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return self.encode_cursor(self.next_position)
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+
+class RecentFirstKeysetPagination(KeysetPagination):
+    ordering = ("-starts_at", "-id")
+
+
+class LastVisitKeysetPagination(KeysetPagination):
+    ordering = ("-last_visit", "-id")
@@ -1,5 +1,7 @@
 from rest_framework.permissions import BasePermission
 
+from masters.models import MasterProfile
+
 
 class IsMasterUser(BasePermission):
     """Allow access only to authenticated users with a master profile."""
@@ -8,3 +10,28 @@ class IsMasterUser(BasePermission):
         user = request.user
         return bool(user and user.is_authenticated and hasattr(user, "masterprofile"))
 
+    async def ahas_permission(self, request, view):
+        """Async check for the views in ``api.async_views``.
+
+        Loads the profile with the async ORM and caches it on the user, so
+        ``user.masterprofile`` is available afterwards without a query. Users
+        of a cached token come with the profile already.
+        """
+        user = request.user
+        if not (user and user.is_authenticated):
+            return False
+        if type(user).masterprofile.is_cached(user):
+            return hasattr(user, "masterprofile")
+        try:
+            user.masterprofile = await MasterProfile.objects.select_related("profession").aget(user=user)
+        except MasterProfile.DoesNotExist:
+            return False
+        return True
+
+
+class IsStaffOrMaster(BasePermission):
+    """Allow staff and masters, e.g. to answer a client on the phone."""
+
+    def has_permission(self, request, view):
+        user = request.user
+        return bool(user and user.is_authenticated and (user.is_staff or hasattr(user, "masterprofile")))
@@ -0,0 +1,149 @@
+"""Anonymous client-facing API: listings, availability and booking.
+
+Listings are cached for ``PUBLIC_CACHE_TIMEOUT`` as a whole. Availability
+reads a per-master snapshot of the next ``PUBLIC_BOOKING_DAYS`` days that
+is computed once and dropped with the master's calendar version, so
+repeated reads cost no queries and only the first one after a booking goes
+to the database. Bookings take the same overlap-safe path as the master's
+own ``AppointmentViewSet.create``.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import NotFound
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from calendarapp import cache as calendar_cache
+from calendarapp import occupancy
+from calendarapp.availability import busy_intervals
+from calendarapp.availability import free_slots as free_slots_by_intervals
+from calendarapp.booking import AppointmentConflict
+from calendarapp.ranges import local_date_range
+from masters.models import MasterProfile, Profession
+
+from .serializers import (
+    FreeSlotSerializer,
+    ProfessionSerializer,
+    PublicAvailabilityQuerySerializer,
+    PublicBookingResultSerializer,
+    PublicBookingSerializer,
+    PublicMasterSerializer,
+)
+from .throttling import AddressTokenBucketThrottle
+from .views import create_booking
+
+PROFESSIONS_KEY = "public:professions"
+MASTERS_KEY = "public:masters:{profession}"
+
+
+def active_masters():
+    return MasterProfile.objects.filter(status=MasterProfile.Status.ACTIVE)
+
+
+def availability_snapshot(master_id, first_day):
+    """``{"master", "busy"}`` of an active master over the booking horizon, or ``None``.
+
+    ``busy`` is ``{day: mask}`` for masters on the slot grid and merged busy
+    intervals for the rest.
+    """
+    master = active_masters().filter(pk=master_id).first()
+    if master is None:
+        return None
+    last_day = first_day + timedelta(days=settings.PUBLIC_BOOKING_DAYS - 1)
+    if occupancy.is_aligned(master):
+        busy = occupancy.load_masks([master.pk], first_day, last_day)[master.pk]
+    else:
+        busy = busy_intervals([master.pk], *local_date_range(first_day, last_day))[master.pk]
+    return {"master": master, "busy": busy}
+
+
+class PublicAPIView(APIView):
+    """Base of the public views: no authentication, open to anyone."""
+
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+
+class PublicProfessionListView(PublicAPIView):
+    """Professions that have active masters."""
+
+    def get(self, request):
+        return Response(cache.get_or_set(PROFESSIONS_KEY, self._list, timeout=settings.PUBLIC_CACHE_TIMEOUT))
+
+    def _list(self):
+        professions = Profession.objects.filter(masters__status=MasterProfile.Status.ACTIVE).distinct()
+        return ProfessionSerializer(professions, many=True).data
+
+
+class PublicMasterListView(PublicAPIView):
+    """Active masters, optionally of one ``?profession=`` slug."""
+
+    def get(self, request):
+        profession = request.query_params.get("profession", "")
+        key = MASTERS_KEY.format(profession=calendar_cache.make_name(profession))
+        data = cache.get_or_set(key, lambda: self._list(profession), timeout=settings.PUBLIC_CACHE_TIMEOUT)
+        return Response(data)
+
+    def _list(self, profession):
+        masters = active_masters().select_related("user", "profession").order_by("id")
+        if profession:
+            masters = masters.filter(profession__slug=profession)
+        return PublicMasterSerializer(masters, many=True).data
+
+
+class PublicMasterAvailabilityView(PublicAPIView):
+    """Free start times of an active master on a day of the booking horizon."""
+
+    def get(self, request, pk):
+        query = PublicAvailabilityQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        service_date = query.validated_data["date"]
+        duration = timedelta(minutes=query.validated_data["duration"])
+
+        today = timezone.localdate()
+        snapshot = calendar_cache.get_or_compute(
+            pk,
+            calendar_cache.make_name("public:availability", today),
+            lambda: availability_snapshot(pk, today),
+            timeout=settings.PUBLIC_CACHE_TIMEOUT,
+        )
+        if snapshot is None:
+            raise NotFound()
+        master, busy = snapshot["master"], snapshot["busy"]
+        if occupancy.is_aligned(master):
+            starts = occupancy.free_slots_in_mask(master, service_date, busy.get(service_date, 0), duration)
+        else:
+            starts = free_slots_by_intervals(master, service_date, duration, busy)
+        now = timezone.now()
+        slots = [{"starts_at": start, "ends_at": start + duration} for start in starts if start >= now]
+        return Response(
+            {
+                "master": master.pk,
+                "date": service_date,
+                "duration_minutes": query.validated_data["duration"],
+                "slots": FreeSlotSerializer(slots, many=True).data,
+            }
+        )
+
+
+class PublicBookingView(PublicAPIView):
+    """Book a free slot with an active master; 409 if it was taken meanwhile."""
+
+    throttle_classes = [AddressTokenBucketThrottle]
+    throttle_scope = "public_booking"
+
+    def post(self, request):
+        serializer = PublicBookingSerializer(data=request.data, context={})
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        try:
+            appointment = create_booking(data["master"], data, rename_client=False)
+        except AppointmentConflict as exc:
+            return Response({"start_time": str(exc)}, status=status.HTTP_409_CONFLICT)
+        return Response(PublicBookingResultSerializer(appointment).data, status=status.HTTP_201_CREATED)
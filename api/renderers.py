@@ -0,0 +1,28 @@
+import csv
+from io import StringIO
+
+from rest_framework.renderers import BaseRenderer
+
+
+class CSVRenderer(BaseRenderer):
+    """Lets ``Accept: text/csv`` through content negotiation.
+
+    Views using it stream their CSV themselves; only error responses are
+    rendered here, one ``field,message`` row per message.
+    """
+
+    media_type = "text/csv"
+    format = "csv"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if not isinstance(data, dict):
+            data = {"detail": data}
+        out = StringIO()
+        writer = csv.writer(out)
+        for field, messages in data.items():
+            for message in messages if isinstance(messages, list) else [messages]:
+                writer.writerow([field, message])
+        return out.getvalue().encode(self.charset)
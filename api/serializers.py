@@ -1,7 +1,14 @@
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.utils import timezone
 from rest_framework import serializers
 
-from calendarapp.models import Appointment
-from clients.models import Client
+from calendarapp.analytics import MAX_RANGE_DAYS as UTILIZATION_MAX_RANGE_DAYS
+from calendarapp.availability import SLOT_STEP
+from calendarapp.models import Appointment, AppointmentSeries
+from clients.models import Client, MasterClient
+from clients.search import SEARCH_LIMIT
 from masters.models import MasterProfile, Profession
 
 
@@ -27,15 +34,43 @@ class MasterProfileSerializer(serializers.ModelSerializer):
         )
 
 
+class MasterSummarySerializer(serializers.ModelSerializer):
+    name = serializers.CharField(source="user.get_full_name", read_only=True)
+
+    class Meta:
+        model = MasterProfile
+        fields = ("id", "name", "phone")
+
+
+class PublicMasterSerializer(serializers.ModelSerializer):
+    """Master as shown to anonymous clients: no contacts, no workflow fields."""
+
+    name = serializers.CharField(source="user.get_full_name", read_only=True)
+    profession = serializers.SlugRelatedField(slug_field="slug", read_only=True)
+
+    class Meta:
+        model = MasterProfile
+        fields = ("id", "name", "profession", "about", "work_start", "work_end")
+
+
 class ClientSerializer(serializers.ModelSerializer):
     class Meta:
         model = Client
         fields = ("id", "full_name", "phone", "email", "notes")
 
 
+class MasterClientSerializer(serializers.ModelSerializer):
+    client = ClientSerializer(read_only=True)
+
+    class Meta:
+        model = MasterClient
+        fields = ("client", "first_visit", "last_visit", "visit_count", "total_minutes")
+
+
 class AppointmentSerializer(serializers.ModelSerializer):
     client = ClientSerializer(read_only=True)
     master = serializers.PrimaryKeyRelatedField(read_only=True)
+    series = serializers.PrimaryKeyRelatedField(read_only=True)
 
     class Meta:
         model = Appointment
@@ -48,10 +83,43 @@ class AppointmentSerializer(serializers.ModelSerializer):
             "client_name",
             "client_phone",
             "notes",
+            "series",
+            "occurrence_date",
         )
 
 
+class OccurrenceSerializer(AppointmentSerializer):
+    """Not yet materialized series occurrence, shaped like an appointment with a null id."""
+
+    master = serializers.IntegerField(source="master_id", read_only=True)
+    series = serializers.IntegerField(source="series_id", read_only=True)
+
+
+def serialize_calendar_items(items):
+    return [
+        (AppointmentSerializer if item.pk else OccurrenceSerializer)(item).data
+        for item in items
+    ]
+
+
+def validate_start_time(master, start_time):
+    """Check that ``start_time`` is on the master's 15-minute grid within working hours."""
+    if not (master.work_start <= start_time < master.work_end):
+        raise serializers.ValidationError(
+            {"start_time": "Время должно быть в пределах рабочего дня мастера."}
+        )
+
+    offset = datetime.combine(date.min, start_time) - datetime.combine(date.min, master.work_start)
+    if offset % SLOT_STEP:
+        raise serializers.ValidationError({"start_time": "Можно выбирать время только с шагом 15 минут."})
+
+
 class AppointmentCreateSerializer(serializers.Serializer):
+    """Booking payload; expects the master in ``context["master"]``.
+
+    Validated data gains aware ``starts_at``/``ends_at`` for the requested slot.
+    """
+
     client_name = serializers.CharField(max_length=150)
     client_phone = serializers.RegexField(regex=r"^\+?\d{10,15}$")
     notes = serializers.CharField(required=False, allow_blank=True)
@@ -59,4 +127,206 @@ class AppointmentCreateSerializer(serializers.Serializer):
     start_time = serializers.TimeField()
     duration_minutes = serializers.IntegerField(min_value=15, max_value=600)
 
+    def validate(self, attrs):
+        validate_start_time(self.context["master"], attrs["start_time"])
+        start_dt_naive = datetime.combine(attrs["service_date"], attrs["start_time"])
+        attrs["starts_at"] = timezone.make_aware(start_dt_naive, timezone.get_current_timezone())
+        attrs["ends_at"] = attrs["starts_at"] + timedelta(minutes=attrs["duration_minutes"])
+        return attrs
+
+
+class PublicBookingSerializer(AppointmentCreateSerializer):
+    """Anonymous booking: the master comes in the payload and the slot must lie within the booking horizon."""
+
+    master = serializers.PrimaryKeyRelatedField(
+        queryset=MasterProfile.objects.filter(status=MasterProfile.Status.ACTIVE)
+    )
+
+    def validate(self, attrs):
+        self.context["master"] = attrs["master"]
+        attrs = super().validate(attrs)
+        if attrs["starts_at"] < timezone.now():
+            raise serializers.ValidationError({"start_time": "Нельзя записаться на прошедшее время."})
+        if attrs["service_date"] >= timezone.localdate() + timedelta(days=settings.PUBLIC_BOOKING_DAYS):
+            raise serializers.ValidationError(
+                {"service_date": f"Запись открыта не больше чем на {settings.PUBLIC_BOOKING_DAYS} дней вперёд."}
+            )
+        return attrs
+
+
+class PublicBookingResultSerializer(serializers.ModelSerializer):
+    master = serializers.PrimaryKeyRelatedField(read_only=True)
+
+    class Meta:
+        model = Appointment
+        fields = ("id", "master", "starts_at", "ends_at")
+
+
+class AppointmentFilterSerializer(serializers.Serializer):
+    """Query parameters of the appointment list."""
+
+    MAX_RANGE_DAYS = 62
+
+    date = serializers.DateField(required=False)
+    client = serializers.IntegerField(required=False, min_value=1)
+    created_since = serializers.DateTimeField(required=False)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        # "from" is a Python keyword, so the range bounds cannot be declared as attributes.
+        fields["from"] = serializers.DateField(required=False)
+        fields["to"] = serializers.DateField(required=False)
+        return fields
+
+    def validate(self, attrs):
+        day = attrs.pop("date", None)
+        first_day = attrs.pop("from", None)
+        last_day = attrs.pop("to", None)
+        if day and (first_day or last_day):
+            raise serializers.ValidationError("Укажите либо date, либо from и to.")
+        if day:
+            first_day = last_day = day
+        elif first_day or last_day:
+            if not (first_day and last_day):
+                raise serializers.ValidationError("Для диапазона нужны оба параметра: from и to.")
+            if first_day > last_day:
+                raise serializers.ValidationError({"to": "Конец диапазона должен быть не раньше начала."})
+            if (last_day - first_day).days >= self.MAX_RANGE_DAYS:
+                raise serializers.ValidationError(
+                    {"to": f"Диапазон не может быть длиннее {self.MAX_RANGE_DAYS} дней."}
+                )
+        if first_day:
+            attrs["first_day"] = first_day
+            attrs["last_day"] = last_day
+        return attrs
+
+
+class AppointmentExportSerializer(serializers.Serializer):
+    """Optional local date bounds of the CSV export; unlike the list, the range is unlimited."""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fields["from"] = serializers.DateField(required=False)
+        fields["to"] = serializers.DateField(required=False)
+        return fields
+
+    def validate(self, attrs):
+        first_day = attrs.get("from")
+        last_day = attrs.get("to")
+        if first_day and last_day and first_day > last_day:
+            raise serializers.ValidationError({"to": "Конец диапазона должен быть не раньше начала."})
+        return {"first_day": first_day, "last_day": last_day}
+
+
+class UtilizationQuerySerializer(serializers.Serializer):
+    """Local date range of the utilization report; the last four weeks by default."""
+
+    DEFAULT_RANGE_DAYS = 28
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fields["from"] = serializers.DateField(required=False)
+        fields["to"] = serializers.DateField(required=False)
+        return fields
+
+    def validate(self, attrs):
+        last_day = attrs.get("to") or timezone.localdate()
+        first_day = attrs.get("from") or last_day - timedelta(days=self.DEFAULT_RANGE_DAYS - 1)
+        if first_day > last_day:
+            raise serializers.ValidationError({"to": "Конец диапазона должен быть не раньше начала."})
+        if (last_day - first_day).days >= UTILIZATION_MAX_RANGE_DAYS:
+            raise serializers.ValidationError(
+                {"to": f"Диапазон не может быть длиннее {UTILIZATION_MAX_RANGE_DAYS} дней."}
+            )
+        return {"first_day": first_day, "last_day": last_day}
+
+
+class AvailabilityQuerySerializer(serializers.Serializer):
+    date = serializers.DateField()
+    duration = serializers.IntegerField(min_value=15, max_value=600, default=15)
+
+
+class PublicAvailabilityQuerySerializer(AvailabilityQuerySerializer):
+    """Availability query of the public API, limited to the booking horizon."""
+
+    def validate_date(self, value):
+        today = timezone.localdate()
+        if not today <= value < today + timedelta(days=settings.PUBLIC_BOOKING_DAYS):
+            raise serializers.ValidationError(
+                f"Доступны только ближайшие {settings.PUBLIC_BOOKING_DAYS} дней, начиная с сегодняшнего."
+            )
+        return value
+
+
+class AvailabilitySearchQuerySerializer(serializers.Serializer):
+    """Query of the cross-master search; ``time`` keeps only masters free to start then."""
+
+    profession = serializers.SlugRelatedField(slug_field="slug", queryset=Profession.objects.all())
+    date = serializers.DateField()
+    duration = serializers.IntegerField(min_value=15, max_value=600, default=15)
+    time = serializers.TimeField(required=False)
+
+    def validate_date(self, value):
+        if value < timezone.localdate():
+            raise serializers.ValidationError("Нельзя искать свободное время в прошлом.")
+        return value
+
+
+class ClientSearchQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=100, trim_whitespace=True)
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=SEARCH_LIMIT)
+
+
+class FreeSlotSerializer(serializers.Serializer):
+    starts_at = serializers.DateTimeField()
+    ends_at = serializers.DateTimeField()
+
+
+class AppointmentSeriesSerializer(serializers.ModelSerializer):
+    """Recurring booking; expects the master in ``context["master"]``."""
+
+    client = ClientSerializer(read_only=True)
+    client_phone = serializers.RegexField(regex=r"^\+?\d{10,15}$")
+    duration_minutes = serializers.IntegerField(min_value=15, max_value=600)
+    interval = serializers.IntegerField(min_value=1, max_value=52, default=1)
+    rrule = serializers.CharField(read_only=True)
+
+    class Meta:
+        model = AppointmentSeries
+        fields = (
+            "id",
+            "client",
+            "client_name",
+            "client_phone",
+            "notes",
+            "start_date",
+            "start_time",
+            "duration_minutes",
+            "frequency",
+            "interval",
+            "until",
+            "rrule",
+        )
+
+    def validate(self, attrs):
+        validate_start_time(self.context["master"], attrs["start_time"])
+        if attrs.get("until") and attrs["until"] < attrs["start_date"]:
+            raise serializers.ValidationError({"until": "Дата окончания не может быть раньше начала."})
+        return attrs
+
+
+class OccurrenceEditSerializer(serializers.Serializer):
+    """Changes applied when a series occurrence becomes a real appointment."""
+
+    date = serializers.DateField()
+    start_time = serializers.TimeField(required=False)
+    duration_minutes = serializers.IntegerField(min_value=15, max_value=600, required=False)
+    notes = serializers.CharField(required=False, allow_blank=True)
 
+    def validate(self, attrs):
+        series = self.context["series"]
+        if next(series.occurrence_dates(attrs["date"], attrs["date"]), None) is None:
+            raise serializers.ValidationError({"date": "В этот день нет повторения записи."})
+        if "start_time" in attrs:
+            validate_start_time(series.master, attrs["start_time"])
+        return attrs
@@ -1,12 +1,31 @@
+import csv
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, time, timedelta
+from io import StringIO
+from time import sleep
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.test import TransactionTestCase, override_settings
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APITestCase
 
+from api.authentication import token_cache_key
+from api.throttling import ScopedTokenBucketThrottle, TokenBucket
+from api.views import SyncView, create_booking
+from calendarapp.forms import AppointmentForm
 from calendarapp.models import Appointment
-from clients.models import Client
+from clients import services as client_services
+from clients.models import Client, MasterClient
 from masters.models import MasterProfile, Profession
 
 User = get_user_model()
@@ -16,6 +35,7 @@ class AuthenticationAPITestCase(APITestCase):
     """Test token-based authentication."""
 
     def setUp(self):
+        caches[settings.THROTTLE_CACHE].clear()
         self.user = User.objects.create_user(
             email="master@test.com",
             password="testpass123",
@@ -67,6 +87,173 @@ class AuthenticationAPITestCase(APITestCase):
         self.assertIsNone(response.data.get("master_id"))
 
 
+def throttle_rates(**rates):
+    return {**settings.REST_FRAMEWORK, "DEFAULT_THROTTLE_RATES": rates}
+
+
+class ThrottlingAPITestCase(APITestCase):
+    """Test the token-bucket throttles of the auth, booking and search endpoints."""
+
+    def setUp(self):
+        caches[settings.THROTTLE_CACHE].clear()
+        self.user = User.objects.create_user(email="master@test.com", password="testpass123")
+        self.master_profile = MasterProfile.objects.create(
+            user=self.user,
+            profession=Profession.objects.create(name="Парикмахер", slug="hairdresser"),
+            phone="+71234567890",
+            work_start=time(9, 0),
+            work_end=time(18, 0),
+            status=MasterProfile.Status.ACTIVE,
+        )
+        self.url = reverse("api:auth-token")
+
+    def _login(self, username="master@test.com", address="10.0.0.1"):
+        return self.client.post(
+            self.url, {"username": username, "password": "wrongpass"}, format="json", REMOTE_ADDR=address
+        )
+
+    @override_settings(REST_FRAMEWORK=throttle_rates(login="3/min", login_account="100/min"))
+    @mock.patch.object(ScopedTokenBucketThrottle, "timer", return_value=1000.0)
+    def test_login_is_limited_per_address(self, timer):
+        """Test that an address runs out of attempts and is told when to come back."""
+        for index in range(3):
+            self.assertEqual(self._login(f"user{index}@test.com").status_code, status.HTTP_400_BAD_REQUEST)
+        response = self._login("other@test.com")
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response["Retry-After"], "20")
+        self.assertEqual(self._login(address="10.0.0.2").status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(REST_FRAMEWORK=throttle_rates(login="100/min", login_account="2/min"))
+    def test_login_is_limited_per_account(self):
+        """Test that spreading attempts on one account over addresses does not help."""
+        self._login(address="10.0.0.1")
+        self._login("Master@Test.com ", address="10.0.0.2")
+        self.assertEqual(self._login(address="10.0.0.3").status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(self._login("other@test.com", address="10.0.0.3").status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(REST_FRAMEWORK=throttle_rates(booking="1/min"))
+    @mock.patch.object(ScopedTokenBucketThrottle, "timer", return_value=1000.0)
+    def test_booking_is_limited_per_user_and_reads_are_not(self, timer):
+        """Test that only the throttled actions of a viewset spend tokens."""
+        self.client.force_authenticate(user=self.user)
+        url = reverse("api:appointment-list")
+        day = (timezone.localdate() + timedelta(days=1)).strftime("%Y-%m-%d")
+        data = {
+            "client_name": "Иван",
+            "client_phone": "+79991234567",
+            "service_date": day,
+            "start_time": "10:00",
+            "duration_minutes": 30,
+        }
+        self.assertEqual(self.client.post(url, data, format="json").status_code, status.HTTP_201_CREATED)
+        response = self.client.post(url, {**data, "start_time": "11:00"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response["Retry-After"], "60")
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+    def test_parallel_requests_cannot_share_a_token(self):
+        """Test that requests racing for the last tokens of a bucket get one each."""
+        store = caches[settings.THROTTLE_CACHE]
+
+        class SlowStore:
+            # Widens the gap between reading and writing the bucket.
+            def get(self, key, default=None):
+                value = store.get(key, default)
+                sleep(0.01)
+                return value
+
+            def set(self, key, value, timeout):
+                store.set(key, value, timeout)
+
+        bucket = TokenBucket(SlowStore(), "throttle:race", capacity=3, period=60)
+        with ThreadPoolExecutor(max_workers=10) as pool:
+            waits = list(pool.map(lambda _: bucket.take(1000), range(10)))
+        self.assertEqual(waits.count(0), 3)
+
+    def test_bucket_refills_at_the_steady_rate(self):
+        """Test that a bucket allows a burst, then one request per interval."""
+        bucket = TokenBucket(caches[settings.THROTTLE_CACHE], "throttle:test", capacity=2, period=60)
+        self.assertEqual([bucket.take(1000), bucket.take(1000)], [0, 0])
+        self.assertEqual(bucket.take(1010), 20)
+        self.assertEqual(bucket.take(1030), 0)
+        self.assertEqual(bucket.take(1031), 29)
+        self.assertEqual(bucket.take(1200), 0)
+        self.assertEqual(bucket.take(1200), 0)
+        self.assertEqual(bucket.take(1200), 30)
+
+
+class TokenCacheAPITestCase(APITestCase):
+    """Test that resolved tokens are cached with the master profile and dropped on changes."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="master@test.com", password="testpass123")
+        self.master_profile = MasterProfile.objects.create(
+            user=self.user,
+            profession=Profession.objects.create(name="Парикмахер", slug="hairdresser"),
+            phone="+71234567890",
+            work_start=time(9, 0),
+            work_end=time(18, 0),
+            status=MasterProfile.Status.ACTIVE,
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        self.url = reverse("api:master-profile")
+
+    def test_token_user_and_profile_are_read_once(self):
+        """Test that the token, user, profile and profession come from one query, then from the cache."""
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {"fresh": 1})
+        self.assertEqual(response.data["profession"]["slug"], "hairdresser")
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, {"fresh": 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_deleted_token_is_rejected(self):
+        """Test that deleting a token drops its cache entry."""
+        self.client.get(self.url)
+        self.token.delete()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_token_is_rejected_by_every_worker(self):
+        """Test that tokens live in the shared store, so one deletion reaches all processes."""
+        self.client.get(self.url)
+        entry = token_cache_key(self.token.key)
+        self.assertEqual(caches[settings.TOKEN_CACHE].get(entry), self.token)
+        # Another worker has its own local memory but reads the same shared store.
+        cache.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url, {"fresh": 1}).status_code, status.HTTP_200_OK)
+        self.token.delete()
+        self.assertIsNone(caches[settings.TOKEN_CACHE].get(entry))
+        self.assertEqual(self.client.get(self.url, {"fresh": 2}).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_profile_changes_are_seen(self):
+        """Test that saving or deleting the profile drops the cached user."""
+        self.client.get(self.url)
+        self.master_profile.about = "Стрижки"
+        self.master_profile.save()
+        self.assertEqual(self.client.get(self.url, {"fresh": 1}).data["about"], "Стрижки")
+        self.master_profile.delete()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_inactive_user_is_rejected(self):
+        """Test that deactivating the user drops the cached token."""
+        self.client.get(self.url)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_login_does_not_read_the_token_back(self):
+        """Test that the token endpoint returns the stored token and master id."""
+        caches[settings.THROTTLE_CACHE].clear()
+        self.client.credentials()
+        response = self.client.post(
+            reverse("api:auth-token"), {"username": "master@test.com", "password": "testpass123"}, format="json"
+        )
+        self.assertEqual(response.data["token"], self.token.key)
+        self.assertEqual(response.data["master_id"], self.master_profile.pk)
+
+
 class MasterProfileAPITestCase(APITestCase):
     """Test master profile endpoint."""
 
@@ -102,6 +289,18 @@ class MasterProfileAPITestCase(APITestCase):
         self.assertEqual(response.data["work_start"], "09:00:00")
         self.assertEqual(response.data["work_end"], "18:00:00")
 
+    def test_get_master_profile_conditional(self):
+        """Test that the profile honours If-None-Match and changes its ETag on save."""
+        url = reverse("api:master-profile")
+        etag = self.client.get(url)["ETag"]
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.master_profile.about = "Новое описание"
+        self.master_profile.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["about"], "Новое описание")
+
     def test_get_master_profile_requires_authentication(self):
         """Test that unauthenticated requests are rejected."""
         self.client.force_authenticate(user=None)
@@ -114,6 +313,7 @@ class AppointmentAPITestCase(APITestCase):
     """Test appointment CRUD operations."""
 
     def setUp(self):
+        caches[settings.THROTTLE_CACHE].clear()
         self.user = User.objects.create_user(
             email="master@test.com",
             password="testpass123",
@@ -209,7 +409,39 @@ class AppointmentAPITestCase(APITestCase):
         url = reverse("api:appointment-list")
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 2)
+        self.assertEqual(len(response.data["results"]), 2)
+        self.assertIsNone(response.data["next"])
+
+    def test_list_pages_follow_cursor(self):
+        """Test that pages chain through next links without gaps or repeats."""
+        start = timezone.make_aware(timezone.datetime.combine(timezone.localdate(), time(9, 0)))
+        created = [
+            Appointment.objects.create(
+                master=self.master_profile,
+                client=self.client_obj,
+                client_name=self.client_obj.full_name,
+                client_phone=self.client_obj.phone,
+                starts_at=start + timedelta(minutes=15 * index),
+                ends_at=start + timedelta(minutes=15 * (index + 1)),
+            )
+            for index in range(5)
+        ]
+        url = reverse("api:appointment-list")
+        seen = []
+        response = self.client.get(url, {"page_size": 2})
+        while True:
+            self.assertLessEqual(len(response.data["results"]), 2)
+            seen.extend(item["id"] for item in response.data["results"])
+            if not response.data["next"]:
+                break
+            response = self.client.get(response.data["next"])
+        self.assertEqual(seen, [appointment.id for appointment in created])
+
+    def test_list_rejects_invalid_cursor(self):
+        """Test that a tampered cursor is reported as not found."""
+        url = reverse("api:appointment-list")
+        response = self.client.get(url, {"cursor": "garbage"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
     def test_filter_appointments_by_date(self):
         """Test filtering appointments by specific date."""
@@ -243,11 +475,120 @@ class AppointmentAPITestCase(APITestCase):
         url = reverse("api:appointment-list")
         response = self.client.get(url, {"date": today.strftime("%Y-%m-%d")})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertIsNone(response.data["next"])
+        self.assertEqual(len(response.data["results"]), 1)
         self.assertEqual(
-            response.data[0]["starts_at"][:10], today.strftime("%Y-%m-%d")
+            response.data["results"][0]["starts_at"][:10], today.strftime("%Y-%m-%d")
+        )
+
+    def test_list_reflects_new_appointments(self):
+        """Test that the cached list is invalidated by new bookings."""
+        url = reverse("api:appointment-list")
+        self.assertEqual(len(self.client.get(url).data["results"]), 0)
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        data = {
+            "client_name": "Петр Петров",
+            "client_phone": "+79991234568",
+            "service_date": tomorrow.strftime("%Y-%m-%d"),
+            "start_time": "10:00",
+            "duration_minutes": "30",
+        }
+        self.client.post(url, data, format="json")
+        self.assertEqual(len(self.client.get(url).data["results"]), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(len(self.client.get(url).data["results"]), 1)
+
+    def test_list_supports_conditional_get(self):
+        """Test that an unchanged list answers If-None-Match with 304."""
+        url = reverse("api:appointment-list")
+        response = self.client.get(url)
+        etag = response["ETag"]
+        self.assertTrue(response.has_header("Last-Modified"))
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        Appointment.objects.create(
+            master=self.master_profile,
+            client=self.client_obj,
+            client_name=self.client_obj.full_name,
+            client_phone=self.client_obj.phone,
+            starts_at=timezone.make_aware(timezone.datetime.combine(tomorrow, time(10, 0))),
+            ends_at=timezone.make_aware(timezone.datetime.combine(tomorrow, time(10, 30))),
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_list_etag_depends_on_query(self):
+        """Test that different filters get different validators."""
+        url = reverse("api:appointment-list")
+        etag = self.client.get(url)["ETag"]
+        response = self.client.get(url, {"date": timezone.localdate().strftime("%Y-%m-%d")}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def _create_on(self, day, start, client=None):
+        client = client or self.client_obj
+        starts_at = timezone.make_aware(timezone.datetime.combine(day, start))
+        return Appointment.objects.create(
+            master=self.master_profile,
+            client=client,
+            client_name=client.full_name,
+            client_phone=client.phone,
+            starts_at=starts_at,
+            ends_at=starts_at + timedelta(minutes=30),
         )
 
+    def test_filter_appointments_by_range(self):
+        """Test that from/to returns a whole window ordered by day."""
+        today = timezone.localdate()
+        self._create_on(today + timedelta(days=2), time(9, 0))
+        self._create_on(today, time(15, 0))
+        self._create_on(today, time(10, 0))
+        self._create_on(today + timedelta(days=7), time(10, 0))
+        url = reverse("api:appointment-list")
+        params = {
+            "from": today.strftime("%Y-%m-%d"),
+            "to": (today + timedelta(days=6)).strftime("%Y-%m-%d"),
+        }
+        # One appointment query plus one for recurring series.
+        with self.assertNumQueries(2):
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 3)
+        starts = [item["starts_at"] for item in response.data["results"]]
+        self.assertEqual(starts, sorted(starts))
+
+    def test_filter_appointments_by_client_and_created_since(self):
+        """Test the client and created_since filters."""
+        other = Client.objects.create(full_name="Другой", phone="+79990000000")
+        today = timezone.localdate()
+        self._create_on(today, time(10, 0))
+        self._create_on(today, time(11, 0), client=other)
+        url = reverse("api:appointment-list")
+        response = self.client.get(url, {"client": other.id})
+        self.assertEqual([item["client"]["id"] for item in response.data["results"]], [other.id])
+        since = (timezone.now() + timedelta(minutes=1)).isoformat()
+        response = self.client.get(url, {"created_since": since})
+        self.assertEqual(response.data["results"], [])
+
+    def test_filter_appointments_rejects_bad_values(self):
+        """Test that malformed or inconsistent filters return 400."""
+        url = reverse("api:appointment-list")
+        today = timezone.localdate()
+        for params in (
+            {"date": "2025-13-01"},
+            {"from": today.strftime("%Y-%m-%d")},
+            {"from": today.strftime("%Y-%m-%d"), "to": (today - timedelta(days=1)).strftime("%Y-%m-%d")},
+            {"from": today.strftime("%Y-%m-%d"), "to": (today + timedelta(days=100)).strftime("%Y-%m-%d")},
+            {"date": today.strftime("%Y-%m-%d"), "from": today.strftime("%Y-%m-%d")},
+            {"client": "abc"},
+            {"created_since": "yesterday"},
+        ):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
     def test_create_appointment_outside_work_hours(self):
         """Test that appointments outside work hours are rejected."""
         url = reverse("api:appointment-list")
@@ -262,6 +603,199 @@ class AppointmentAPITestCase(APITestCase):
         response = self.client.post(url, data, format="json")
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_create_overlapping_appointment_conflicts(self):
+        """Test that bookings overlapping an existing one return 409."""
+        url = reverse("api:appointment-list")
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        data = {
+            "client_name": "Клиент",
+            "client_phone": "+79991234568",
+            "service_date": tomorrow.strftime("%Y-%m-%d"),
+            "start_time": "10:00",
+            "duration_minutes": "60",
+        }
+        response = self.client.post(url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        for start_time in ("10:00", "10:45", "09:30"):
+            data.update(start_time=start_time, client_phone="+79991234569")
+            response = self.client.post(url, data, format="json")
+            self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+            self.assertIn("start_time", response.data)
+        self.assertEqual(Appointment.objects.count(), 1)
+        # The client upsert is rolled back together with the rejected booking.
+        self.assertFalse(Client.objects.filter(phone="+79991234569").exists())
+
+        data["start_time"] = "11:00"
+        response = self.client.post(url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_create_appointment_race_on_same_start(self):
+        """Test that a unique-index race is reported as a conflict, not a 500."""
+        url = reverse("api:appointment-list")
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        data = {
+            "client_name": "Клиент",
+            "client_phone": "+79991234568",
+            "service_date": tomorrow.strftime("%Y-%m-%d"),
+            "start_time": "10:00",
+            "duration_minutes": "30",
+        }
+        self.client.post(url, data, format="json")
+        with mock.patch("calendarapp.booking.find_conflicts", return_value=Appointment.objects.none()):
+            response = self.client.post(url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Appointment.objects.count(), 1)
+
+    def test_bulk_create_appointments(self):
+        """Test that a batch is inserted with batched client upserts."""
+        url = reverse("api:appointment-bulk")
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        items = [
+            {
+                "client_name": f"Клиент {index}",
+                "client_phone": f"+7999000000{index % 3}",
+                "service_date": tomorrow.strftime("%Y-%m-%d"),
+                "start_time": f"{9 + index}:00",
+                "duration_minutes": 60,
+            }
+            for index in range(6)
+        ]
+        # Existing client gets renamed by the batch.
+        items[0]["client_phone"] = self.client_obj.phone
+        # Busy intervals, series, one client upsert and the masters it renames
+        # clients for, one insert, the client search refresh (after the upsert
+        # and after the insert), the visit totals (a read and an insert) and
+        # the day's occupancy mask (a read and an upsert), inside a savepoint.
+        with self.assertNumQueries(14):
+            response = self.client.post(url, items, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["created"], 6)
+        self.assertEqual([item["status"] for item in response.data["results"]], ["created"] * 6)
+        self.assertEqual(Appointment.objects.filter(master=self.master_profile).count(), 6)
+        self.client_obj.refresh_from_db()
+        self.assertEqual(self.client_obj.full_name, "Клиент 0")
+        self.assertEqual(
+            sorted(MasterClient.objects.filter(master=self.master_profile).values_list("visit_count", flat=True)),
+            [1, 1, 2, 2],
+        )
+        # The calendar cache sees the new rows.
+        listed = self.client.get(reverse("api:appointment-list"), {"date": tomorrow.strftime("%Y-%m-%d")})
+        self.assertEqual(len(listed.data["results"]), 6)
+
+    def test_bulk_stores_rows_like_single_create(self):
+        """Test that bulk rows keep each submitted name and the client's stored phone, as single creates do."""
+        day = (timezone.localdate() + timedelta(days=1)).strftime("%Y-%m-%d")
+        items = [
+            {
+                "client_name": name,
+                "client_phone": phone,
+                "service_date": day,
+                "start_time": start,
+                "duration_minutes": 60,
+            }
+            for name, phone, start in (("Иван", "+79991234567", "10:00"), ("Иван Петров", "89991234567", "12:00"))
+        ]
+        response = self.client.post(reverse("api:appointment-bulk"), items, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.client_obj.refresh_from_db()
+        rows = Appointment.objects.order_by("starts_at").values_list("client_id", "client_name", "client_phone")
+        self.assertEqual(
+            list(rows),
+            [
+                (self.client_obj.pk, "Иван", self.client_obj.phone),
+                (self.client_obj.pk, "Иван Петров", self.client_obj.phone),
+            ],
+        )
+
+    def test_bulk_create_reports_per_item_errors(self):
+        """Test that invalid and overlapping items are reported and skipped."""
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        self.client.post(
+            reverse("api:appointment-list"),
+            {
+                "client_name": "Клиент",
+                "client_phone": "+79991234568",
+                "service_date": tomorrow.strftime("%Y-%m-%d"),
+                "start_time": "10:00",
+                "duration_minutes": 60,
+            },
+            format="json",
+        )
+        base = {
+            "client_name": "Клиент",
+            "client_phone": "+79991234569",
+            "service_date": tomorrow.strftime("%Y-%m-%d"),
+            "duration_minutes": 60,
+        }
+        items = [
+            {**base, "start_time": "12:00"},
+            {**base, "start_time": "10:30"},  # overlaps the existing booking
+            {**base, "start_time": "12:30"},  # overlaps item 0
+            {**base, "start_time": "20:00"},  # outside working hours
+            {**base, "start_time": "14:00"},
+        ]
+        response = self.client.post(reverse("api:appointment-bulk"), items, format="json")
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(
+            [item["status"] for item in response.data["results"]],
+            ["created", "conflict", "conflict", "invalid", "created"],
+        )
+        self.assertIn("start_time", response.data["results"][3]["errors"])
+        self.assertEqual(Appointment.objects.count(), 3)
+
+    def test_bulk_create_requires_list(self):
+        """Test that a non-list payload is rejected."""
+        response = self.client.post(reverse("api:appointment-bulk"), {"client_name": "x"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_appointments_csv(self):
+        """Test that the export streams a CSV limited to the requested dates."""
+        today = timezone.localdate()
+        for offset, notes in ((0, "=HYPERLINK()"), (3, "")):
+            start = timezone.make_aware(timezone.datetime.combine(today + timedelta(days=offset), time(10, 0)))
+            Appointment.objects.create(
+                master=self.master_profile,
+                client=self.client_obj,
+                client_name=self.client_obj.full_name,
+                client_phone=self.client_obj.phone,
+                starts_at=start,
+                ends_at=start + timedelta(minutes=45),
+                notes=notes,
+            )
+        url = reverse("api:appointment-export")
+        response = self.client.get(url, {"to": today.strftime("%Y-%m-%d")})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        rows = list(csv.reader(b"".join(response.streaming_content).decode("utf-8-sig").splitlines()))
+        self.assertEqual(rows[0][:4], ["id", "starts_at", "ends_at", "duration_minutes"])
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][3], "45")
+        self.assertEqual(rows[1][4], "Иван Иванов")
+        self.assertEqual(rows[1][5], "'" + self.client_obj.phone)
+        self.assertEqual(rows[1][6], "'=HYPERLINK()")
+
+        response = self.client.get(url)
+        self.assertEqual(len(b"".join(response.streaming_content).decode("utf-8-sig").splitlines()), 3)
+
+    def test_export_rejects_reversed_range(self):
+        """Test that the export validates its date bounds."""
+        response = self.client.get(reverse("api:appointment-export"), {"from": "2025-02-01", "to": "2025-01-01"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_accepts_csv_requests(self):
+        """Test that clients asking for text/csv get the export, and CSV errors."""
+        url = reverse("api:appointment-export")
+        response = self.client.get(url, HTTP_ACCEPT="text/csv")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        self.assertTrue(b"".join(response.streaming_content).decode("utf-8-sig").startswith("id,starts_at"))
+        response = self.client.get(url, {"from": "2025-02-01", "to": "2025-01-01"}, HTTP_ACCEPT="text/csv")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        self.assertTrue(response.content.decode().startswith("to,"))
+
     def test_create_appointment_requires_authentication(self):
         """Test that unauthenticated users cannot create appointments."""
         self.client.force_authenticate(user=None)
@@ -282,6 +816,7 @@ class ClientAPITestCase(APITestCase):
     """Test client detail and history endpoints."""
 
     def setUp(self):
+        caches[settings.THROTTLE_CACHE].clear()
         self.user = User.objects.create_user(
             email="master@test.com",
             password="testpass123",
@@ -359,10 +894,11 @@ class ClientAPITestCase(APITestCase):
         url = reverse("api:client-appointments", kwargs={"pk": self.client_obj.id})
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 2)
+        results = response.data["results"]
+        self.assertEqual(len(results), 2)
         # Should be ordered by starts_at descending (most recent first)
         self.assertGreater(
-            response.data[0]["starts_at"], response.data[1]["starts_at"]
+            results[0]["starts_at"], results[1]["starts_at"]
         )
 
     def test_client_history_only_shows_current_master_appointments(self):
@@ -411,5 +947,914 @@ class ClientAPITestCase(APITestCase):
         url = reverse("api:client-appointments", kwargs={"pk": self.client_obj.id})
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]["master"], self.master_profile.id)
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertEqual(response.data["results"][0]["master"], self.master_profile.id)
+
+    def test_list_clients_by_last_visit(self):
+        """Test the client list with visit totals, most recent visit first."""
+        recent = Client.objects.create(full_name="Пётр Петров", phone="+79990000001")
+        stranger = Client.objects.create(full_name="Чужой", phone="+79990000002")
+        today = timezone.localdate()
+        for client, day, minutes in ((self.client_obj, 3, 30), (self.client_obj, 2, 60), (recent, 1, 45)):
+            starts_at = timezone.make_aware(timezone.datetime.combine(today - timedelta(days=day), time(10, 0)))
+            Appointment.objects.create(
+                master=self.master_profile,
+                client=client,
+                client_name=client.full_name,
+                client_phone=client.phone,
+                starts_at=starts_at,
+                ends_at=starts_at + timedelta(minutes=minutes),
+            )
+        url = reverse("api:client-list")
+        # One query: the page of links joined with their clients.
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data["results"]
+        self.assertEqual([row["client"]["id"] for row in results], [recent.id, self.client_obj.id])
+        self.assertNotIn(stranger.id, [row["client"]["id"] for row in results])
+        self.assertEqual((results[1]["visit_count"], results[1]["total_minutes"]), (2, 90))
+
+        page = self.client.get(url, {"page_size": 1})
+        self.assertEqual([row["client"]["id"] for row in page.data["results"]], [recent.id])
+        following = self.client.get(page.data["next"])
+        self.assertEqual([row["client"]["id"] for row in following.data["results"]], [self.client_obj.id])
+        self.assertIsNone(following.data["next"])
+
+    def test_search_clients(self):
+        """Test autocomplete over the master's clients."""
+        today = timezone.localdate()
+        Appointment.objects.create(
+            master=self.master_profile,
+            client=self.client_obj,
+            client_name=self.client_obj.full_name,
+            client_phone=self.client_obj.phone,
+            starts_at=timezone.make_aware(timezone.datetime.combine(today, time(10, 0))),
+            ends_at=timezone.make_aware(timezone.datetime.combine(today, time(10, 30))),
+        )
+        # Never served by this master.
+        Client.objects.create(full_name="Иван Чужой", phone="+79990000000")
+        url = reverse("api:client-search")
+        response = self.client.get(url, {"q": "ив"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([client["id"] for client in response.data], [self.client_obj.id])
+        self.assertEqual(response.data[0]["phone"], "+79991234567")
+        self.assertEqual(len(self.client.get(url, {"q": "8999123"}).data), 1)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AvailabilityAPITestCase(APITestCase):
+    """Test free-slot computation for the current master."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="master@test.com",
+            password="testpass123",
+        )
+        self.profession = Profession.objects.create(
+            name="Парикмахер",
+            slug="hairdresser",
+        )
+        self.master_profile = MasterProfile.objects.create(
+            user=self.user,
+            profession=self.profession,
+            phone="+71234567890",
+            work_start=time(9, 0),
+            work_end=time(12, 0),
+            status=MasterProfile.Status.ACTIVE,
+        )
+        self.day = timezone.localdate() + timedelta(days=1)
+        self.client.force_authenticate(user=self.user)
+
+    def _book(self, start, end):
+        return Appointment.objects.create(
+            master=self.master_profile,
+            client_name="Клиент",
+            client_phone="+79991234567",
+            starts_at=timezone.make_aware(timezone.datetime.combine(self.day, start)),
+            ends_at=timezone.make_aware(timezone.datetime.combine(self.day, end)),
+        )
+
+    def _slot_times(self, response):
+        return [slot["starts_at"][11:16] for slot in response.data["slots"]]
+
+    def test_free_slots_skip_existing_bookings(self):
+        """Test that booked intervals are excluded and the duration must fit."""
+        self._book(time(10, 0), time(10, 30))
+        self._book(time(10, 30), time(11, 15))
+        url = reverse("api:master-availability")
+        response = self.client.get(url, {"date": self.day.strftime("%Y-%m-%d"), "duration": 60})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["duration_minutes"], 60)
+        self.assertEqual(self._slot_times(response), ["09:00"])
+
+    def test_free_slots_default_duration(self):
+        """Test that the default duration lists every free 15-minute start."""
+        self._book(time(9, 10), time(11, 35))
+        url = reverse("api:master-availability")
+        response = self.client.get(url, {"date": self.day.strftime("%Y-%m-%d")})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._slot_times(response), ["11:45"])
+
+    def test_availability_uses_single_query(self):
+        """Test that availability is computed from one appointment query and one series query."""
+        self._book(time(10, 0), time(10, 30))
+        url = reverse("api:master-availability")
+        self.client.get(url, {"date": self.day.strftime("%Y-%m-%d")})
+        with self.assertNumQueries(2):
+            self.client.get(url, {"date": self.day.strftime("%Y-%m-%d")})
+
+    def test_availability_rejects_invalid_params(self):
+        """Test that bad date or duration values are rejected."""
+        url = reverse("api:master-availability")
+        response = self.client.get(url, {"date": "not-a-date"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(url, {"date": self.day.strftime("%Y-%m-%d"), "duration": 5})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AvailabilitySearchAPITestCase(APITestCase):
+    """Test the cross-master availability search."""
+
+    def setUp(self):
+        caches[settings.THROTTLE_CACHE].clear()
+        self.profession = Profession.objects.create(name="Парикмахер", slug="hairdresser")
+        self.first = self._master("first@test.com", time(9, 0), time(12, 0))
+        self.second = self._master("second@test.com", time(9, 30), time(12, 0))
+        self._master("pending@test.com", time(9, 0), time(12, 0), status=MasterProfile.Status.PENDING)
+        other_profession = Profession.objects.create(name="Мастер маникюра", slug="manicure")
+        self._master("nails@test.com", time(9, 0), time(12, 0), profession=other_profession)
+        self.day = timezone.localdate() + timedelta(days=1)
+        self._book(self.first, time(9, 0), time(10, 0))
+        self.url = reverse("api:availability-search")
+        self.client.force_authenticate(user=self.first.user)
+
+    def _master(self, email, work_start, work_end, status=MasterProfile.Status.ACTIVE, profession=None):
+        return MasterProfile.objects.create(
+            user=User.objects.create_user(email=email, password="testpass123", first_name=email.split("@")[0]),
+            profession=profession or self.profession,
+            phone="+71234567890",
+            work_start=work_start,
+            work_end=work_end,
+            status=status,
+        )
+
+    def _book(self, master, start, end):
+        return Appointment.objects.create(
+            master=master,
+            client_name="Клиент",
+            client_phone="+79991234567",
+            starts_at=timezone.make_aware(timezone.datetime.combine(self.day, start)),
+            ends_at=timezone.make_aware(timezone.datetime.combine(self.day, end)),
+        )
+
+    def _search(self, **params):
+        return self.client.get(
+            self.url, {"profession": "hairdresser", "date": self.day.strftime("%Y-%m-%d"), "duration": 60, **params}
+        )
+
+    def test_results_are_ranked_by_earliest_start(self):
+        """Test that only active masters of the profession are listed, earliest first."""
+        response = self._search()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.json()["results"]
+        self.assertEqual([item["master"]["id"] for item in results], [self.second.pk, self.first.pk])
+        self.assertEqual(results[0]["master"]["name"], "second")
+        self.assertEqual(
+            [slot["starts_at"][11:16] for slot in results[1]["slots"]],
+            ["10:00", "10:15", "10:30", "10:45", "11:00"],
+        )
+
+    def test_time_keeps_masters_free_to_start_then(self):
+        """Test that a start time filters masters and their slots."""
+        response = self._search(time="09:30")
+        self.assertEqual([item["master"]["id"] for item in response.data["results"]], [self.second.pk])
+        self.assertEqual(len(response.data["results"][0]["slots"]), 1)
+
+    def test_answer_is_cached_until_a_calendar_changes(self):
+        """Test that a repeated search costs the masters query only and a booking invalidates it."""
+        self._search()
+        # The profession lookup and the masters of the profession.
+        with self.assertNumQueries(2):
+            self._search()
+        self._book(self.second, time(9, 30), time(12, 0))
+        response = self._search()
+        self.assertEqual([item["master"]["id"] for item in response.data["results"]], [self.first.pk])
+
+    def test_past_start_times_are_dropped_at_answer_time(self):
+        """Test that a cached answer for today loses the slots that have started since."""
+        self.day = timezone.localdate()
+        self._book(self.first, time(10, 0), time(11, 0))
+
+        def search_at(hour, minute):
+            now = timezone.make_aware(timezone.datetime.combine(self.day, time(hour, minute)))
+            with mock.patch.object(timezone, "now", return_value=now):
+                return self._search().data["results"]
+
+        early = search_at(8, 0)
+        self.assertEqual([item["master"]["id"] for item in early], [self.first.pk, self.second.pk])
+        later = search_at(9, 5)
+        self.assertEqual([item["master"]["id"] for item in later], [self.second.pk, self.first.pk])
+        self.assertEqual([slot["starts_at"][11:16] for slot in later[1]["slots"]], ["11:00"])
+
+    def test_search_validates_params_and_permissions(self):
+        """Test that unknown professions are rejected and clients without a role get nothing."""
+        response = self._search(profession="unknown")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self._search(date=(timezone.localdate() - timedelta(days=1)).strftime("%Y-%m-%d"))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.client.force_authenticate(user=User.objects.create_user(email="client@test.com"))
+        self.assertEqual(self._search().status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(user=User.objects.create_user(email="staff@test.com", is_staff=True))
+        self.assertEqual(self._search().status_code, status.HTTP_200_OK)
+
+
+class PublicAPITestCase(APITestCase):
+    """Test the anonymous listings, availability and booking."""
+
+    def setUp(self):
+        cache.clear()
+        caches[settings.THROTTLE_CACHE].clear()
+        self.profession = Profession.objects.create(name="Парикмахер", slug="hairdresser")
+        self.master = MasterProfile.objects.create(
+            user=User.objects.create_user(email="master@test.com", first_name="Анна"),
+            profession=self.profession,
+            phone="+71234567890",
+            work_start=time(9, 0),
+            work_end=time(12, 0),
+            status=MasterProfile.Status.ACTIVE,
+        )
+        self.pending = MasterProfile.objects.create(
+            user=User.objects.create_user(email="pending@test.com"),
+            profession=Profession.objects.create(name="Мастер маникюра", slug="manicure"),
+            phone="+71234567891",
+            work_start=time(9, 0),
+            work_end=time(12, 0),
+        )
+        self.day = timezone.localdate() + timedelta(days=1)
+        self.availability_url = reverse("api:public-master-availability", args=[self.master.pk])
+
+    def _availability(self, master_url=None, **params):
+        return self.client.get(
+            master_url or self.availability_url, {"date": self.day.strftime("%Y-%m-%d"), "duration": 60, **params}
+        )
+
+    def _book(self, **data):
+        return self.client.post(
+            reverse("api:public-booking"),
+            {
+                "master": self.master.pk,
+                "client_name": "Иван Петров",
+                "client_phone": "+79991234567",
+                "service_date": self.day.strftime("%Y-%m-%d"),
+                "start_time": "10:00",
+                "duration_minutes": 60,
+                **data,
+            },
+            format="json",
+        )
+
+    def test_listings_show_active_masters_only(self):
+        """Test that anonymous clients see active masters and their professions without contacts."""
+        response = self.client.get(reverse("api:public-profession-list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item["slug"] for item in response.data], ["hairdresser"])
+
+        response = self.client.get(reverse("api:public-master-list"), {"profession": "hairdresser"})
+        self.assertEqual([item["id"] for item in response.data], [self.master.pk])
+        self.assertEqual(response.data[0]["name"], "Анна")
+        self.assertNotIn("phone", response.data[0])
+        response = self.client.get(reverse("api:public-master-list"), {"profession": "manicure"})
+        self.assertEqual(response.data, [])
+
+    def test_availability_is_served_from_the_cache(self):
+        """Test that repeated availability reads cost no queries."""
+        response = self._availability()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [slot["starts_at"][11:16] for slot in response.data["slots"]],
+            ["09:00", "09:15", "09:30", "09:45", "10:00", "10:15", "10:30", "10:45", "11:00"],
+        )
+        with self.assertNumQueries(0):
+            self._availability(duration=30)
+
+    def test_availability_rejects_unknown_masters_and_far_dates(self):
+        """Test that inactive masters are hidden and dates stay within the horizon."""
+        pending_url = reverse("api:public-master-availability", args=[self.pending.pk])
+        self.assertEqual(self._availability(pending_url).status_code, status.HTTP_404_NOT_FOUND)
+        far = timezone.localdate() + timedelta(days=settings.PUBLIC_BOOKING_DAYS)
+        self.assertEqual(self._availability(date=far).status_code, status.HTTP_400_BAD_REQUEST)
+        past = timezone.localdate() - timedelta(days=1)
+        self.assertEqual(self._availability(date=past).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_booking_takes_the_slot(self):
+        """Test that a booking is stored, invalidates availability and conflicts with a second one."""
+        self._availability()
+        response = self._book()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        appointment = Appointment.objects.get(pk=response.data["id"])
+        self.assertEqual(appointment.client.phone_e164, "+79991234567")
+        self.assertIsNone(appointment.created_by)
+
+        starts = [slot["starts_at"][11:16] for slot in self._availability().data["slots"]]
+        self.assertEqual(starts, ["09:00", "11:00"])
+        response = self._book(start_time="10:30", client_phone="+79990000000")
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_booking_does_not_change_existing_clients(self):
+        """Test that an anonymous booking keeps the submitted name on the appointment only."""
+        client = Client.objects.create(full_name="Real Name", phone="+79991234567")
+        response = self._book(client_name="Hacked", client_phone="89991234567")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        client.refresh_from_db()
+        self.assertEqual((client.full_name, client.phone), ("Real Name", "+79991234567"))
+        appointment = Appointment.objects.get(pk=response.data["id"])
+        self.assertEqual((appointment.client_id, appointment.client_name), (client.pk, "Hacked"))
+
+        response = self._book(client_name="Новый", client_phone="+79990000000", start_time="11:00")
+        self.assertEqual(Appointment.objects.get(pk=response.data["id"]).client.full_name, "Новый")
+
+    def test_booking_validates_master_and_time(self):
+        """Test that pending masters, past times and off-grid starts are rejected."""
+        self.assertEqual(self._book(master=self.pending.pk).status_code, status.HTTP_400_BAD_REQUEST)
+        yesterday = (timezone.localdate() - timedelta(days=1)).strftime("%Y-%m-%d")
+        response = self._book(service_date=yesterday)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("start_time", response.data)
+        self.assertEqual(self._book(start_time="10:10").status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Appointment.objects.exists())
+
+
+class UtilizationAPITestCase(APITestCase):
+    """Test the occupancy reports."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="master@test.com",
+            password="testpass123",
+        )
+        self.profession = Profession.objects.create(
+            name="Парикмахер",
+            slug="hairdresser",
+        )
+        self.master_profile = MasterProfile.objects.create(
+            user=self.user,
+            profession=self.profession,
+            phone="+71234567890",
+            work_start=time(9, 0),
+            work_end=time(12, 0),
+            status=MasterProfile.Status.ACTIVE,
+        )
+        self.day = date(2026, 3, 2)
+        for start, end in ((time(9, 0), time(10, 0)), (time(11, 0), time(11, 30))):
+            Appointment.objects.create(
+                master=self.master_profile,
+                client_name="Клиент",
+                client_phone="+79991234567",
+                starts_at=timezone.make_aware(timezone.datetime.combine(self.day, start)),
+                ends_at=timezone.make_aware(timezone.datetime.combine(self.day, end)),
+            )
+        self.client.force_authenticate(user=self.user)
+
+    def test_master_utilization_report(self):
+        """Test per-day minutes, weeks and the gap histogram of the current master."""
+        url = reverse("api:master-utilization")
+        response = self.client.get(url, {"from": "2026-03-01", "to": "2026-03-07"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["utilization"], round(6 / 84, 4))
+        self.assertEqual(response.data["days"][1]["booked_minutes"], 90)
+        self.assertEqual(response.data["days"][1]["working_minutes"], 180)
+        self.assertEqual([week["week_start"] for week in response.data["weeks"]], [date(2026, 3, 1), self.day])
+        self.assertEqual(response.data["gaps"]["counts"], [0, 0, 0, 1, 0, 0, 0])
+
+    def test_master_utilization_defaults_to_four_weeks(self):
+        """Test that without a range the last 28 days up to today are reported."""
+        response = self.client.get(reverse("api:master-utilization"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["to"], timezone.localdate())
+        self.assertEqual(len(response.data["days"]), 28)
+
+    def test_master_utilization_rejects_bad_ranges(self):
+        """Test that reversed and over-long ranges are rejected."""
+        url = reverse("api:master-utilization")
+        response = self.client.get(url, {"from": "2026-03-07", "to": "2026-03-01"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(url, {"from": "2025-01-01", "to": "2026-03-01"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_overview_is_for_staff(self):
+        """Test that only staff see every master's utilization."""
+        url = reverse("api:utilization-overview")
+        params = {"from": "2026-03-02", "to": "2026-03-02"}
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(user=User.objects.create_user(email="staff@test.com", is_staff=True))
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data["masters"],
+            [{"master_id": self.master_profile.pk, "utilization": 0.5, "gaps": [0, 0, 0, 1, 0, 0, 0]}],
+        )
+
+
+class AppointmentSeriesAPITestCase(APITestCase):
+    """Test recurring bookings and their lazy expansion."""
+
+    def setUp(self):
+        caches[settings.THROTTLE_CACHE].clear()
+        self.user = User.objects.create_user(
+            email="master@test.com",
+            password="testpass123",
+        )
+        self.profession = Profession.objects.create(
+            name="Парикмахер",
+            slug="hairdresser",
+        )
+        self.master_profile = MasterProfile.objects.create(
+            user=self.user,
+            profession=self.profession,
+            phone="+71234567890",
+            work_start=time(9, 0),
+            work_end=time(18, 0),
+            status=MasterProfile.Status.ACTIVE,
+        )
+        self.client.force_authenticate(user=self.user)
+        self.start = timezone.localdate() + timedelta(days=1)
+
+    def _create_series(self, **overrides):
+        data = {
+            "client_name": "Постоянный Клиент",
+            "client_phone": "+79991234567",
+            "start_date": self.start.strftime("%Y-%m-%d"),
+            "start_time": "10:00",
+            "duration_minutes": 60,
+            "frequency": "weekly",
+            "interval": 2,
+        }
+        data.update(overrides)
+        return self.client.post(reverse("api:series-list"), data, format="json")
+
+    def _window(self, days):
+        return {
+            "from": self.start.strftime("%Y-%m-%d"),
+            "to": (self.start + timedelta(days=days - 1)).strftime("%Y-%m-%d"),
+        }
+
+    def test_series_occurrences_are_listed_without_rows(self):
+        """Test that a series shows up in windowed lists without creating appointments."""
+        response = self._create_series()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["rrule"], "FREQ=WEEKLY;INTERVAL=2")
+        listed = self.client.get(reverse("api:appointment-list"), self._window(28))
+        self.assertEqual(len(listed.data["results"]), 2)
+        self.assertIsNone(listed.data["results"][0]["id"])
+        self.assertEqual(listed.data["results"][0]["series"], response.data["id"])
+        self.assertEqual(listed.data["results"][1]["occurrence_date"], str(self.start + timedelta(days=14)))
+        self.assertEqual(Appointment.objects.count(), 0)
+
+    def test_series_blocks_availability_and_bookings(self):
+        """Test that occurrences count as busy time."""
+        self._create_series()
+        availability = self.client.get(
+            reverse("api:master-availability"),
+            {"date": self.start.strftime("%Y-%m-%d"), "duration": 60},
+        )
+        starts = [slot["starts_at"][11:16] for slot in availability.data["slots"]]
+        self.assertNotIn("10:00", starts)
+        self.assertIn("11:00", starts)
+        response = self.client.post(
+            reverse("api:appointment-list"),
+            {
+                "client_name": "Клиент",
+                "client_phone": "+79990000000",
+                "service_date": (self.start + timedelta(days=14)).strftime("%Y-%m-%d"),
+                "start_time": "10:30",
+                "duration_minutes": 30,
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_series_conflicting_with_booking_is_rejected(self):
+        """Test that a new series may not overlap existing bookings."""
+        self._create_series()
+        response = self._create_series(client_phone="+79990000000", start_time="10:30", interval=1)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertIn("dates", response.data)
+
+    def test_series_is_checked_against_distant_bookings(self):
+        """Test that bookings past the conflict horizon still block a new series."""
+        distant = self.start + timedelta(days=7 * 20)
+        starts_at = timezone.make_aware(timezone.datetime.combine(distant, time(10, 0)))
+        Appointment.objects.create(
+            master=self.master_profile,
+            client_name="Клиент",
+            client_phone="+79990000000",
+            starts_at=starts_at,
+            ends_at=starts_at + timedelta(hours=1),
+        )
+        response = self._create_series(interval=1)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data["dates"], [distant])
+        response = self._create_series(interval=1, until=str(distant - timedelta(days=1)))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_cancel_and_materialize_occurrences(self):
+        """Test that exceptions hide occurrences and edits materialize them."""
+        series_id = self._create_series().data["id"]
+        second = self.start + timedelta(days=14)
+        cancel_url = reverse("api:series-cancel", kwargs={"pk": series_id})
+        response = self.client.post(cancel_url, {"date": self.start.strftime("%Y-%m-%d")}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        materialize_url = reverse("api:series-materialize", kwargs={"pk": series_id})
+        response = self.client.post(
+            materialize_url,
+            {"date": second.strftime("%Y-%m-%d"), "start_time": "12:00", "notes": "Перенос"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["series"], series_id)
+
+        listed = self.client.get(reverse("api:appointment-list"), self._window(28))
+        self.assertEqual(len(listed.data["results"]), 1)
+        self.assertEqual(listed.data["results"][0]["id"], response.data["id"])
+        self.assertEqual(listed.data["results"][0]["starts_at"][11:16], "12:00")
+
+        response = self.client.post(materialize_url, {"date": second.strftime("%Y-%m-%d")}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(cancel_url, {"date": second.strftime("%Y-%m-%d")}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data["appointment"], listed.data["results"][0]["id"])
+        self.assertTrue(Appointment.objects.filter(pk=listed.data["results"][0]["id"]).exists())
+
+    def test_materialize_rejects_non_occurrence_date(self):
+        """Test that only dates produced by the rule can be edited."""
+        series_id = self._create_series().data["id"]
+        url = reverse("api:series-materialize", kwargs={"pk": series_id})
+        response = self.client.post(url, {"date": (self.start + timedelta(days=7)).strftime("%Y-%m-%d")}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SyncAPITestCase(APITestCase):
+    """Test the delta-sync change feed."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="master@test.com",
+            password="testpass123",
+        )
+        self.profession = Profession.objects.create(
+            name="Парикмахер",
+            slug="hairdresser",
+        )
+        self.master_profile = MasterProfile.objects.create(
+            user=self.user,
+            profession=self.profession,
+            phone="+71234567890",
+            work_start=time(9, 0),
+            work_end=time(18, 0),
+            status=MasterProfile.Status.ACTIVE,
+        )
+        self.client_obj = Client.objects.create(
+            full_name="Иван Иванов",
+            phone="+79991234567",
+        )
+        self.client.force_authenticate(user=self.user)
+        self.start = timezone.make_aware(timezone.datetime.combine(timezone.localdate(), time(9, 0)))
+
+    def _book(self, index):
+        return Appointment.objects.create(
+            master=self.master_profile,
+            client=self.client_obj,
+            client_name=self.client_obj.full_name,
+            client_phone=self.client_obj.phone,
+            starts_at=self.start + timedelta(minutes=30 * index),
+            ends_at=self.start + timedelta(minutes=30 * (index + 1)),
+        )
+
+    def _sync(self, token=None):
+        response = self.client.get(reverse("api:sync"), {"since": token} if token else {})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_full_sync_then_delta(self):
+        """Test that a delta only carries what changed after the token."""
+        unchanged, updated, removed = (self._book(index) for index in range(3))
+        full = self._sync()
+        self.assertFalse(full["more"])
+        self.assertEqual(len(full["appointments"]), 3)
+        self.assertEqual([item["id"] for item in full["clients"]], [self.client_obj.pk])
+        long_ago = timezone.now() - timedelta(days=1)
+        Appointment.objects.update(updated_at=long_ago)
+        Client.objects.update(updated_at=long_ago)
+
+        updated.notes = "Окрашивание"
+        updated.save()
+        removed_pk = removed.pk
+        removed.delete()
+        added = self._book(5)
+        delta = self._sync(full["token"])
+        self.assertEqual([item["id"] for item in delta["appointments"]], [updated.pk, added.pk])
+        self.assertEqual(delta["deleted"]["appointments"], [removed_pk])
+        self.assertEqual(delta["clients"], [])
+        self.assertNotIn(unchanged.pk, [item["id"] for item in delta["appointments"]])
+
+    def test_delta_reports_client_changes_and_deletions(self):
+        """Test that renamed and deleted clients are part of the feed."""
+        self._book(0)
+        token = self._sync()["token"]
+        Client.objects.update(updated_at=timezone.now() - timedelta(days=1))
+        self.client_obj.full_name = "Иван Петров"
+        self.client_obj.save()
+        former = Client.objects.create(full_name="Пётр Петров", phone="+79990000001")
+        Appointment.objects.create(
+            master=self.master_profile,
+            client=former,
+            client_name=former.full_name,
+            client_phone=former.phone,
+            starts_at=self.start + timedelta(hours=3),
+            ends_at=self.start + timedelta(hours=4),
+        ).delete()
+        former_pk = former.pk
+        former.delete()
+        delta = self._sync(token)
+        self.assertEqual([item["full_name"] for item in delta["clients"]], ["Иван Петров"])
+        self.assertEqual(delta["deleted"]["clients"], [former_pk])
+
+    def test_client_deletions_reach_only_their_masters(self):
+        """Test that a client deleted elsewhere is not reported to this master."""
+        self._book(0)
+        token = self._sync()["token"]
+        other = MasterProfile.objects.create(
+            user=User.objects.create_user(email="other@test.com", password="testpass123"),
+            profession=self.profession,
+            phone="+71234567891",
+            work_start=time(9, 0),
+            work_end=time(18, 0),
+        )
+        stranger = Client.objects.create(full_name="Чужой", phone="+79990000000")
+        Appointment.objects.create(
+            master=other,
+            client=stranger,
+            client_name=stranger.full_name,
+            client_phone=stranger.phone,
+            starts_at=self.start,
+            ends_at=self.start + timedelta(hours=1),
+        ).delete()
+        stranger_pk = stranger.pk
+        stranger.delete()
+        self.assertEqual(self._sync(token)["deleted"]["clients"], [])
+        self.assertEqual(list(other.deleted_clients.values_list("client_id", flat=True)), [stranger_pk])
+
+    def test_large_sync_is_paginated_without_gaps(self):
+        """Test that continuation tokens walk through all changes exactly once."""
+        booked = [self._book(index).pk for index in range(5)]
+        seen = []
+        token = None
+        with mock.patch.object(SyncView, "page_size", 2):
+            while True:
+                data = self._sync(token)
+                seen += [item["id"] for item in data["appointments"]]
+                token = data["token"]
+                if not data["more"]:
+                    break
+        self.assertEqual(seen, booked)
+        # Changes within the overlap are re-sent; older ones are not.
+        self.assertEqual(len(self._sync(token)["appointments"]), 5)
+        Appointment.objects.update(updated_at=timezone.now() - timedelta(days=1))
+        self.assertEqual(self._sync(token)["appointments"], [])
+
+    def test_expired_and_invalid_tokens(self):
+        """Test that stale tokens ask for a reset and garbage is rejected."""
+        old = int((timezone.now() - timedelta(days=365)).timestamp() * 1_000_000)
+        response = self.client.get(reverse("api:sync"), {"since": str(old)})
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+        self.assertTrue(response.data["reset"])
+        response = self.client.get(reverse("api:sync"), {"since": "1.2"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AsyncAPITestCase(APITestCase):
+    """Test that the async read endpoints match their DRF counterparts."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="master@test.com",
+            password="testpass123",
+        )
+        self.profession = Profession.objects.create(
+            name="Парикмахер",
+            slug="hairdresser",
+        )
+        self.master_profile = MasterProfile.objects.create(
+            user=self.user,
+            profession=self.profession,
+            phone="+71234567890",
+            work_start=time(9, 0),
+            work_end=time(18, 0),
+            status=MasterProfile.Status.ACTIVE,
+        )
+        self.client_obj = Client.objects.create(
+            full_name="Иван Иванов",
+            phone="+79991234567",
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.headers = {"authorization": f"Token {self.token.key}"}
+        self.day = timezone.localdate() + timedelta(days=1)
+        for hour in (10, 12):
+            start = timezone.make_aware(timezone.datetime.combine(self.day, time(hour, 0)))
+            Appointment.objects.create(
+                master=self.master_profile,
+                client=self.client_obj,
+                client_name=self.client_obj.full_name,
+                client_phone=self.client_obj.phone,
+                starts_at=start,
+                ends_at=start + timedelta(minutes=60),
+            )
+
+    def _sync_get(self, name, params=None, **kwargs):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        return self.client.get(reverse(name, kwargs=kwargs or None), params or {})
+
+    async def test_async_list_matches_sync_list(self):
+        """Test that paginated and windowed lists are identical to the DRF view."""
+        for params in ({}, {"page_size": 1}, {"date": self.day.strftime("%Y-%m-%d")}):
+            response = await self.async_client.get(
+                reverse("api:async-appointment-list"), params, headers=self.headers
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            expected = await sync_to_async(self._sync_get)("api:appointment-list", params)
+            # Only the host part of the next link differs.
+            self.assertEqual(json.loads(response.content.replace(b"/api/async/", b"/api/")), expected.json())
+
+    async def test_async_list_supports_conditional_get(self):
+        """Test that an unchanged list is answered with 304."""
+        url = reverse("api:async-appointment-list")
+        response = await self.async_client.get(url, headers=self.headers)
+        response = await self.async_client.get(
+            url, headers={**self.headers, "if-none-match": response["ETag"]}
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    async def test_async_list_reads_versions_off_the_event_loop(self):
+        """Test that the shared version store is never read on the event loop thread."""
+        store = caches[settings.CALENDAR_VERSION_CACHE]
+        get = store.get
+        readers = []
+
+        def tracked_get(*args, **kwargs):
+            readers.append(threading.get_ident())
+            return get(*args, **kwargs)
+
+        with mock.patch.object(store, "get", tracked_get):
+            response = await self.async_client.get(reverse("api:async-appointment-list"), headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(readers)
+        self.assertNotIn(threading.get_ident(), readers)
+
+    async def test_async_profile_availability_and_client(self):
+        """Test the remaining async endpoints against their DRF counterparts."""
+        cases = (
+            ("api:async-master-profile", "api:master-profile", {}, {}),
+            (
+                "api:async-master-availability",
+                "api:master-availability",
+                {"date": self.day.strftime("%Y-%m-%d"), "duration": 60},
+                {},
+            ),
+            ("api:async-client-detail", "api:client-detail", {}, {"pk": self.client_obj.pk}),
+        )
+        for async_name, sync_name, params, kwargs in cases:
+            response = await self.async_client.get(
+                reverse(async_name, kwargs=kwargs or None), params, headers=self.headers
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            expected = await sync_to_async(self._sync_get)(sync_name, params, **kwargs)
+            self.assertEqual(response.json(), expected.json())
+
+    async def test_async_views_check_permissions(self):
+        """Test that anonymous users and non-masters are rejected."""
+        response = await self.async_client.get(reverse("api:async-master-profile"))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        other = await User.objects.acreate(email="other@test.com")
+        token = await Token.objects.acreate(user=other)
+        response = await self.async_client.get(
+            reverse("api:async-master-profile"), headers={"authorization": f"Token {token.key}"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        stranger = await Client.objects.acreate(full_name="Чужой", phone="+79990000000")
+        response = await self.async_client.get(
+            reverse("api:async-client-detail", kwargs={"pk": stranger.pk}), headers=self.headers
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class StaleClientCacheTestCase(TransactionTestCase):
+    """Test bookings of a client another process has deleted; foreign keys are checked on commit."""
+
+    def setUp(self):
+        self.addCleanup(client_services.cache.clear)
+        self.master = MasterProfile.objects.create(
+            user=User.objects.create_user(email="master@test.com", password="testpass123"),
+            profession=Profession.objects.create(name="Парикмахер", slug="hairdresser"),
+            phone="+71234567890",
+            work_start=time(9, 0),
+            work_end=time(18, 0),
+            status=MasterProfile.Status.ACTIVE,
+        )
+
+    def test_booking_resolves_a_deleted_client_again(self):
+        """Test that a cached id whose row is gone is dropped and the phone resolved again."""
+        stale = client_services.resolve_client("+79991234567", "Иван")
+        # Deleted elsewhere: no signal reaches this process's cache.
+        Client.objects.filter(pk=stale.pk)._raw_delete("default")
+        day = timezone.localdate() + timedelta(days=1)
+        starts_at = timezone.make_aware(timezone.datetime.combine(day, time(10, 0)))
+        appointment = create_booking(
+            self.master,
+            {
+                "client_name": "Иван",
+                "client_phone": "+79991234567",
+                "starts_at": starts_at,
+                "ends_at": starts_at + timedelta(minutes=30),
+            },
+        )
+        self.assertNotEqual(appointment.client_id, stale.pk)
+        self.assertEqual(Appointment.objects.get().client.phone_e164, "+79991234567")
+
+    def _stale_client(self, phone="+79991234567"):
+        stale = client_services.resolve_client(phone, "Иван")
+        Client.objects.filter(pk=stale.pk)._raw_delete("default")
+        return stale
+
+    def test_bulk_and_series_resolve_a_deleted_client_again(self):
+        """Test that the other API write paths retry with the client read from the database."""
+        api = APIClient()
+        api.force_authenticate(user=self.master.user)
+        day = timezone.localdate() + timedelta(days=1)
+        self._stale_client()
+        item = {
+            "client_name": "Иван",
+            "client_phone": "+79991234567",
+            "service_date": day.strftime("%Y-%m-%d"),
+            "start_time": "10:00",
+            "duration_minutes": 30,
+        }
+        response = api.post(reverse("api:appointment-bulk"), [item], format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self._stale_client("+79990000000")
+        series = {
+            **item,
+            "client_phone": "+79990000000",
+            "start_date": item.pop("service_date"),
+            "start_time": "12:00",
+            "frequency": "weekly",
+        }
+        response = api.post(reverse("api:series-list"), series, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Client.objects.count(), 2)
+
+    def test_form_resolves_a_deleted_client_again(self):
+        """Test that the calendar form retries with the client read from the database."""
+        day = timezone.localdate() + timedelta(days=1)
+        stale = self._stale_client()
+        form = AppointmentForm(
+            data={
+                "client_name": "Иван",
+                "client_phone": "+79991234567",
+                "service_date": day.strftime("%Y-%m-%d"),
+                "start_time": "10:00",
+                "duration_minutes": "30",
+            },
+            master=self.master,
+            service_date=day,
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        appointment = form.save()
+        self.assertNotEqual(appointment.client_id, stale.pk)
+        self.assertTrue(Appointment.objects.filter(pk=appointment.pk).exists())
+
+
+class AsyncBenchmarkCommandTestCase(TransactionTestCase):
+    """Test the WSGI/ASGI benchmark; it issues requests from several threads."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="master@test.com", password="testpass123")
+        MasterProfile.objects.create(
+            user=self.user,
+            profession=Profession.objects.create(name="Парикмахер", slug="hairdresser"),
+            phone="+71234567890",
+            work_start=time(9, 0),
+            work_end=time(18, 0),
+            status=MasterProfile.Status.ACTIVE,
+        )
+
+    def test_benchmark_command_reports_all_servers(self):
+        """Test that the benchmark runs each server variant against the same endpoint."""
+        out = StringIO()
+        call_command("bench_async", self.user.email, "--requests", "4", "--concurrency", "2", stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[3].startswith("ASGI, async views"))
@@ -0,0 +1,131 @@
+"""Token-bucket throttles for the auth, booking and search endpoints.
+
+A bucket of ``N`` tokens refills at ``N`` per period, so a client may burst
+up to ``N`` requests and then goes at the steady rate. Each bucket is kept
+as a single number, the moment it would be full again, in the
+``THROTTLE_CACHE`` cache: one read and one write per request, shared by
+every worker process that uses the same cache. The read and write happen
+under a file lock, so parallel requests of one host cannot all take the
+same token. Rates come from ``DEFAULT_THROTTLE_RATES`` by the view's
+``throttle_scope``, or for viewsets by ``throttle_scopes[action]``; views
+without a scope are not throttled. Rejected requests get 429 with
+``Retry-After``.
+"""
+
+import fcntl
+import hashlib
+import os
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {"s": 1, "m": 60, "h": 60 * 60, "d": 60 * 60 * 24}
+BUCKET_KEY = "throttle:{scope}:{ident}"
+# Buckets share this many lock files, so unrelated clients rarely wait for each other.
+LOCK_STRIPES = 64
+
+
+def parse_rate(rate):
+    """``(capacity, period seconds)`` of a DRF-style rate such as ``"10/min"``."""
+    num, _, period = rate.partition("/")
+    try:
+        return int(num), PERIODS[period[:1]]
+    except (ValueError, KeyError):
+        raise ImproperlyConfigured(f"Invalid throttle rate {rate!r}.") from None
+
+
+@contextmanager
+def bucket_lock(key):
+    """Hold the host-wide lock of the bucket ``key``."""
+    os.makedirs(settings.THROTTLE_LOCK_DIR, exist_ok=True)
+    stripe = int(hashlib.md5(key.encode()).hexdigest(), 16) % LOCK_STRIPES
+    with open(os.path.join(settings.THROTTLE_LOCK_DIR, f"{stripe}.lock"), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class TokenBucket:
+    def __init__(self, store, key, capacity, period):
+        self.store = store
+        self.key = key
+        self.capacity = capacity
+        self.period = period
+
+    def take(self, now):
+        """Take a token; returns 0 on success or the seconds until one is available."""
+        interval = self.period / self.capacity
+        with bucket_lock(self.key):
+            full_at = max(self.store.get(self.key, now), now)
+            # Each taken token pushes the refill one interval further; an empty
+            # bucket is one that would need more than a whole period to refill.
+            wait = round(full_at + interval - now - self.period, 6)
+            if wait > 0:
+                return wait
+            self.store.set(self.key, full_at + interval, timeout=int(full_at + interval - now) + 1)
+        return 0
+
+
+class ScopedTokenBucketThrottle(BaseThrottle):
+    """Limit requests per user, or per client address for anonymous ones."""
+
+    scope_attr = "throttle_scope"
+    timer = time.time
+
+    def __init__(self):
+        self.wait_seconds = None
+
+    def get_scope(self, view):
+        if hasattr(view, "action") and hasattr(view, "throttle_scopes"):
+            return view.throttle_scopes.get(view.action)
+        return getattr(view, self.scope_attr, None)
+
+    def get_ident(self, request):
+        if request.user and request.user.is_authenticated:
+            return f"user:{request.user.pk}"
+        return f"ip:{super().get_ident(request)}"
+
+    def allow_request(self, request, view):
+        scope = self.get_scope(view)
+        if scope is None:
+            return True
+        rates = api_settings.DEFAULT_THROTTLE_RATES
+        if scope not in rates:
+            raise ImproperlyConfigured(f"No throttle rate set for scope {scope!r}.")
+        ident = self.get_ident(request)
+        if ident is None:
+            return True
+        bucket = TokenBucket(
+            caches[settings.THROTTLE_CACHE], BUCKET_KEY.format(scope=scope, ident=ident), *parse_rate(rates[scope])
+        )
+        self.wait_seconds = bucket.take(self.timer())
+        return not self.wait_seconds
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class AddressTokenBucketThrottle(ScopedTokenBucketThrottle):
+    """Limit requests per client address, signed in or not."""
+
+    def get_ident(self, request):
+        return f"ip:{BaseThrottle.get_ident(self, request)}"
+
+
+class LoginAccountThrottle(ScopedTokenBucketThrottle):
+    """Limit sign-in attempts per submitted e-mail, whatever address they come from."""
+
+    scope_attr = "account_throttle_scope"
+
+    def get_ident(self, request):
+        username = request.data.get("username") if hasattr(request.data, "get") else None
+        if not isinstance(username, str) or not username.strip():
+            return None
+        return "account:" + hashlib.md5(username.strip().lower().encode()).hexdigest()
@@ -1,17 +1,66 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
-from .views import AppointmentViewSet, ClientViewSet, CustomAuthToken, MasterProfileView
+from .async_views import (
+    AsyncAppointmentListView,
+    AsyncClientDetailView,
+    AsyncMasterAvailabilityView,
+    AsyncMasterProfileView,
+)
+from .public_views import (
+    PublicBookingView,
+    PublicMasterAvailabilityView,
+    PublicMasterListView,
+    PublicProfessionListView,
+)
+from .views import (
+    AppointmentExportView,
+    AppointmentSeriesViewSet,
+    AppointmentViewSet,
+    AvailabilitySearchView,
+    CacheStatsView,
+    ClientViewSet,
+    CustomAuthToken,
+    MasterAvailabilityView,
+    MasterProfileView,
+    MasterUtilizationView,
+    SyncView,
+    UtilizationOverviewView,
+)
 
 app_name = "api"
 
 router = DefaultRouter()
 router.register(r"appointments", AppointmentViewSet, basename="appointment")
 router.register(r"clients", ClientViewSet, basename="client")
+router.register(r"series", AppointmentSeriesViewSet, basename="series")
 
 urlpatterns = [
     path("auth/token/", CustomAuthToken.as_view(), name="auth-token"),
     path("masters/me/", MasterProfileView.as_view(), name="master-profile"),
+    path("masters/me/availability/", MasterAvailabilityView.as_view(), name="master-availability"),
+    path("masters/me/utilization/", MasterUtilizationView.as_view(), name="master-utilization"),
+    path("analytics/utilization/", UtilizationOverviewView.as_view(), name="utilization-overview"),
+    path("search/availability/", AvailabilitySearchView.as_view(), name="availability-search"),
+    path("appointments/export.csv", AppointmentExportView.as_view(), name="appointment-export"),
+    path("sync/", SyncView.as_view(), name="sync"),
+    path("cache/stats/", CacheStatsView.as_view(), name="cache-stats"),
+    path("async/appointments/", AsyncAppointmentListView.as_view(), name="async-appointment-list"),
+    path("async/masters/me/", AsyncMasterProfileView.as_view(), name="async-master-profile"),
+    path(
+        "async/masters/me/availability/",
+        AsyncMasterAvailabilityView.as_view(),
+        name="async-master-availability",
+    ),
+    path("async/clients/<int:pk>/", AsyncClientDetailView.as_view(), name="async-client-detail"),
+    path("public/professions/", PublicProfessionListView.as_view(), name="public-profession-list"),
+    path("public/masters/", PublicMasterListView.as_view(), name="public-master-list"),
+    path(
+        "public/masters/<int:pk>/availability/",
+        PublicMasterAvailabilityView.as_view(),
+        name="public-master-availability",
+    ),
+    path("public/bookings/", PublicBookingView.as_view(), name="public-booking"),
     path("", include(router.urls)),
 ]
 
@@ -1,134 +1,677 @@
 from datetime import datetime, timedelta
 
+from django.db import transaction
+from django.db.models import Max, Q
 from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
 from rest_framework.views import APIView
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.authtoken.models import Token
 
-from calendarapp.models import Appointment
-from clients.models import Client
+from calendarapp import cache as calendar_cache
+from calendarapp import occupancy
+from calendarapp.analytics import GAP_BINS, load_utilization, summarize
+from calendarapp.availability import busy_intervals, overlaps
+from calendarapp.booking import CONFLICT_MESSAGE, AppointmentConflict, book_appointment, lock_master
+from calendarapp.events import publish_on_commit
+from calendarapp.export import stream_csv
+from calendarapp.models import Appointment, AppointmentSeries, DeletedEvent, SeriesException
+from calendarapp.ranges import local_date_range, starts_within
+from calendarapp.recurrence import expand_series, with_occurrences
+from calendarapp.sync import InvalidSyncToken, SyncToken, SyncTokenExpired
+from clients import search as client_search
+from clients.models import Client, DeletedClient, MasterClient
+from clients.phones import normalize_phone
+from clients.services import resolve_client, resolve_clients, with_fresh_clients
+from clients.visits import record_visits
 from masters.models import MasterProfile
 
-from .permissions import IsMasterUser
+from .pagination import KeysetPagination, LastVisitKeysetPagination, RecentFirstKeysetPagination
+from .permissions import IsMasterUser, IsStaffOrMaster
+from .renderers import CSVRenderer
 from .serializers import (
     AppointmentCreateSerializer,
+    AppointmentExportSerializer,
+    AppointmentFilterSerializer,
     AppointmentSerializer,
+    AppointmentSeriesSerializer,
+    AvailabilityQuerySerializer,
+    AvailabilitySearchQuerySerializer,
+    ClientSearchQuerySerializer,
     ClientSerializer,
+    FreeSlotSerializer,
+    MasterClientSerializer,
     MasterProfileSerializer,
+    MasterSummarySerializer,
+    OccurrenceEditSerializer,
+    UtilizationQuerySerializer,
+    serialize_calendar_items,
 )
+from .throttling import AddressTokenBucketThrottle, LoginAccountThrottle
+
+
+def master_etag(request, *args, **kwargs):
+    return calendar_cache.get_etag(
+        request.user.masterprofile.pk,
+        request.get_full_path(),
+        request.META.get("HTTP_ACCEPT", ""),
+    )
+
+
+def master_last_modified(request, *args, **kwargs):
+    return calendar_cache.get_changed_at(request.user.masterprofile.pk)
+
+
+def filter_appointments(queryset, params):
+    """Apply validated ``AppointmentFilterSerializer`` params to an appointment queryset."""
+    if "first_day" in params:
+        queryset = queryset.filter(starts_within(params["first_day"], params["last_day"]))
+    if "client" in params:
+        queryset = queryset.filter(client_id=params["client"])
+    if "created_since" in params:
+        queryset = queryset.filter(created_at__gte=params["created_since"])
+    return queryset
+
+
+def filter_occurrences(occurrences, params):
+    """Apply the same params to expanded series occurrences."""
+    if "client" in params:
+        occurrences = [item for item in occurrences if item.client_id == params["client"]]
+    if "created_since" in params:
+        occurrences = [item for item in occurrences if item.created_at >= params["created_since"]]
+    return occurrences
+
+
+def new_appointment(master, data, client, created_by=None):
+    """Unsaved appointment of validated ``AppointmentCreateSerializer`` data booked for ``client``."""
+    return Appointment(
+        master=master,
+        client=client,
+        client_name=data["client_name"],
+        client_phone=client.phone,
+        starts_at=data["starts_at"],
+        ends_at=data["ends_at"],
+        notes=data.get("notes", ""),
+        created_by=created_by,
+    )
+
+
+def create_booking(master, data, created_by=None, rename_client=True):
+    """Book validated ``AppointmentCreateSerializer`` data; raises ``AppointmentConflict``.
+
+    Anonymous bookings pass ``rename_client=False``, so the submitted name is
+    kept on the appointment only and cannot rename an existing client.
+    """
+
+    def write():
+        client = resolve_client(data["client_phone"], data["client_name"], rename=rename_client)
+        return book_appointment(new_appointment(master, data, client, created_by))
+
+    return with_fresh_clients(write)
+
+
+# Answers unchanged GETs with 304 before any serializer runs.
+master_conditional = method_decorator(condition(etag_func=master_etag, last_modified_func=master_last_modified))
 
 
 class CustomAuthToken(ObtainAuthToken):
     """Return auth token plus basic profile info."""
 
+    # Every attempt costs a password hash, so they are limited per address and per account.
+    throttle_classes = [AddressTokenBucketThrottle, LoginAccountThrottle]
+    throttle_scope = "login"
+    account_throttle_scope = "login_account"
+
     def post(self, request, *args, **kwargs):
-        response = super().post(request, *args, **kwargs)
-        token = Token.objects.get(key=response.data["token"])
-        user = token.user
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = serializer.validated_data["user"]
+        token, _ = Token.objects.get_or_create(user=user)
         payload = {"token": token.key, "email": user.email, "user_id": user.id}
-        if hasattr(user, "masterprofile"):
-            payload["master_id"] = user.masterprofile.id
+        master_id = MasterProfile.objects.filter(user=user).values_list("pk", flat=True).first()
+        if master_id is not None:
+            payload["master_id"] = master_id
         return Response(payload)
 
 
 class MasterProfileView(APIView):
     permission_classes = [IsMasterUser]
 
+    @master_conditional
     def get(self, request):
         serializer = MasterProfileSerializer(request.user.masterprofile)
         return Response(serializer.data)
 
 
+class MasterAvailabilityView(APIView):
+    """Free start times of the current master for a day and duration."""
+
+    permission_classes = [IsMasterUser]
+
+    def get(self, request):
+        query = AvailabilityQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        service_date = query.validated_data["date"]
+        duration = timedelta(minutes=query.validated_data["duration"])
+        slots = [
+            {"starts_at": slot, "ends_at": slot + duration}
+            for slot in occupancy.free_slots(request.user.masterprofile, service_date, duration)
+        ]
+        return Response(
+            {
+                "date": service_date,
+                "duration_minutes": query.validated_data["duration"],
+                "slots": FreeSlotSerializer(slots, many=True).data,
+            }
+        )
+
+
+class AvailabilitySearchView(APIView):
+    """Active masters of a profession with free slots on a day, earliest start first.
+
+    All masters are read with a few set-based queries, and the answer is
+    cached until any of them changes their calendar. Start times that have
+    passed are dropped from each response, not from the cached answer.
+    """
+
+    permission_classes = [IsStaffOrMaster]
+    throttle_scope = "search"
+
+    def get(self, request):
+        query = AvailabilitySearchQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        profession = params["profession"]
+        master_ids = list(
+            MasterProfile.objects.filter(profession=profession, status=MasterProfile.Status.ACTIVE)
+            .order_by("id")
+            .values_list("pk", flat=True)
+        )
+        name = calendar_cache.make_name(
+            "api:search:availability", profession.pk, params["date"], params["duration"], params.get("time")
+        )
+        results = calendar_cache.get_or_compute_shared(master_ids, name, lambda: self._search(master_ids, params))
+        if params["date"] == timezone.localdate():
+            results = self._upcoming(results, timezone.now())
+        return Response(
+            {
+                "profession": profession.slug,
+                "date": params["date"],
+                "duration_minutes": params["duration"],
+                "results": results,
+            }
+        )
+
+    def _search(self, master_ids, params):
+        masters = list(MasterProfile.objects.filter(pk__in=master_ids).select_related("user").order_by("id"))
+        duration = timedelta(minutes=params["duration"])
+        slots = occupancy.free_slots_of_masters(masters, params["date"], duration)
+        if "time" in params:
+            slots = {
+                master_id: [start for start in starts if timezone.localtime(start).time() == params["time"]]
+                for master_id, starts in slots.items()
+            }
+        ranked = sorted(
+            (master for master in masters if slots[master.pk]),
+            key=lambda master: (slots[master.pk][0], master.pk),
+        )
+        # Slots are aware in the current timezone already, so the JSON encoder
+        # formats them like a serializer field would, at a fraction of the cost.
+        iso = JSONEncoder().default
+        return [
+            {
+                "master": data,
+                "slots": [{"starts_at": iso(start), "ends_at": iso(start + duration)} for start in slots[master.pk]],
+            }
+            for master, data in zip(ranked, MasterSummarySerializer(ranked, many=True).data)
+        ]
+
+    @staticmethod
+    def _upcoming(results, now):
+        """``results`` without the start times already past, re-ranked by the earliest remaining one."""
+        ranked = []
+        for result in results:
+            slots = [slot for slot in result["slots"] if datetime.fromisoformat(slot["starts_at"]) >= now]
+            if slots:
+                first_start = datetime.fromisoformat(slots[0]["starts_at"])
+                ranked.append((first_start, result["master"]["id"], {**result, "slots": slots}))
+        return [result for *_, result in sorted(ranked, key=lambda item: item[:2])]
+
+
+class MasterUtilizationView(APIView):
+    """Occupancy of the current master over ``?from=&to=``: per day, per week, idle gaps and a heatmap."""
+
+    permission_classes = [IsMasterUser]
+
+    def get(self, request):
+        query = UtilizationQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        first_day, last_day = query.validated_data["first_day"], query.validated_data["last_day"]
+        master = request.user.masterprofile
+
+        def compute():
+            report = summarize(load_utilization([master], first_day, last_day))
+            return {"from": first_day, "to": last_day, **report}
+
+        name = calendar_cache.make_name("api:utilization", first_day, last_day)
+        return Response(calendar_cache.get_or_compute(master.pk, name, compute))
+
+
+class AppointmentExportView(APIView):
+    """Stream the current master's appointments as CSV."""
+
+    permission_classes = [IsMasterUser]
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, CSVRenderer]
+
+    @master_conditional
+    def get(self, request):
+        query = AppointmentExportSerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        return stream_csv(request.user.masterprofile.pk, "appointments.csv", **query.validated_data)
+
+
+class SyncView(APIView):
+    """Changes to the current master's appointments, series and clients since ``?since=``.
+
+    Without a token everything is sent. Appointments come in pages of
+    ``page_size`` ordered by ``(updated_at, id)``; while ``more`` is true the
+    returned token continues the same sync. Series, clients and deletions are
+    sent with the first page only.
+    """
+
+    permission_classes = [IsMasterUser]
+    page_size = 500
+
+    def get(self, request):
+        master = request.user.masterprofile
+        raw_token = request.query_params.get("since")
+        try:
+            token = SyncToken.decode(raw_token) if raw_token else None
+        except SyncTokenExpired:
+            return Response(
+                {"detail": "Токен синхронизации устарел, загрузите данные целиком.", "reset": True},
+                status=status.HTTP_410_GONE,
+            )
+        except InvalidSyncToken:
+            raise ValidationError({"since": "Некорректный токен синхронизации."})
+
+        issued_at = token.issued_at if token and token.after else timezone.now()
+        position = token or SyncToken.full(issued_at)
+        appointments = list(
+            position.changes(Appointment.objects.filter(master=master).select_related("client"))[: self.page_size + 1]
+        )
+        more = len(appointments) > self.page_size
+        appointments = appointments[: self.page_size]
+        data = {
+            "token": SyncToken(
+                issued_at, (appointments[-1].updated_at, appointments[-1].pk) if more else None
+            ).encode(),
+            "more": more,
+            "appointments": AppointmentSerializer(appointments, many=True).data,
+            "series": [],
+            "clients": [],
+            "deleted": {"appointments": [], "series": [], "clients": []},
+        }
+        if token and token.after:
+            return Response(data)
+
+        series = AppointmentSeries.objects.filter(master=master).select_related("client")
+        clients = Client.objects.filter(
+            Q(pk__in=Appointment.objects.filter(master=master).values("client_id"))
+            | Q(pk__in=AppointmentSeries.objects.filter(master=master).values("client_id"))
+        )
+        if token:
+            series = series.filter(updated_at__gte=token.changed_after)
+            clients = clients.filter(updated_at__gte=token.changed_after)
+            deleted_events = DeletedEvent.objects.filter(master=master, deleted_at__gte=token.changed_after)
+            for kind, object_id in deleted_events.values_list("kind", "object_id"):
+                data["deleted"]["appointments" if kind == DeletedEvent.Kind.APPOINTMENT else "series"].append(object_id)
+            deleted_clients = DeletedClient.objects.filter(
+                Q(master=master) | Q(master__isnull=True), deleted_at__gte=token.changed_after
+            )
+            data["deleted"]["clients"] = list(deleted_clients.values_list("client_id", flat=True))
+        data["series"] = AppointmentSeriesSerializer(series.order_by("id"), many=True).data
+        data["clients"] = ClientSerializer(clients.order_by("id"), many=True).data
+        return Response(data)
+
+
+class UtilizationOverviewView(APIView):
+    """Utilization and idle gap counts of every active master, for staff."""
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        query = UtilizationQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        first_day, last_day = query.validated_data["first_day"], query.validated_data["last_day"]
+        masters = MasterProfile.objects.filter(status=MasterProfile.Status.ACTIVE).order_by("id")
+        utilization = load_utilization(masters, first_day, last_day)
+        shares = utilization.shares()
+        gaps = utilization.gap_histogram()
+        return Response(
+            {
+                "from": first_day,
+                "to": last_day,
+                "gap_bins": list(GAP_BINS),
+                "masters": [
+                    {
+                        "master_id": master_id,
+                        "utilization": round(float(shares[position]), 4),
+                        "gaps": gaps[position].tolist(),
+                    }
+                    for position, master_id in enumerate(utilization.master_ids)
+                ],
+            }
+        )
+
+
+class CacheStatsView(APIView):
+    """Hit/miss counters of the calendar cache for staff.
+
+    Counters are per worker process; ``process`` tells which one answered.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(calendar_cache.get_process_stats())
+
+
 class AppointmentViewSet(mixins.ListModelMixin, mixins.CreateModelMixin, viewsets.GenericViewSet):
     serializer_class = AppointmentSerializer
     permission_classes = [IsMasterUser]
+    pagination_class = KeysetPagination
+    throttle_scopes = {"create": "booking", "bulk": "booking"}
+    MAX_BULK_SIZE = 1000
+    # A date window is bounded and returned whole, with ``"next": null``; open-ended history is paginated.
+    is_windowed = False
 
     def get_queryset(self):
         qs = (
             Appointment.objects.filter(master=self.request.user.masterprofile)
             .select_related("client")
-            .order_by("starts_at")
+            .order_by("starts_at", "id")
         )
-        date_param = self.request.query_params.get("date")
-        if date_param:
-            try:
-                target = datetime.strptime(date_param, "%Y-%m-%d").date()
-                qs = qs.filter(starts_at__date=target)
-            except ValueError:
-                pass
-        return qs
+        if self.action != "list":
+            return qs
+        filters = AppointmentFilterSerializer(data=self.request.query_params)
+        filters.is_valid(raise_exception=True)
+        params = self.list_filters = filters.validated_data
+        self.is_windowed = "first_day" in params
+        return filter_appointments(qs, params)
+
+    @master_conditional
+    def list(self, request, *args, **kwargs):
+        name = calendar_cache.make_name("api:appointments", request.query_params.urlencode())
+        data = calendar_cache.get_or_compute(request.user.masterprofile.pk, name, self._build_list)
+        return Response(data)
+
+    def _build_list(self):
+        queryset = self.get_queryset()
+        if not self.is_windowed:
+            page = self.paginate_queryset(queryset)
+            return self.get_paginated_response(self.get_serializer(page, many=True).data).data
+
+        # Recurring series are expanded only for the requested window.
+        params = self.list_filters
+        window = local_date_range(params["first_day"], params["last_day"])
+        occurrences = filter_occurrences(expand_series([self.request.user.masterprofile.pk], *window), params)
+        return {"next": None, "results": serialize_calendar_items(with_occurrences(queryset, occurrences))}
 
     def create(self, request, *args, **kwargs):
-        serializer = AppointmentCreateSerializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
         master = request.user.masterprofile
+        serializer = AppointmentCreateSerializer(data=request.data, context={"master": master})
+        serializer.is_valid(raise_exception=True)
         data = serializer.validated_data
 
-        # Validate start time range
-        start_time = data["start_time"]
-        work_start = master.work_start
-        work_end = master.work_end
-        if not (work_start <= start_time < work_end):
-            return Response(
-                {"start_time": "Время должно быть в пределах рабочего дня мастера."},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
+        try:
+            appointment = create_booking(master, data, created_by=request.user)
+        except AppointmentConflict as exc:
+            return Response({"start_time": str(exc)}, status=status.HTTP_409_CONFLICT)
+
+        output = AppointmentSerializer(appointment)
+        headers = self.get_success_headers(output.data)
+        return Response(output.data, status=status.HTTP_201_CREATED, headers=headers)
+
+    @action(detail=False, methods=["post"])
+    def bulk(self, request):
+        """Create many appointments at once, reporting a result per item.
 
-        if (datetime.combine(datetime.today(), start_time) - datetime.combine(datetime.today(), work_start)).seconds % (
-            15 * 60
-        ):
+        Valid, non-overlapping items are inserted in one transaction; the rest
+        are returned with their errors. Responds 201 if everything was created
+        and 207 otherwise.
+        """
+        if not isinstance(request.data, list) or not request.data:
+            return Response({"detail": "Ожидается непустой список записей."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(request.data) > self.MAX_BULK_SIZE:
             return Response(
-                {"start_time": "Можно выбирать время только с шагом 15 минут."},
+                {"detail": f"Не больше {self.MAX_BULK_SIZE} записей за один запрос."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        service_date = data["service_date"]
-        start_dt_naive = datetime.combine(service_date, start_time)
-        start_dt = timezone.make_aware(start_dt_naive, timezone.get_current_timezone())
-        duration = data["duration_minutes"]
-        end_dt = start_dt + timedelta(minutes=duration)
+        master = request.user.masterprofile
+        results = [None] * len(request.data)
+        valid = []
+        for index, item in enumerate(request.data):
+            serializer = AppointmentCreateSerializer(data=item, context={"master": master})
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                results[index] = {"index": index, "status": "invalid", "errors": serializer.errors}
+        valid.sort(key=lambda pair: pair[1]["starts_at"])
 
-        client, _ = Client.objects.get_or_create(
-            phone=data["client_phone"],
-            defaults={"full_name": data["client_name"]},
-        )
-        if client.full_name != data["client_name"]:
-            client.full_name = data["client_name"]
-            client.save(update_fields=["full_name"])
-
-        appointment = Appointment.objects.create(
-            master=master,
-            client=client,
-            client_name=client.full_name,
-            client_phone=client.phone,
-            starts_at=start_dt,
-            ends_at=end_dt,
-            notes=data.get("notes", ""),
-            created_by=request.user,
-        )
+        def write():
+            lock_master(master.pk)
+            accepted = []
+            if valid:
+                range_start = valid[0][1]["starts_at"]
+                range_end = max(data["ends_at"] for _, data in valid)
+                busy = busy_intervals([master.pk], range_start, range_end)[master.pk]
+                batch_end = None
+                for index, data in valid:
+                    clashes_in_batch = batch_end is not None and data["starts_at"] < batch_end
+                    if clashes_in_batch or overlaps(busy, data["starts_at"], data["ends_at"]):
+                        results[index] = {
+                            "index": index,
+                            "status": "conflict",
+                            "errors": {"start_time": [CONFLICT_MESSAGE]},
+                        }
+                        continue
+                    accepted.append((index, data))
+                    batch_end = max(batch_end or data["ends_at"], data["ends_at"])
 
-        output = AppointmentSerializer(appointment)
-        headers = self.get_success_headers(output.data)
-        return Response(output.data, status=status.HTTP_201_CREATED, headers=headers)
+            if accepted:
+                clients = resolve_clients((data["client_phone"], data["client_name"]) for _, data in accepted)
+                owners = [clients[normalize_phone(data["client_phone"])] for _, data in accepted]
+                appointments = Appointment.objects.bulk_create(
+                    new_appointment(master, data, client, request.user) for (_, data), client in zip(accepted, owners)
+                )
+                for (index, _), appointment in zip(accepted, appointments):
+                    results[index] = {"index": index, "status": "created", "id": appointment.pk}
+                # bulk_create() skips the signals that invalidate the calendar cache, notify listeners
+                # and update client search, visit totals and occupancy masks.
+                calendar_cache.bump_version(master.pk)
+                publish_on_commit(master.pk, {"type": "calendar.changed"})
+                client_search.reindex({client.pk for client in owners}, master.pk)
+                record_visits(appointments)
+                occupancy.refresh_appointments(appointments)
+            return accepted
+
+        accepted = with_fresh_clients(write)
+
+        response_status = status.HTTP_201_CREATED if len(accepted) == len(results) else status.HTTP_207_MULTI_STATUS
+        return Response({"created": len(accepted), "results": results}, status=response_status)
 
 
 class ClientViewSet(mixins.RetrieveModelMixin, viewsets.GenericViewSet):
     serializer_class = ClientSerializer
     permission_classes = [IsMasterUser]
+    pagination_class = LastVisitKeysetPagination
+    throttle_scopes = {"search": "search"}
 
     def get_queryset(self):
-        master = self.request.user.masterprofile
-        client_ids = master.appointments.values_list("client_id", flat=True)
-        return Client.objects.filter(id__in=client_ids)
+        return Client.objects.filter(master_links__master=self.request.user.masterprofile)
+
+    @master_conditional
+    def list(self, request):
+        """The master's clients with their visit totals, most recent visit first."""
+        links = MasterClient.objects.filter(master=request.user.masterprofile).select_related("client")
+        page = self.paginate_queryset(links)
+        return self.get_paginated_response(MasterClientSerializer(page, many=True).data)
 
-    @action(detail=True, methods=["get"])
+    @master_conditional
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @action(detail=False, methods=["get"])
+    def search(self, request):
+        """Autocomplete over the master's clients by name, phone, email and appointment notes."""
+        query = ClientSearchQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        clients = client_search.search_clients(
+            request.user.masterprofile.pk, query.validated_data["q"], query.validated_data["limit"]
+        )
+        return Response(ClientSerializer(clients, many=True).data)
+
+    @action(detail=True, methods=["get"], pagination_class=RecentFirstKeysetPagination)
+    @master_conditional
     def appointments(self, request, pk=None):
         client = self.get_object()
-        appointments = client.appointments.filter(master=request.user.masterprofile).order_by("-starts_at")
-        serializer = AppointmentSerializer(appointments, many=True)
-        return Response(serializer.data)
+        appointments = client.appointments.filter(master=request.user.masterprofile)
+        page = self.paginate_queryset(appointments)
+        serializer = AppointmentSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+
+class AppointmentSeriesViewSet(
+    mixins.ListModelMixin,
+    mixins.CreateModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet,
+):
+    """Standing bookings whose occurrences are expanded on read."""
+
+    serializer_class = AppointmentSeriesSerializer
+    permission_classes = [IsMasterUser]
+    throttle_scopes = {"create": "booking"}
+    # New series are checked against other series this far past the later start.
+    CONFLICT_HORIZON_DAYS = 90
+
+    def get_queryset(self):
+        return AppointmentSeries.objects.filter(master=self.request.user.masterprofile).select_related(
+            "client", "master"
+        )
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["master"] = self.request.user.masterprofile
+        return context
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        master = request.user.masterprofile
+        data = serializer.validated_data
+        series = AppointmentSeries(master=master, created_by=request.user, **data)
+
+        def write():
+            lock_master(master.pk)
+            clashes = self._find_clashes(series)
+            if clashes:
+                return clashes
+            series.client = resolve_client(data["client_phone"], data["client_name"])
+            series.save()
+
+        clashes = with_fresh_clients(write)
+        if clashes:
+            return Response({"start_time": CONFLICT_MESSAGE, "dates": clashes}, status=status.HTTP_409_CONFLICT)
+        return Response(self.get_serializer(series).data, status=status.HTTP_201_CREATED)
+
+    def _find_clashes(self, series):
+        first_day = max(series.start_date, timezone.localdate())
+        # Appointments are finite, so all of them are checked; other series repeat
+        # and are checked over the horizon after the latest of them starts.
+        last_start = AppointmentSeries.objects.filter(master_id=series.master_id).aggregate(last=Max("start_date"))
+        last_day = max(first_day, last_start["last"] or first_day) + timedelta(days=self.CONFLICT_HORIZON_DAYS)
+        last_end = Appointment.objects.filter(master_id=series.master_id).aggregate(last=Max("ends_at"))["last"]
+        if last_end is not None:
+            last_day = max(last_day, timezone.localdate(last_end))
+        if series.until:
+            last_day = min(last_day, series.until)
+        busy = busy_intervals([series.master_id], *local_date_range(first_day, last_day))[series.master_id]
+        return [
+            day
+            for day in series.occurrence_dates(first_day, last_day)
+            if overlaps(busy, *series.occurrence_bounds(day))
+        ]
+
+    @action(detail=True, methods=["post"])
+    def cancel(self, request, pk=None):
+        """Skip one occurrence of the series; 409 if it is already a regular appointment."""
+        series = self.get_object()
+        serializer = OccurrenceEditSerializer(data=request.data, context={"series": series})
+        serializer.is_valid(raise_exception=True)
+        exception, _ = SeriesException.objects.get_or_create(
+            series=series, occurrence_date=serializer.validated_data["date"]
+        )
+        if exception.appointment_id is not None:
+            return Response(
+                {
+                    "date": "Это повторение уже стало отдельной записью, отмените её.",
+                    "appointment": exception.appointment_id,
+                },
+                status=status.HTTP_409_CONFLICT,
+            )
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=True, methods=["post"])
+    def materialize(self, request, pk=None):
+        """Turn one occurrence into a regular appointment, optionally changing it."""
+        series = self.get_object()
+        serializer = OccurrenceEditSerializer(data=request.data, context={"series": series})
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        day = data["date"]
+        start_time = data.get("start_time", series.start_time)
+        starts_at = timezone.make_aware(datetime.combine(day, start_time), timezone.get_current_timezone())
+        ends_at = starts_at + timedelta(minutes=data.get("duration_minutes", series.duration_minutes))
+
+        try:
+            with transaction.atomic():
+                exception, created = SeriesException.objects.get_or_create(series=series, occurrence_date=day)
+                if not created:
+                    return Response(
+                        {"date": "Это повторение уже отменено или изменено."},
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
+                appointment = book_appointment(
+                    Appointment(
+                        master=series.master,
+                        client=series.client,
+                        client_name=series.client_name,
+                        client_phone=series.client_phone,
+                        starts_at=starts_at,
+                        ends_at=ends_at,
+                        notes=data.get("notes", series.notes),
+                        created_by=request.user,
+                        series=series,
+                        occurrence_date=day,
+                    )
+                )
+                exception.appointment = appointment
+                exception.save(update_fields=["appointment"])
+        except AppointmentConflict as exc:
+            return Response({"start_time": str(exc)}, status=status.HTTP_409_CONFLICT)
+
+        return Response(AppointmentSerializer(appointment).data, status=status.HTTP_201_CREATED)
 
 # Create your views here.
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Appointment
+from .models import Appointment, AppointmentSeries, CalendarFeed, SeriesException
 
 
 @admin.register(Appointment)
@@ -8,3 +8,23 @@ class AppointmentAdmin(admin.ModelAdmin):
     list_display = ("master", "client_name", "starts_at", "ends_at")
     search_fields = ("client_name", "client_phone", "notes")
     list_filter = ("master",)
+
+
+class SeriesExceptionInline(admin.TabularInline):
+    model = SeriesException
+    extra = 0
+    raw_id_fields = ("appointment",)
+
+
+@admin.register(AppointmentSeries)
+class AppointmentSeriesAdmin(admin.ModelAdmin):
+    list_display = ("master", "client_name", "start_date", "start_time", "frequency", "interval", "until")
+    search_fields = ("client_name", "client_phone", "notes")
+    list_filter = ("master", "frequency")
+    inlines = [SeriesExceptionInline]
+
+
+@admin.register(CalendarFeed)
+class CalendarFeedAdmin(admin.ModelAdmin):
+    list_display = ("master", "created_at")
+    readonly_fields = ("token",)
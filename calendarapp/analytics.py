@@ -0,0 +1,322 @@
+"""Occupancy analytics over 15-minute slots, computed with NumPy.
+
+A date range is laid out as a ``(masters, days, slots)`` boolean matrix in
+local wall-clock time, the same grid the booking form offers. Appointments
+are loaded as integer epochs straight from the database and recurring
+occurrences are placed by date arithmetic, so no model instances are
+built; everything after loading is array operations.
+"""
+
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+
+import numpy as np
+from django.db import connection
+from django.db.models import Aggregate, F, Func, IntegerField, TextField
+from django.utils import timezone
+
+from .availability import MAX_DURATION, SLOT_STEP
+from .models import Appointment
+from .ranges import local_date_range
+from .recurrence import _window_series
+
+SLOT_SECONDS = int(SLOT_STEP.total_seconds())
+SLOTS_PER_DAY = 24 * 60 * 60 // SLOT_SECONDS
+# Lower edges of the idle gap histogram, in minutes; the last bin is open.
+GAP_BINS = (15, 30, 45, 60, 90, 120, 180)
+MAX_RANGE_DAYS = 366
+# Length of a datetime with whole seconds as SQLite stores it: "2026-01-01 09:00:00".
+DATETIME_TEXT_LENGTH = 19
+
+
+class Epoch(Func):
+    """Seconds since 1970 of a datetime column, without building ``datetime`` objects."""
+
+    output_field = IntegerField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # Escaped twice: once for this template and once for the query parameters.
+        return self.as_sql(compiler, connection, template="CAST(strftime('%%%%s', %(expressions)s) AS INTEGER)")
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template="EXTRACT(EPOCH FROM %(expressions)s)::bigint")
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template="UNIX_TIMESTAMP(%(expressions)s)")
+
+
+class GroupConcat(Aggregate):
+    """Comma-separated values of a column within a group (SQLite)."""
+
+    function = "group_concat"
+    output_field = TextField()
+
+
+def _fetch_array(queryset, columns):
+    """Rows of a ``values_list`` queryset as an ``int64`` array, bypassing model conversion."""
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    return np.array(rows, dtype=np.int64).reshape(-1, columns)
+
+
+def _parse_datetimes(joined):
+    """UTC epochs of comma-joined datetimes stored by SQLite."""
+    data = (joined + ",").encode()
+    width = DATETIME_TEXT_LENGTH + 1
+    if len(data) % width == 0 and (np.frombuffer(data, dtype=np.uint8)[DATETIME_TEXT_LENGTH::width] == ord(",")).all():
+        # No fractional seconds anywhere: read the fixed-width records in place.
+        text = np.ndarray((len(data) // width,), dtype=f"S{DATETIME_TEXT_LENGTH}", buffer=data, strides=(width,))
+    else:
+        text = joined.split(",")
+    return np.asarray(text, dtype="datetime64[s]").astype(np.int64)
+
+
+def _seconds(value):
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+def _slot_ceil(seconds):
+    return -(-seconds // SLOT_SECONDS)
+
+
+@dataclass
+class Utilization:
+    """Booked and working slots of masters over local dates ``first_day..last_day``.
+
+    ``booked`` has shape ``(masters, days, SLOTS_PER_DAY)``; ``working`` has
+    shape ``(masters, SLOTS_PER_DAY)`` as working hours repeat every day.
+    """
+
+    master_ids: list
+    first_day: date
+    booked: np.ndarray
+    working: np.ndarray
+
+    @property
+    def days(self):
+        return [self.first_day + timedelta(days=offset) for offset in range(self.booked.shape[1])]
+
+    def booked_working(self):
+        return self.booked & self.working[:, None, :]
+
+    def daily(self):
+        """``(booked, working)`` slot counts per master and day."""
+        booked = self.booked_working().sum(axis=2)
+        working = np.broadcast_to(self.working.sum(axis=1)[:, None], booked.shape)
+        return booked, working
+
+    def shares(self):
+        """Booked share of working slots per master over the whole range."""
+        booked, working = self.daily()
+        booked, working = booked.sum(axis=1), working.sum(axis=1)
+        return np.divide(booked, working, out=np.zeros(len(booked)), where=working > 0)
+
+    def weekly(self):
+        """Week start dates and ``(booked, working)`` slot counts per master and ISO week."""
+        booked, working = self.daily()
+        weekdays = (self.first_day.weekday() + np.arange(booked.shape[1])) % 7
+        starts = np.flatnonzero((weekdays == 0) | (np.arange(booked.shape[1]) == 0))
+        week_starts = [self.first_day + timedelta(days=int(start)) for start in starts]
+        return week_starts, np.add.reduceat(booked, starts, axis=1), np.add.reduceat(working, starts, axis=1)
+
+    def gaps(self):
+        """Lengths in slots of idle runs inside working hours between two bookings of a day.
+
+        Returns ``(master_index, length)`` arrays, one entry per gap.
+        """
+        masters, days, slots = self.booked.shape
+        # 0 free working slot, 1 booked, 2 outside working hours.
+        state = np.where(self.working[:, None, :], self.booked.astype(np.int8), 2).astype(np.int8)
+        padded = np.full((masters * days, slots + 2), 2, dtype=np.int8)
+        padded[:, 1:-1] = state.reshape(masters * days, slots)
+        flat = padded.ravel()
+        edges = np.diff((flat == 0).astype(np.int8))
+        starts = np.flatnonzero(edges == 1) + 1
+        ends = np.flatnonzero(edges == -1) + 1
+        between_bookings = (flat[starts - 1] == 1) & (flat[ends] == 1)
+        starts, ends = starts[between_bookings], ends[between_bookings]
+        return starts // ((slots + 2) * days), ends - starts
+
+    def gap_histogram(self):
+        """Gap counts per master in ``GAP_BINS``, shape ``(masters, len(GAP_BINS))``."""
+        master_index, lengths = self.gaps()
+        bins = np.searchsorted(np.array(GAP_BINS) // (SLOT_SECONDS // 60), lengths, side="right") - 1
+        histogram = np.zeros((len(self.master_ids), len(GAP_BINS)), dtype=np.int64)
+        np.add.at(histogram, (master_index, bins), 1)
+        return histogram
+
+    def weekday_heatmap(self):
+        """Share of days each weekday slot was booked, shape ``(masters, 7, SLOTS_PER_DAY)``."""
+        weekdays = (self.first_day.weekday() + np.arange(self.booked.shape[1])) % 7
+        heatmap = np.zeros((len(self.master_ids), 7, SLOTS_PER_DAY))
+        for weekday in range(7):
+            selected = self.booked[:, weekdays == weekday, :]
+            if selected.shape[1]:
+                heatmap[:, weekday, :] = selected.mean(axis=1)
+        return heatmap
+
+
+def _day_grid(first_day, days, tz):
+    """UTC epochs of each local midnight and the UTC offset in effect at each local noon."""
+    midnights = np.array(
+        [
+            int(timezone.make_aware(datetime.combine(first_day + timedelta(days=offset), time.min), tz).timestamp())
+            for offset in range(days + 1)
+        ],
+        dtype=np.int64,
+    )
+    offsets = np.array(
+        [
+            int(
+                timezone.make_aware(datetime.combine(first_day + timedelta(days=offset), time(12)), tz)
+                .utcoffset()
+                .total_seconds()
+            )
+            for offset in range(days)
+        ],
+        dtype=np.int64,
+    )
+    return midnights, offsets
+
+
+def _epochs_to_slots(epochs, first_day, midnights, offsets, ceil=False):
+    """Global wall-clock slot indexes of UTC epochs; a day's offset is taken at its noon."""
+    days = len(offsets)
+    day_index = np.clip(np.searchsorted(midnights, epochs, side="right") - 1, 0, days - 1)
+    wall_midnights = (np.arange(days, dtype=np.int64) + first_day.toordinal() - date(1970, 1, 1).toordinal()) * 86400
+    wall_seconds = epochs + offsets[day_index] - wall_midnights[day_index]
+    if ceil:
+        wall_seconds = wall_seconds + SLOT_SECONDS - 1
+    return day_index * SLOTS_PER_DAY + np.floor_divide(wall_seconds, SLOT_SECONDS)
+
+
+def _appointment_epochs(queryset):
+    """``(master_id, starts, ends)`` arrays of the appointments, as UTC epochs."""
+    if connection.vendor != "sqlite":
+        rows = _fetch_array(queryset.values_list("master_id", Epoch(F("starts_at")), Epoch(F("ends_at"))), 3)
+        return rows[:, 0], rows[:, 1], rows[:, 2]
+    # SQLite keeps datetimes as UTC text. Joining them per master and parsing
+    # in NumPy is several times faster than converting and fetching each row.
+    grouped = queryset.values("master_id").annotate(starts=GroupConcat("starts_at"), ends=GroupConcat("ends_at"))
+    masters, starts, ends = [], [], []
+    for master_id, joined_starts, joined_ends in grouped.values_list("master_id", "starts", "ends"):
+        master_starts = _parse_datetimes(joined_starts)
+        masters.append(np.full(len(master_starts), master_id, dtype=np.int64))
+        starts.append(master_starts)
+        ends.append(_parse_datetimes(joined_ends))
+    if not masters:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+    return np.concatenate(masters), np.concatenate(starts), np.concatenate(ends)
+
+
+def _appointment_intervals(index, first_day, last_day, tz):
+    range_start, range_end = local_date_range(first_day, last_day, tz)
+    master_ids, start_epochs, end_epochs = _appointment_epochs(
+        Appointment.objects.filter(
+            master_id__in=list(index),
+            starts_at__gt=range_start - MAX_DURATION,
+            starts_at__lt=range_end,
+            ends_at__gt=range_start,
+        ).order_by()
+    )
+    days = (last_day - first_day).days + 1
+    midnights, offsets = _day_grid(first_day, days, tz)
+    ids = np.fromiter(index, dtype=np.int64, count=len(index))
+    order = np.argsort(ids)
+    masters = order[np.searchsorted(ids, master_ids, sorter=order)]
+    starts = _epochs_to_slots(start_epochs, first_day, midnights, offsets)
+    ends = _epochs_to_slots(end_epochs, first_day, midnights, offsets, ceil=True)
+    return masters, starts, ends
+
+
+def _occurrence_intervals(index, first_day, last_day, tz):
+    series_list, window_first, window_last = _window_series(list(index), *local_date_range(first_day, last_day, tz))
+    masters, starts, ends = [], [], []
+    for series in series_list:
+        skipped = {exception.occurrence_date for exception in series.window_exceptions}
+        ordinals = np.array(
+            [day.toordinal() for day in series.occurrence_dates(window_first, window_last) if day not in skipped],
+            dtype=np.int64,
+        )
+        day_slots = (ordinals - first_day.toordinal()) * SLOTS_PER_DAY
+        start_seconds = _seconds(series.start_time)
+        start = day_slots + start_seconds // SLOT_SECONDS
+        end = day_slots + _slot_ceil(start_seconds + series.duration_minutes * 60)
+        masters.append(np.full(len(ordinals), index[series.master_id], dtype=np.int64))
+        starts.append(start)
+        ends.append(end)
+    if not masters:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+    return np.concatenate(masters), np.concatenate(starts), np.concatenate(ends)
+
+
+def load_utilization(masters, first_day, last_day, tz=None):
+    """``Utilization`` of ``masters`` (profiles) over local dates ``first_day..last_day``.
+
+    Costs one query for appointments and two for series with their exceptions.
+    """
+    tz = tz or timezone.get_current_timezone()
+    masters = list(masters)
+    index = {master.pk: position for position, master in enumerate(masters)}
+    days = (last_day - first_day).days + 1
+    total = days * SLOTS_PER_DAY
+
+    parts = [_appointment_intervals(index, first_day, last_day, tz)]
+    if masters:
+        parts.append(_occurrence_intervals(index, first_day, last_day, tz))
+    master_index = np.concatenate([part[0] for part in parts])
+    starts = np.clip(np.concatenate([part[1] for part in parts]), 0, total)
+    ends = np.clip(np.concatenate([part[2] for part in parts]), 0, total)
+
+    # +1 at each start and -1 at each end; a running sum above zero is booked.
+    width = total + 1
+    changes = np.bincount(master_index * width + starts, minlength=len(masters) * width)
+    changes -= np.bincount(master_index * width + ends, minlength=len(masters) * width)
+    booked = np.cumsum(changes.reshape(len(masters), width), axis=1)[:, :total] > 0
+
+    slots = np.arange(SLOTS_PER_DAY)
+    work_start = np.array([_seconds(master.work_start) // SLOT_SECONDS for master in masters], dtype=np.int64)
+    work_end = np.array([_slot_ceil(_seconds(master.work_end)) for master in masters], dtype=np.int64)
+    working = (slots >= work_start[:, None]) & (slots < work_end[:, None])
+    return Utilization(
+        master_ids=list(index),
+        first_day=first_day,
+        booked=booked.reshape(len(masters), days, SLOTS_PER_DAY),
+        working=working.reshape(len(masters), SLOTS_PER_DAY),
+    )
+
+
+def summarize(utilization, position=0):
+    """JSON-ready report of one master of ``utilization``."""
+    booked, working = utilization.daily()
+    week_starts, week_booked, week_working = utilization.weekly()
+    slot_minutes = SLOT_SECONDS // 60
+    return {
+        "utilization": _share(booked[position].sum(), working[position].sum()),
+        "days": [
+            {
+                "date": day,
+                "booked_minutes": int(booked[position, offset]) * slot_minutes,
+                "working_minutes": int(working[position, offset]) * slot_minutes,
+                "utilization": _share(booked[position, offset], working[position, offset]),
+            }
+            for offset, day in enumerate(utilization.days)
+        ],
+        "weeks": [
+            {"week_start": start, "utilization": _share(week_booked[position, offset], week_working[position, offset])}
+            for offset, start in enumerate(week_starts)
+        ],
+        "gaps": {
+            "bins": list(GAP_BINS),
+            "counts": utilization.gap_histogram()[position].tolist(),
+        },
+        "heatmap": np.round(utilization.weekday_heatmap()[position], 3).tolist(),
+    }
+
+
+def _share(part, whole):
+    return round(float(part) / float(whole), 4) if whole else 0.0
@@ -0,0 +1,113 @@
+from bisect import bisect_right
+from datetime import datetime, timedelta
+
+from django.utils import timezone
+
+from .models import Appointment
+from .recurrence import aexpand_series, expand_series
+
+SLOT_STEP = timedelta(minutes=15)
+# Longest booking the form and the API accept; lets range lookups use a bounded index seek.
+MAX_DURATION = timedelta(minutes=600)
+
+
+def merge_intervals(intervals):
+    """Merge ``(start, end)`` pairs sorted by start into non-overlapping intervals."""
+    merged = []
+    for start, end in intervals:
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def overlaps(intervals, start, end):
+    """Whether ``[start, end)`` overlaps any of the merged, sorted ``intervals``."""
+    index = bisect_right(intervals, start, key=lambda interval: interval[1])
+    return index < len(intervals) and intervals[index][0] < end
+
+
+def _busy_rows(master_ids, range_start, range_end):
+    return (
+        Appointment.objects.filter(
+            master_id__in=master_ids,
+            starts_at__gt=range_start - MAX_DURATION,
+            starts_at__lt=range_end,
+            ends_at__gt=range_start,
+        )
+        .order_by("master_id", "starts_at")
+        .values_list("master_id", "starts_at", "ends_at")
+    )
+
+
+def _group_busy(master_ids, rows, occurrences):
+    busy = {master_id: [] for master_id in master_ids}
+    for master_id, starts_at, ends_at in rows:
+        busy[master_id].append((starts_at, ends_at))
+    for occurrence in occurrences:
+        busy[occurrence.master_id].append((occurrence.starts_at, occurrence.ends_at))
+    return {master_id: merge_intervals(sorted(intervals)) for master_id, intervals in busy.items()}
+
+
+def busy_intervals(master_ids, range_start, range_end):
+    """Return merged busy intervals per master overlapping ``[range_start, range_end)``.
+
+    All masters are loaded with a single query over the ``(master, starts_at)`` index,
+    plus the occurrences of their recurring series within the range.
+    """
+    master_ids = list(master_ids)
+    rows = _busy_rows(master_ids, range_start, range_end)
+    return _group_busy(master_ids, rows, expand_series(master_ids, range_start, range_end))
+
+
+async def abusy_intervals(master_ids, range_start, range_end):
+    """Async version of ``busy_intervals``."""
+    master_ids = list(master_ids)
+    rows = [row async for row in _busy_rows(master_ids, range_start, range_end)]
+    return _group_busy(master_ids, rows, await aexpand_series(master_ids, range_start, range_end))
+
+
+def work_window(master, day, tz=None):
+    """Aware ``(start, end)`` of the master's working hours on ``day``."""
+    tz = tz or timezone.get_current_timezone()
+    return (
+        timezone.make_aware(datetime.combine(day, master.work_start), tz),
+        timezone.make_aware(datetime.combine(day, master.work_end), tz),
+    )
+
+
+def free_slots_in_window(window_start, window_end, busy, duration, step=SLOT_STEP):
+    """Start times on the ``step`` grid from ``window_start`` where ``duration`` fits.
+
+    ``busy`` must be merged intervals sorted by start.
+    """
+    slots = []
+    candidate = window_start
+    for busy_start, busy_end in [*busy, (window_end, window_end)]:
+        limit = min(busy_start, window_end)
+        while candidate + duration <= limit:
+            slots.append(candidate)
+            candidate += step
+        if busy_end > candidate:
+            steps = -(-(busy_end - window_start) // step)
+            candidate = window_start + steps * step
+        if candidate >= window_end:
+            break
+    return slots
+
+
+def free_slots(master, day, duration, busy=None):
+    """Free start times for ``master`` on ``day`` that fit ``duration``."""
+    window_start, window_end = work_window(master, day)
+    if busy is None:
+        busy = busy_intervals([master.pk], window_start, window_end)[master.pk]
+    return free_slots_in_window(window_start, window_end, busy, duration)
+
+
+async def afree_slots(master, day, duration):
+    """Async version of ``free_slots``."""
+    window_start, window_end = work_window(master, day)
+    busy = (await abusy_intervals([master.pk], window_start, window_end))[master.pk]
+    return free_slots_in_window(window_start, window_end, busy, duration)
@@ -0,0 +1,63 @@
+from django.db import IntegrityError, connection, transaction
+
+from masters.models import MasterProfile
+
+from .availability import MAX_DURATION
+from .models import Appointment
+from .recurrence import expand_series
+
+CONFLICT_MESSAGE = "Это время уже занято другой записью."
+
+
+class AppointmentConflict(Exception):
+    """Raised when a booking overlaps an existing appointment of the master."""
+
+
+def find_conflicts(master_id, starts_at, ends_at, exclude_pk=None):
+    """Appointments of the master overlapping ``[starts_at, ends_at)``.
+
+    The predicate is a bounded range over the ``(master, starts_at, ends_at)`` index.
+    """
+    qs = Appointment.objects.filter(
+        master_id=master_id,
+        starts_at__gt=starts_at - MAX_DURATION,
+        starts_at__lt=ends_at,
+        ends_at__gt=starts_at,
+    )
+    if exclude_pk is not None:
+        qs = qs.exclude(pk=exclude_pk)
+    return qs
+
+
+def is_slot_taken(master_id, starts_at, ends_at, exclude_pk=None):
+    """Whether ``[starts_at, ends_at)`` clashes with a booking or a series occurrence."""
+    if find_conflicts(master_id, starts_at, ends_at, exclude_pk).exists():
+        return True
+    return bool(expand_series([master_id], starts_at, ends_at))
+
+
+def lock_master(master_id):
+    """Serialize concurrent bookings of one master until the transaction ends.
+
+    SQLite takes the database write lock on ``BEGIN IMMEDIATE`` (see the
+    ``transaction_mode`` database option), other backends lock the master row.
+    """
+    if connection.features.has_select_for_update:
+        list(MasterProfile.objects.select_for_update().filter(pk=master_id).values_list("pk", flat=True))
+
+
+def book_appointment(appointment):
+    """Save ``appointment`` unless it overlaps another booking of its master.
+
+    Must be called inside ``transaction.atomic()`` together with any related
+    writes (e.g. the client upsert) so that a conflict rolls them back.
+    """
+    lock_master(appointment.master_id)
+    if is_slot_taken(appointment.master_id, appointment.starts_at, appointment.ends_at, appointment.pk):
+        raise AppointmentConflict(CONFLICT_MESSAGE)
+    try:
+        with transaction.atomic():
+            appointment.save()
+    except IntegrityError as exc:
+        raise AppointmentConflict(CONFLICT_MESSAGE) from exc
+    return appointment
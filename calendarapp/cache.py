@@ -0,0 +1,193 @@
+import hashlib
+import os
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import cache, caches
+
+VERSION_KEY = "calendar:version:{master_id}"
+CHANGED_AT_KEY = "calendar:changed-at:{master_id}"
+ENTRY_KEY = "calendar:{master_id}:{version}:{name}"
+SHARED_ENTRY_KEY = "calendar:shared:{name}:{versions}"
+# Kept in the local-memory cache next to the entries they count, so each worker
+# process has its own counters and recording a lookup costs no shared I/O.
+PROCESS_STATS_KEY = "calendar:process-stats:{stat}"
+
+_MISSING = object()
+
+
+def _versions():
+    # Versions and change times must be seen by every worker process, or a
+    # booking made in one would leave the others serving stale entries.
+    return caches[settings.CALENDAR_VERSION_CACHE]
+
+
+def get_version(master_id):
+    """Current calendar version of the master.
+
+    Missing counters start from the clock, so a counter lost to eviction
+    never falls back to a version that already has entries cached.
+    """
+    store = _versions()
+    key = VERSION_KEY.format(master_id=master_id)
+    version = store.get(key)
+    if version is None:
+        store.add(key, time.time_ns(), timeout=None)
+        version = store.get(key)
+    return version
+
+
+async def aget_version(master_id):
+    """Async version of ``get_version``; the shared store is read off the event loop."""
+    store = _versions()
+    key = VERSION_KEY.format(master_id=master_id)
+    version = await store.aget(key)
+    if version is None:
+        await store.aadd(key, time.time_ns(), timeout=None)
+        version = await store.aget(key)
+    return version
+
+
+def get_versions(master_ids):
+    """Current versions of several masters, read in one round trip."""
+    keys = {master_id: VERSION_KEY.format(master_id=master_id) for master_id in master_ids}
+    found = _versions().get_many(keys.values())
+    return {
+        master_id: found[key] if key in found else get_version(master_id) for master_id, key in keys.items()
+    }
+
+
+def bump_version(master_id):
+    """Invalidate every cached entry of the master.
+
+    The new version is a fresh clock reading rather than an increment, so
+    concurrent bumps from several processes never settle on the same value
+    without a read-modify-write.
+    """
+    store = _versions()
+    store.set_many(
+        {
+            VERSION_KEY.format(master_id=master_id): time.time_ns(),
+            CHANGED_AT_KEY.format(master_id=master_id): time.time(),
+        },
+        timeout=None,
+    )
+
+
+def get_changed_at(master_id):
+    """When the master's calendar last changed, as an aware datetime.
+
+    Unknown change times are reset to now, which only costs clients one full response.
+    """
+    store = _versions()
+    key = CHANGED_AT_KEY.format(master_id=master_id)
+    changed_at = store.get(key)
+    if changed_at is None:
+        store.add(key, time.time(), timeout=None)
+        changed_at = store.get(key)
+    return datetime.fromtimestamp(changed_at, tz=timezone.utc)
+
+
+async def aget_changed_at(master_id):
+    """Async version of ``get_changed_at``."""
+    store = _versions()
+    key = CHANGED_AT_KEY.format(master_id=master_id)
+    changed_at = await store.aget(key)
+    if changed_at is None:
+        await store.aadd(key, time.time(), timeout=None)
+        changed_at = await store.aget(key)
+    return datetime.fromtimestamp(changed_at, tz=timezone.utc)
+
+
+def get_etag(master_id, *parts):
+    """Validator for a response derived from the master's calendar.
+
+    ``parts`` distinguish representations sharing the same data (path, format, day).
+    """
+    return f"{master_id}-{get_version(master_id)}-{make_name(*parts)}"
+
+
+async def aget_etag(master_id, *parts):
+    """Async version of ``get_etag``."""
+    return f"{master_id}-{await aget_version(master_id)}-{make_name(*parts)}"
+
+
+def _record(stat):
+    key = PROCESS_STATS_KEY.format(stat=stat)
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        pass
+
+
+def get_process_stats():
+    """Hit/miss counters of the calendar cache in this worker process since its last reset."""
+    hits = cache.get(PROCESS_STATS_KEY.format(stat="hits"), 0)
+    misses = cache.get(PROCESS_STATS_KEY.format(stat="misses"), 0)
+    total = hits + misses
+    return {"process": os.getpid(), "hits": hits, "misses": misses, "hit_rate": hits / total if total else 0.0}
+
+
+def reset_process_stats():
+    cache.delete_many([PROCESS_STATS_KEY.format(stat="hits"), PROCESS_STATS_KEY.format(stat="misses")])
+
+
+def make_name(*parts):
+    """Build a short cache entry name from arbitrary parts (e.g. a query string)."""
+    raw = ":".join(str(part) for part in parts)
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def get_or_compute(master_id, name, compute, timeout=None):
+    """Return the cached value for the master, computing it on a miss.
+
+    ``timeout`` shortens the lifetime of values that also age with the clock.
+    """
+    key = ENTRY_KEY.format(master_id=master_id, version=get_version(master_id), name=name)
+    value = cache.get(key, _MISSING)
+    if value is _MISSING:
+        _record("misses")
+        value = compute()
+        cache.set(key, value, timeout=settings.CALENDAR_CACHE_TIMEOUT if timeout is None else timeout)
+    else:
+        _record("hits")
+    return value
+
+
+def get_or_compute_shared(master_ids, name, compute):
+    """Like ``get_or_compute`` for a value derived from the calendars of several masters.
+
+    The key covers every master's version, so a change to any of them is a miss.
+    """
+    versions = get_versions(master_ids)
+    digest = make_name(*(f"{master_id}.{versions[master_id]}" for master_id in sorted(versions)))
+    key = SHARED_ENTRY_KEY.format(name=name, versions=digest)
+    value = cache.get(key, _MISSING)
+    if value is _MISSING:
+        _record("misses")
+        value = compute()
+        cache.set(key, value, timeout=settings.CALENDAR_CACHE_TIMEOUT)
+    else:
+        _record("hits")
+    return value
+
+
+async def aget_or_compute(master_id, name, compute):
+    """Async version of ``get_or_compute``; ``compute`` is a coroutine function.
+
+    The version comes from the shared file store and is read off the event
+    loop. Entries live in local memory, which never blocks, so they are read
+    directly.
+    """
+    key = ENTRY_KEY.format(master_id=master_id, version=await aget_version(master_id), name=name)
+    value = cache.get(key, _MISSING)
+    if value is _MISSING:
+        _record("misses")
+        value = await compute()
+        cache.set(key, value, timeout=settings.CALENDAR_CACHE_TIMEOUT)
+    else:
+        _record("hits")
+    return value
+
@@ -0,0 +1,193 @@
+import asyncio
+import json
+import os
+import uuid
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+# Events a slow subscriber may fall behind by before it is told to reload.
+SUBSCRIBER_BACKLOG = 100
+FILE_POLL_INTERVAL = 0.5
+FILE_MAX_BYTES = 1024 * 1024
+
+
+class Subscription:
+    """Queue of one SSE connection, bound to the event loop that serves it."""
+
+    def __init__(self, broker, master_id):
+        self.broker = broker
+        self.master_id = master_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_BACKLOG)
+        self.lagged = False
+
+    def push(self, event):
+        # Runs on ``self.loop``.
+        if self.lagged:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Ask the client to reload rather than replay a backlog it cannot keep up with.
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": "reset"})
+            self.lagged = True
+
+    async def get(self):
+        event = await self.queue.get()
+        if event["type"] == "reset":
+            self.lagged = False
+        return event
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class Broker:
+    """In-process pub/sub of calendar events keyed by master.
+
+    ``publish`` may be called from any thread; delivery happens on the loop
+    of each subscriber, so an idle connection costs one queue and one
+    suspended coroutine.
+    """
+
+    def __init__(self):
+        self._subscribers = {}
+
+    def subscribe(self, master_id):
+        subscription = Subscription(self, master_id)
+        self._subscribers.setdefault(master_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscribers = self._subscribers.get(subscription.master_id, set())
+        subscribers.discard(subscription)
+        if not subscribers:
+            self._subscribers.pop(subscription.master_id, None)
+
+    def has_subscribers(self):
+        return bool(self._subscribers)
+
+    def publish(self, master_id, event):
+        self.dispatch(master_id, event)
+
+    def dispatch(self, master_id, event):
+        for subscription in list(self._subscribers.get(master_id, ())):
+            subscription.loop.call_soon_threadsafe(subscription.push, event)
+
+
+class FileBroker(Broker):
+    """Broker that also fans events out to other worker processes.
+
+    A stand-in for a real message broker: every process appends events as
+    JSON lines to a shared file and one task per process tails it while the
+    process has subscribers. The file is rotated once it grows past
+    ``FILE_MAX_BYTES``.
+    """
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self.origin = uuid.uuid4().hex
+        self._tail_task = None
+
+    def subscribe(self, master_id):
+        subscription = super().subscribe(master_id)
+        loop = asyncio.get_running_loop()
+        if self._tail_task is None or self._tail_task.done() or self._tail_task.get_loop() is not loop:
+            # Position the tail now, so nothing published before the task first runs is skipped.
+            self._tail_task = loop.create_task(self._tail(self._open(at_end=True)))
+        return subscription
+
+    def publish(self, master_id, event):
+        super().publish(master_id, event)
+        line = json.dumps({"origin": self.origin, "master_id": master_id, "event": event}) + "\n"
+        # Lines shorter than PIPE_BUF are appended atomically by concurrent writers.
+        with open(self.path, "a", encoding="utf-8") as log:
+            log.write(line)
+            if log.tell() > FILE_MAX_BYTES:
+                os.replace(self.path, self.path + ".1")
+
+    def _open(self, at_end):
+        try:
+            log = open(self.path, encoding="utf-8")
+        except FileNotFoundError:
+            return None
+        if at_end:
+            log.seek(0, os.SEEK_END)
+        return log
+
+    def _rotated(self, log):
+        try:
+            return os.stat(self.path).st_ino != os.fstat(log.fileno()).st_ino
+        except FileNotFoundError:
+            return True
+
+    def _read_lines(self, log):
+        while True:
+            position = log.tell()
+            line = log.readline()
+            if not line:
+                return
+            if not line.endswith("\n"):
+                # Another process is still writing this line.
+                log.seek(position)
+                return
+            try:
+                message = json.loads(line)
+            except ValueError:
+                continue
+            if message["origin"] != self.origin:
+                self.dispatch(message["master_id"], message["event"])
+
+    async def _tail(self, log):
+        try:
+            while self.has_subscribers():
+                if log is None:
+                    # Created after the tail started (or after a rotation): read it whole.
+                    log = self._open(at_end=False)
+                if log is not None:
+                    self._read_lines(log)
+                    if self._rotated(log):
+                        log.close()
+                        log = None
+                        continue
+                await asyncio.sleep(FILE_POLL_INTERVAL)
+        finally:
+            if log is not None:
+                log.close()
+
+
+_broker = None
+
+
+def get_broker():
+    """Process-wide broker configured by ``CALENDAR_EVENTS_BROKER_PATH``."""
+    global _broker
+    if _broker is None:
+        path = getattr(settings, "CALENDAR_EVENTS_BROKER_PATH", None)
+        _broker = FileBroker(path) if path else Broker()
+    return _broker
+
+
+def publish_on_commit(master_id, event):
+    """Publish ``event`` once the current transaction commits, so listeners never see rolled-back data."""
+    transaction.on_commit(lambda: get_broker().publish(master_id, event))
+
+
+def appointment_event(kind, appointment):
+    return {
+        "type": f"appointment.{kind}",
+        "id": appointment.pk,
+        "date": timezone.localtime(appointment.starts_at).date().isoformat(),
+        "starts_at": appointment.starts_at.isoformat(),
+        "ends_at": appointment.ends_at.isoformat(),
+    }
+
+
+def format_event(event):
+    """Server-Sent Events frame for ``event``."""
+    return f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
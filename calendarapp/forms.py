@@ -3,10 +3,13 @@ from datetime import datetime, timedelta
 from django import forms
 from django.utils import timezone
 
-from clients.models import Client
+from clients.services import resolve_client, with_fresh_clients
 from masters.models import MasterProfile
 
+from .availability import SLOT_STEP
+from .booking import CONFLICT_MESSAGE, book_appointment, is_slot_taken
 from .models import Appointment
+from .occupancy import free_slots
 
 
 def build_duration_choices():
@@ -43,6 +46,7 @@ class AppointmentForm(forms.ModelForm):
         model = Appointment
         fields = ("client_name", "client_phone", "service_date", "start_time", "duration_minutes", "notes")
         widgets = {
+            "client_name": forms.TextInput(attrs={"list": "client-suggestions", "autocomplete": "off"}),
             "notes": forms.Textarea(attrs={"rows": 3}),
         }
 
@@ -54,43 +58,42 @@ class AppointmentForm(forms.ModelForm):
         self.fields["start_time"].choices = self._build_time_choices()
 
     def _build_time_choices(self):
-        start = datetime.combine(datetime.today().date(), self.master.work_start)
-        end = datetime.combine(datetime.today().date(), self.master.work_end)
-        delta = timedelta(minutes=15)
         choices = []
-        current = start
-        while current < end:
-            choices.append((current.strftime("%H:%M"), current.strftime("%H:%M")))
-            current += delta
+        for slot in free_slots(self.master, self.service_date, SLOT_STEP):
+            label = timezone.localtime(slot).strftime("%H:%M")
+            choices.append((label, label))
         return choices
 
+    def clean(self):
+        cleaned_data = super().clean()
+        service_date = cleaned_data.get("service_date")
+        start_time_str = cleaned_data.get("start_time")
+        duration = cleaned_data.get("duration_minutes")
+        if service_date and start_time_str and duration:
+            start_time = datetime.strptime(start_time_str, "%H:%M").time()
+            start_dt_naive = datetime.combine(service_date, start_time)
+            starts_at = timezone.make_aware(start_dt_naive, timezone.get_current_timezone())
+            ends_at = starts_at + timedelta(minutes=int(duration))
+            cleaned_data["starts_at"] = starts_at
+            cleaned_data["ends_at"] = ends_at
+            if is_slot_taken(self.master.pk, starts_at, ends_at):
+                self.add_error("start_time", CONFLICT_MESSAGE)
+        return cleaned_data
+
     def save(self, commit=True):
         appointment = super().save(commit=False)
         appointment.master = self.master
-        client, _ = Client.objects.get_or_create(
-            phone=self.cleaned_data["client_phone"],
-            defaults={
-                "full_name": self.cleaned_data["client_name"],
-            },
-        )
-        if client.full_name != self.cleaned_data["client_name"]:
-            client.full_name = self.cleaned_data["client_name"]
-            client.save(update_fields=["full_name"])
-
-        appointment.client = client
-        appointment.client_name = client.full_name
-        appointment.client_phone = client.phone
-
-        service_date = self.cleaned_data["service_date"]
-        start_time_str = self.cleaned_data["start_time"]
-        start_time = datetime.strptime(start_time_str, "%H:%M").time()
-        start_dt_naive = datetime.combine(service_date, start_time)
-        appointment.starts_at = timezone.make_aware(start_dt_naive, timezone.get_current_timezone())
-
-        duration = int(self.cleaned_data["duration_minutes"])
-        appointment.ends_at = appointment.starts_at + timedelta(minutes=duration)
-
-        if commit:
-            appointment.save()
-        return appointment
+        appointment.starts_at = self.cleaned_data["starts_at"]
+        appointment.ends_at = self.cleaned_data["ends_at"]
+
+        def write():
+            client = resolve_client(self.cleaned_data["client_phone"], self.cleaned_data["client_name"])
+            appointment.client = client
+            appointment.client_name = client.full_name
+            appointment.client_phone = client.phone
 
+            if commit:
+                book_appointment(appointment)
+
+        with_fresh_clients(write)
+        return appointment
@@ -0,0 +1,217 @@
+import calendar
+from datetime import datetime, timedelta, timezone as dt_timezone
+from functools import lru_cache
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Appointment, AppointmentSeries, DeletedEvent
+from .sync import SyncToken
+
+FEED_CHUNK_SIZE = 1000
+# How far back the full feed reaches; older history is served by the CSV export.
+FEED_PAST_DAYS = 180
+UID_DOMAIN = "haircut"
+PRODID = "-//HairCut//Calendar//RU"
+WEEKDAYS = ("MO", "TU", "WE", "TH", "FR", "SA", "SU")
+
+
+def event_uid(kind, pk):
+    return f"{kind}-{pk}@{UID_DOMAIN}"
+
+
+def escape_text(value):
+    return (
+        value.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\r\n", "\\n").replace("\n", "\\n")
+    )
+
+
+def fold(line):
+    """Fold a content line into 75-octet chunks as RFC 5545 requires."""
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line + "\r\n"
+    chunks = []
+    limit = 75
+    while encoded:
+        cut = min(limit, len(encoded))
+        # Never split a multi-byte character.
+        while cut < len(encoded) and encoded[cut] & 0xC0 == 0x80:
+            cut -= 1
+        chunks.append(encoded[:cut].decode("utf-8"))
+        encoded = encoded[cut:]
+        limit = 74
+    return "\r\n ".join(chunks) + "\r\n"
+
+
+def format_utc(moment):
+    return moment.astimezone(dt_timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def format_offset(delta):
+    sign = "-" if delta < timedelta(0) else "+"
+    minutes = abs(int(delta.total_seconds())) // 60
+    return f"{sign}{minutes // 60:02d}{minutes % 60:02d}"
+
+
+def _transitions(tz, year):
+    """``(utc instant, offset before, offset after)`` of every offset change of ``tz`` in ``year``."""
+    moment = datetime(year, 1, 1, tzinfo=dt_timezone.utc)
+    offset = moment.astimezone(tz).utcoffset()
+    transitions = []
+    while moment.year == year:
+        following = moment + timedelta(days=1)
+        if following.astimezone(tz).utcoffset() != offset:
+            # Narrow the change down to the minute within that day.
+            low, high = 0, 24 * 60
+            while high - low > 1:
+                middle = (low + high) // 2
+                if (moment + timedelta(minutes=middle)).astimezone(tz).utcoffset() == offset:
+                    low = middle
+                else:
+                    high = middle
+            instant = moment + timedelta(minutes=high)
+            changed = instant.astimezone(tz).utcoffset()
+            transitions.append((instant, offset, changed))
+            offset = changed
+        moment = following
+    return transitions
+
+
+def _nth_weekday(year, month, week, weekday):
+    """Day of the ``week``-th (``-1`` for the last) ``weekday`` of the month."""
+    last = calendar.monthrange(year, month)[1]
+    days = [day for day in range(1, last + 1) if calendar.weekday(year, month, day) == weekday]
+    return days[week - 1 if week > 0 else week]
+
+
+@lru_cache(maxsize=32)
+def vtimezone_lines(tz, year):
+    """The VTIMEZONE that ``TZID=<tz.key>`` references, with the zone's rules of ``year`` as yearly rules."""
+    lines = ["BEGIN:VTIMEZONE", f"TZID:{tz.key}"]
+    transitions = _transitions(tz, year)
+    if not transitions:
+        offset = datetime(year, 1, 1, tzinfo=dt_timezone.utc).astimezone(tz)
+        lines += [
+            "BEGIN:STANDARD",
+            "DTSTART:19700101T000000",
+            f"TZOFFSETFROM:{format_offset(offset.utcoffset())}",
+            f"TZOFFSETTO:{format_offset(offset.utcoffset())}",
+            f"TZNAME:{offset.tzname()}",
+            "END:STANDARD",
+        ]
+    for instant, before, after in transitions:
+        # Onsets are given in the wall time in force just before the change.
+        local = (instant + before).replace(tzinfo=None)
+        days = calendar.monthrange(local.year, local.month)[1]
+        week = -1 if local.day + 7 > days else (local.day - 1) // 7 + 1
+        # Anchor the rule in 1970 so that every event of the feed falls after the first onset.
+        first = _nth_weekday(1970, local.month, week, local.weekday())
+        kind = "DAYLIGHT" if instant.astimezone(tz).dst() else "STANDARD"
+        lines += [
+            f"BEGIN:{kind}",
+            f"DTSTART:{local.replace(year=1970, day=first):%Y%m%dT%H%M%S}",
+            f"RRULE:FREQ=YEARLY;BYMONTH={local.month};BYDAY={week}{WEEKDAYS[local.weekday()]}",
+            f"TZOFFSETFROM:{format_offset(before)}",
+            f"TZOFFSETTO:{format_offset(after)}",
+            f"TZNAME:{instant.astimezone(tz).tzname()}",
+            f"END:{kind}",
+        ]
+    lines.append("END:VTIMEZONE")
+    return tuple(lines)
+
+
+def _description(client_phone, notes):
+    return escape_text("\n".join(part for part in (client_phone, notes) if part))
+
+
+def appointment_lines(appointment, stamp):
+    yield "BEGIN:VEVENT"
+    yield f"UID:{event_uid('appointment', appointment.pk)}"
+    yield f"DTSTAMP:{format_utc(stamp)}"
+    yield f"LAST-MODIFIED:{format_utc(appointment.updated_at)}"
+    yield f"DTSTART:{format_utc(appointment.starts_at)}"
+    yield f"DTEND:{format_utc(appointment.ends_at)}"
+    yield f"SUMMARY:{escape_text(appointment.client_name)}"
+    yield f"DESCRIPTION:{_description(appointment.client_phone, appointment.notes)}"
+    yield "END:VEVENT"
+
+
+def series_lines(series, stamp):
+    """One recurring VEVENT; cancelled and materialized occurrences become EXDATEs."""
+    tz = timezone.get_current_timezone()
+    starts_at, ends_at = series.occurrence_bounds(series.start_date)
+    rule = f"FREQ={series.frequency.upper()};INTERVAL={series.interval}"
+    if series.until:
+        # With a zoned DTSTART the end of the rule must be given in UTC.
+        rule += f";UNTIL={format_utc(series.occurrence_bounds(series.until)[0])}"
+    yield "BEGIN:VEVENT"
+    yield f"UID:{event_uid('series', series.pk)}"
+    yield f"DTSTAMP:{format_utc(stamp)}"
+    yield f"LAST-MODIFIED:{format_utc(series.updated_at)}"
+    # Local wall time keeps the visits at the same hour across DST changes.
+    yield f"DTSTART;TZID={tz.key}:{timezone.localtime(starts_at, tz):%Y%m%dT%H%M%S}"
+    yield f"DTEND;TZID={tz.key}:{timezone.localtime(ends_at, tz):%Y%m%dT%H%M%S}"
+    yield f"RRULE:{rule}"
+    for exception in series.exceptions.all():
+        excluded = timezone.localtime(series.occurrence_bounds(exception.occurrence_date)[0], tz)
+        yield f"EXDATE;TZID={tz.key}:{excluded:%Y%m%dT%H%M%S}"
+    yield f"SUMMARY:{escape_text(series.client_name)}"
+    yield f"DESCRIPTION:{_description(series.client_phone, series.notes)}"
+    yield "END:VEVENT"
+
+
+def tombstone_lines(tombstone, stamp):
+    yield "BEGIN:VEVENT"
+    yield f"UID:{event_uid(tombstone.kind, tombstone.object_id)}"
+    yield f"DTSTAMP:{format_utc(stamp)}"
+    yield f"DTSTART:{format_utc(tombstone.starts_at)}"
+    yield "STATUS:CANCELLED"
+    yield "END:VEVENT"
+
+
+def feed_lines(master, since=None, issued_at=None):
+    """Yield the content lines of the master's feed.
+
+    Without ``since`` (a ``SyncToken``) the feed holds events of the last
+    ``FEED_PAST_DAYS`` and later; with it only events changed since the token
+    plus cancelled events for deletions. Rows are read in chunks, so a long
+    history is never held in memory.
+    """
+    stamp = issued_at or timezone.now()
+    appointments = Appointment.objects.filter(master=master)
+    series_list = AppointmentSeries.objects.filter(master=master).prefetch_related("exceptions")
+    tombstones = DeletedEvent.objects.none()
+    if since is None:
+        horizon = stamp - timedelta(days=FEED_PAST_DAYS)
+        appointments = appointments.filter(starts_at__gte=horizon)
+        series_list = series_list.filter(Q(until__isnull=True) | Q(until__gte=horizon.date()))
+    else:
+        changed_after = since.changed_after
+        appointments = appointments.filter(updated_at__gte=changed_after)
+        series_list = series_list.filter(updated_at__gte=changed_after)
+        tombstones = DeletedEvent.objects.filter(master=master, deleted_at__gte=changed_after)
+
+    yield "BEGIN:VCALENDAR"
+    yield "VERSION:2.0"
+    yield f"PRODID:{PRODID}"
+    yield "CALSCALE:GREGORIAN"
+    yield "METHOD:PUBLISH"
+    yield f"X-WR-CALNAME:{escape_text(str(master))}"
+    yield f"X-WR-TIMEZONE:{timezone.get_current_timezone().key}"
+    yield f"X-HAIRCUT-SYNC-TOKEN:{SyncToken(stamp).encode()}"
+    # Series are written in local wall time, so the zone they refer to must be defined in the feed.
+    yield from vtimezone_lines(timezone.get_current_timezone(), stamp.year)
+    for appointment in appointments.order_by("starts_at", "id").iterator(chunk_size=FEED_CHUNK_SIZE):
+        yield from appointment_lines(appointment, stamp)
+    for series in series_list.order_by("id").iterator(chunk_size=FEED_CHUNK_SIZE):
+        yield from series_lines(series, stamp)
+    for tombstone in tombstones.order_by("deleted_at", "id").iterator(chunk_size=FEED_CHUNK_SIZE):
+        yield from tombstone_lines(tombstone, stamp)
+    yield "END:VCALENDAR"
+
+
+def iter_feed(master, since=None, issued_at=None):
+    """Folded, CRLF-terminated lines ready for ``StreamingHttpResponse``."""
+    for line in feed_lines(master, since, issued_at):
+        yield fold(line)
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from calendarapp import occupancy
+
+
+class Command(BaseCommand):
+    help = "Compare the per-day occupancy masks with the appointments they are built from."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--master", type=int, action="append", dest="masters", help="Only this master's id.")
+        parser.add_argument("--fix", action="store_true", help="Recompute the days that differ.")
+
+    def handle(self, *args, masters=None, fix=False, **options):
+        mismatches = occupancy.check(masters)
+        for master_id, day, stored, expected in mismatches:
+            self.stdout.write(f"master {master_id} {day:%Y-%m-%d}: stored {stored:024x}, expected {expected:024x}")
+        if not mismatches:
+            self.stdout.write("Occupancy matches the appointments.")
+            return
+        if not fix:
+            raise CommandError(f"{len(mismatches)} master-days differ; run with --fix to repair them.")
+        touched = {}
+        for master_id, day, _, _ in mismatches:
+            touched.setdefault(master_id, set()).add(day)
+        for master_id, days in touched.items():
+            occupancy.refresh(master_id, days)
+        self.stdout.write(f"Fixed {len(mismatches)} master-days.")
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from calendarapp.models import DeletedEvent
+from calendarapp.sync import retention
+from clients.models import DeletedClient
+
+
+class Command(BaseCommand):
+    help = "Delete sync tombstones older than SYNC_TOMBSTONE_RETENTION_DAYS."
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - retention()
+        events, _ = DeletedEvent.objects.filter(deleted_at__lt=cutoff).delete()
+        clients, _ = DeletedClient.objects.filter(deleted_at__lt=cutoff).delete()
+        self.stdout.write(f"Deleted {events} event and {clients} client tombstones.")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from calendarapp import occupancy
+
+
+class Command(BaseCommand):
+    help = "Recompute the per-day occupancy masks from appointments."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--master", type=int, action="append", dest="masters", help="Only this master's id.")
+
+    def handle(self, *args, masters=None, **options):
+        days = occupancy.rebuild(masters)
+        self.stdout.write(f"Rebuilt occupancy of {days} master-days.")
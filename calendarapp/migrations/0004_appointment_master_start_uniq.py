@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendarapp', '0003_appointment_master_range_idx'),
+        ('clients', '0001_initial'),
+        ('masters', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(fields=('master', 'starts_at'), name='appointment_master_start_uniq'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='appointment',
+            unique_together=set(),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:36
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendarapp', '0004_appointment_master_start_uniq'),
+        ('clients', '0001_initial'),
+        ('masters', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['master', 'created_at'], name='appointment_master_created_idx'),
+        ),
+    ]
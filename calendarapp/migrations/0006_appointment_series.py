@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendarapp', '0005_appointment_master_created_idx'),
+        ('clients', '0001_initial'),
+        ('masters', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='occurrence_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='AppointmentSeries',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('client_name', models.CharField(max_length=150)),
+                ('client_phone', models.CharField(max_length=32)),
+                ('notes', models.TextField(blank=True)),
+                ('start_date', models.DateField()),
+                ('start_time', models.TimeField()),
+                ('duration_minutes', models.PositiveIntegerField()),
+                ('frequency', models.CharField(choices=[('daily', 'Ежедневно'), ('weekly', 'Еженедельно'), ('monthly', 'Ежемесячно')], default='weekly', max_length=10)),
+                ('interval', models.PositiveSmallIntegerField(default=1)),
+                ('until', models.DateField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('client', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='series', to='clients.client')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='created_series', to=settings.AUTH_USER_MODEL)),
+                ('master', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='series', to='masters.masterprofile')),
+            ],
+            options={
+                'ordering': ('start_date', 'start_time'),
+            },
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='series',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='appointments', to='calendarapp.appointmentseries'),
+        ),
+        migrations.CreateModel(
+            name='SeriesException',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('occurrence_date', models.DateField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('appointment', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='series_exception', to='calendarapp.appointment')),
+                ('series', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exceptions', to='calendarapp.appointmentseries')),
+            ],
+            options={
+                'ordering': ('occurrence_date',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='appointmentseries',
+            index=models.Index(fields=['master', 'start_date'], name='series_master_start_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='seriesexception',
+            constraint=models.UniqueConstraint(fields=('series', 'occurrence_date'), name='series_exception_date_uniq'),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:47
+
+import calendarapp.models
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendarapp', '0006_appointment_series'),
+        ('clients', '0001_initial'),
+        ('masters', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CalendarFeed',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(default=calendarapp.models.generate_feed_token, max_length=64, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DeletedEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uid', models.CharField(max_length=100)),
+                ('starts_at', models.DateTimeField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ('deleted_at',),
+            },
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='appointmentseries',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['master', 'updated_at'], name='appointment_master_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointmentseries',
+            index=models.Index(fields=['master', 'updated_at'], name='series_master_updated_idx'),
+        ),
+        migrations.AddField(
+            model_name='calendarfeed',
+            name='master',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='calendar_feed', to='masters.masterprofile'),
+        ),
+        migrations.AddField(
+            model_name='deletedevent',
+            name='master',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deleted_events', to='masters.masterprofile'),
+        ),
+        migrations.AddIndex(
+            model_name='deletedevent',
+            index=models.Index(fields=['master', 'deleted_at'], name='deleted_event_master_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations, models
+
+
+def split_uids(apps, schema_editor):
+    DeletedEvent = apps.get_model("calendarapp", "DeletedEvent")
+    for event in DeletedEvent.objects.all():
+        kind, object_id = event.uid.split("@", 1)[0].rsplit("-", 1)
+        event.kind = kind
+        event.object_id = int(object_id)
+        event.save(update_fields=["kind", "object_id"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendarapp', '0007_calendar_feed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deletedevent',
+            name='kind',
+            field=models.CharField(choices=[('appointment', 'Запись'), ('series', 'Серия')], default='appointment', max_length=20),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='deletedevent',
+            name='object_id',
+            field=models.PositiveBigIntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.RunPython(split_uids, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='deletedevent',
+            name='uid',
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:40
+
+import django.db.models.deletion
+from itertools import groupby
+
+from django.db import migrations, models
+
+
+def fill_occupancy(apps, schema_editor):
+    from calendarapp.occupancy import encode, interval_masks
+
+    Appointment = apps.get_model("calendarapp", "Appointment")
+    DayOccupancy = apps.get_model("calendarapp", "DayOccupancy")
+    rows = Appointment.objects.order_by("master_id").values_list("master_id", "starts_at", "ends_at")
+    for master_id, master_rows in groupby(rows.iterator(), key=lambda row: row[0]):
+        masks = interval_masks((starts_at, ends_at) for _, starts_at, ends_at in master_rows)
+        DayOccupancy.objects.bulk_create(
+            (DayOccupancy(master_id=master_id, day=day, mask=encode(mask)) for day, mask in masks.items()),
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendarapp', '0008_deletedevent_kind'),
+        ('masters', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DayOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('mask', models.BinaryField(max_length=12)),
+                ('master', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupancy', to='masters.masterprofile')),
+            ],
+            options={
+                'ordering': ('day',),
+                'constraints': [models.UniqueConstraint(fields=('master', 'day'), name='occupancy_master_day_uniq')],
+            },
+        ),
+        migrations.RunPython(fill_occupancy, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendarapp', '0009_day_occupancy'),
+        ('masters', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deletedevent',
+            name='client_id',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='deletedevent',
+            index=models.Index(fields=['client_id', 'deleted_at'], name='deleted_event_client_idx'),
+        ),
+    ]
@@ -1,10 +1,19 @@
+import calendar
+import secrets
+from datetime import date, datetime, timedelta
+
 from django.conf import settings
 from django.db import models
+from django.utils import timezone
 
 from masters.models import MasterProfile
 from clients.models import Client
 
 
+def generate_feed_token():
+    return secrets.token_urlsafe(32)
+
+
 class Appointment(models.Model):
     """Single slot in master's calendar."""
 
@@ -23,10 +32,26 @@ class Appointment(models.Model):
         related_name="created_appointments",
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    series = models.ForeignKey(
+        "AppointmentSeries",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="appointments",
+    )
+    occurrence_date = models.DateField(null=True, blank=True)
 
     class Meta:
         ordering = ("starts_at",)
-        unique_together = ("master", "starts_at")
+        constraints = [
+            models.UniqueConstraint(fields=["master", "starts_at"], name="appointment_master_start_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["master", "starts_at", "ends_at"], name="appointment_master_range_idx"),
+            models.Index(fields=["master", "created_at"], name="appointment_master_created_idx"),
+            models.Index(fields=["master", "updated_at"], name="appointment_master_updated_idx"),
+        ]
 
     def __str__(self) -> str:
         return f"{self.master} · {self.starts_at:%Y-%m-%d %H:%M}"
@@ -36,3 +61,182 @@ class Appointment(models.Model):
             return
         if self.starts_at >= self.ends_at:
             raise ValueError("Время окончания должно быть позже начала.")
+
+
+class DayOccupancy(models.Model):
+    """Booked 15-minute slots of a master's local day as a 96-bit mask.
+
+    Bit ``n`` is the slot starting ``n * 15`` minutes after midnight. Kept
+    in step with ``Appointment`` rows by ``calendarapp.occupancy``; days
+    without bookings have no row.
+    """
+
+    master = models.ForeignKey(MasterProfile, on_delete=models.CASCADE, related_name="occupancy")
+    day = models.DateField()
+    mask = models.BinaryField(max_length=12)
+
+    class Meta:
+        ordering = ("day",)
+        constraints = [
+            models.UniqueConstraint(fields=["master", "day"], name="occupancy_master_day_uniq"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.master} · {self.day:%Y-%m-%d}"
+
+
+class AppointmentSeries(models.Model):
+    """Standing booking repeated by an RRULE-like rule.
+
+    Occurrences are not stored; they are expanded for the window being viewed
+    and only become ``Appointment`` rows when one of them is edited.
+    """
+
+    class Frequency(models.TextChoices):
+        DAILY = "daily", "Ежедневно"
+        WEEKLY = "weekly", "Еженедельно"
+        MONTHLY = "monthly", "Ежемесячно"
+
+    master = models.ForeignKey(MasterProfile, on_delete=models.CASCADE, related_name="series")
+    client = models.ForeignKey(Client, on_delete=models.PROTECT, related_name="series", null=True, blank=True)
+    client_name = models.CharField(max_length=150)
+    client_phone = models.CharField(max_length=32)
+    notes = models.TextField(blank=True)
+    start_date = models.DateField()
+    start_time = models.TimeField()
+    duration_minutes = models.PositiveIntegerField()
+    frequency = models.CharField(max_length=10, choices=Frequency.choices, default=Frequency.WEEKLY)
+    interval = models.PositiveSmallIntegerField(default=1)
+    until = models.DateField(null=True, blank=True)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="created_series",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Also touched when an exception is added, so feeds re-send the series with its EXDATEs.
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ("start_date", "start_time")
+        indexes = [
+            models.Index(fields=["master", "start_date"], name="series_master_start_idx"),
+            models.Index(fields=["master", "updated_at"], name="series_master_updated_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.master} · {self.rrule}"
+
+    @property
+    def rrule(self) -> str:
+        rule = f"FREQ={self.frequency.upper()};INTERVAL={self.interval}"
+        if self.until:
+            rule += f";UNTIL={self.until:%Y%m%d}"
+        return rule
+
+    def occurrence_dates(self, first_day, last_day):
+        """Yield occurrence dates within ``first_day..last_day``, exceptions included."""
+        first_day = max(first_day, self.start_date)
+        if self.until:
+            last_day = min(last_day, self.until)
+        if first_day > last_day:
+            return
+
+        if self.frequency == self.Frequency.MONTHLY:
+            month_index = self.start_date.year * 12 + self.start_date.month - 1
+            target_index = first_day.year * 12 + first_day.month - 1
+            month_index += -(-(target_index - month_index) // self.interval) * self.interval
+            while True:
+                year, month = divmod(month_index, 12)
+                if date(year, month + 1, 1) > last_day:
+                    return
+                if self.start_date.day <= calendar.monthrange(year, month + 1)[1]:
+                    day = date(year, month + 1, self.start_date.day)
+                    if first_day <= day <= last_day:
+                        yield day
+                month_index += self.interval
+            return
+
+        step = timedelta(days=self.interval * (7 if self.frequency == self.Frequency.WEEKLY else 1))
+        steps = -(-(first_day - self.start_date) // step)
+        day = self.start_date + steps * step
+        while day <= last_day:
+            yield day
+            day += step
+
+    def occurrence_bounds(self, day):
+        """Aware ``(starts_at, ends_at)`` of the occurrence on ``day``."""
+        starts_at = timezone.make_aware(datetime.combine(day, self.start_time), timezone.get_current_timezone())
+        return starts_at, starts_at + timedelta(minutes=self.duration_minutes)
+
+
+class SeriesException(models.Model):
+    """Occurrence of a series that is cancelled or replaced by a real appointment."""
+
+    series = models.ForeignKey(AppointmentSeries, on_delete=models.CASCADE, related_name="exceptions")
+    occurrence_date = models.DateField()
+    appointment = models.OneToOneField(
+        Appointment,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="series_exception",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ("occurrence_date",)
+        constraints = [
+            models.UniqueConstraint(fields=["series", "occurrence_date"], name="series_exception_date_uniq"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.series_id} · {self.occurrence_date:%Y-%m-%d}"
+
+
+class CalendarFeed(models.Model):
+    """Secret subscription URL of a master's calendar in the iCalendar format."""
+
+    master = models.OneToOneField(MasterProfile, on_delete=models.CASCADE, related_name="calendar_feed")
+    token = models.CharField(max_length=64, unique=True, default=generate_feed_token)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return f"{self.master} · feed"
+
+    def rotate(self):
+        """Invalidate the current URL by issuing a new token."""
+        self.token = generate_feed_token()
+        self.save(update_fields=["token"])
+
+
+class DeletedEvent(models.Model):
+    """Tombstone of a deleted appointment or series, so feed deltas can report it.
+
+    Kept for ``SYNC_TOMBSTONE_RETENTION_DAYS``; older sync tokens are refused.
+    """
+
+    class Kind(models.TextChoices):
+        APPOINTMENT = "appointment", "Запись"
+        SERIES = "series", "Серия"
+
+    master = models.ForeignKey(MasterProfile, on_delete=models.CASCADE, related_name="deleted_events")
+    kind = models.CharField(max_length=20, choices=Kind.choices)
+    object_id = models.PositiveBigIntegerField()
+    # Lets a later client deletion find the masters whose devices still hold the client.
+    client_id = models.PositiveBigIntegerField(null=True, blank=True)
+    starts_at = models.DateTimeField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ("deleted_at",)
+        indexes = [
+            models.Index(fields=["master", "deleted_at"], name="deleted_event_master_idx"),
+            models.Index(fields=["client_id", "deleted_at"], name="deleted_event_client_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.kind}-{self.object_id} · {self.deleted_at:%Y-%m-%d %H:%M}"
+
@@ -0,0 +1,309 @@
+"""Per-day occupancy bitmaps of masters.
+
+``DayOccupancy`` keeps one 96-bit mask per master and local day, bit ``n``
+being the slot that starts ``n * SLOT_STEP`` after midnight. Every write of
+an appointment recomputes the masks of the days it touches, so "is this
+slot free", "first free slot of N minutes" or "free slots this week" read a
+few 12-byte rows and answer with bitwise operations. Series occurrences
+are not stored, as a series may run forever; they are ORed in on reading.
+
+A slot is taken when any booking overlaps it. For masters whose working
+hours lie on the slot grid (``is_aligned``) the answers match the interval
+computation in ``calendarapp.availability``; other masters fall back to it.
+Conflict checks before saving still go to the appointment rows.
+"""
+
+from datetime import datetime, time, timedelta
+from functools import reduce
+from itertools import groupby
+from operator import or_
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .availability import MAX_DURATION, SLOT_STEP, busy_intervals
+from .availability import afree_slots as afree_slots_by_intervals
+from .availability import free_slots as free_slots_by_intervals
+from .models import Appointment, DayOccupancy
+from .ranges import local_date_range
+from .recurrence import aexpand_series, expand_series
+
+SLOT_SECONDS = int(SLOT_STEP.total_seconds())
+SLOTS_PER_DAY = 24 * 60 * 60 // SLOT_SECONDS
+MASK_BYTES = SLOTS_PER_DAY // 8
+REBUILD_BATCH_SIZE = 1000
+
+
+def encode(mask):
+    return mask.to_bytes(MASK_BYTES, "little")
+
+
+def decode(data):
+    return int.from_bytes(data, "little")
+
+
+def span(first_slot, end_slot):
+    """Mask of slots ``first_slot..end_slot - 1``."""
+    return ((1 << end_slot) - 1) ^ ((1 << first_slot) - 1)
+
+
+def slot_indexes(mask):
+    """Indexes of the set bits of ``mask``, lowest first."""
+    while mask:
+        lowest = mask & -mask
+        yield lowest.bit_length() - 1
+        mask ^= lowest
+
+
+def _wall_seconds(value, tz):
+    local = timezone.localtime(value, tz)
+    seconds = local.hour * 3600 + local.minute * 60 + local.second + (local.microsecond > 0)
+    return local.date(), seconds
+
+
+def interval_masks(intervals, tz=None):
+    """``{day: mask}`` of the local days covered by aware ``(starts_at, ends_at)`` pairs."""
+    tz = tz or timezone.get_current_timezone()
+    masks = {}
+    for starts_at, ends_at in intervals:
+        day, start_seconds = _wall_seconds(starts_at, tz)
+        last_day, end_seconds = _wall_seconds(ends_at, tz)
+        first_slot = start_seconds // SLOT_SECONDS
+        while day < last_day:
+            masks[day] = masks.get(day, 0) | span(first_slot, SLOTS_PER_DAY)
+            day += timedelta(days=1)
+            first_slot = 0
+        # The end may fall before the start on the wall clock when the clocks go back.
+        end_slot = max(-(-end_seconds // SLOT_SECONDS), first_slot + 1) if end_seconds else first_slot
+        if end_slot > first_slot:
+            masks[day] = masks.get(day, 0) | span(first_slot, end_slot)
+    return masks
+
+
+def days_of(starts_at, ends_at, tz=None):
+    """Local dates that ``[starts_at, ends_at)`` touches."""
+    tz = tz or timezone.get_current_timezone()
+    day = timezone.localtime(starts_at, tz).date()
+    last_day = timezone.localtime(ends_at - timedelta(microseconds=1), tz).date()
+    days = [day]
+    while day < last_day:
+        day += timedelta(days=1)
+        days.append(day)
+    return days
+
+
+def refresh(master_id, days):
+    """Recompute the master's masks of local ``days`` from their appointments.
+
+    Costs one read and one upsert, plus a delete when a day became empty.
+    """
+    days = set(days)
+    if not days:
+        return
+    bounds = [local_date_range(day) for day in sorted(days)]
+    overlapping = reduce(
+        or_,
+        (Q(starts_at__gt=start - MAX_DURATION, starts_at__lt=end, ends_at__gt=start) for start, end in bounds),
+    )
+    rows = Appointment.objects.filter(overlapping, master_id=master_id).order_by().values_list("starts_at", "ends_at")
+    masks = interval_masks(rows)
+    booked = {day: masks[day] for day in days if masks.get(day)}
+    if booked:
+        DayOccupancy.objects.bulk_create(
+            [DayOccupancy(master_id=master_id, day=day, mask=encode(mask)) for day, mask in booked.items()],
+            update_conflicts=True,
+            unique_fields=["master", "day"],
+            update_fields=["mask"],
+        )
+    if len(booked) < len(days):
+        DayOccupancy.objects.filter(master_id=master_id, day__in=days - booked.keys()).delete()
+
+
+def refresh_appointments(appointments):
+    """Recompute the days of ``appointments``, e.g. after ``bulk_create``."""
+    touched = {}
+    for appointment in appointments:
+        touched.setdefault(appointment.master_id, set()).update(days_of(appointment.starts_at, appointment.ends_at))
+    for master_id, days in touched.items():
+        refresh(master_id, days)
+
+
+def _expected_masks(master_ids=None):
+    """Yield ``(master_id, {day: mask})`` computed from the appointment rows."""
+    rows = Appointment.objects.order_by("master_id")
+    if master_ids is not None:
+        rows = rows.filter(master_id__in=list(master_ids))
+    rows = rows.values_list("master_id", "starts_at", "ends_at").iterator(chunk_size=REBUILD_BATCH_SIZE * 10)
+    for master_id, master_rows in groupby(rows, key=lambda row: row[0]):
+        yield master_id, interval_masks((starts_at, ends_at) for _, starts_at, ends_at in master_rows)
+
+
+def rebuild(master_ids=None):
+    """Re-create the masks of ``master_ids`` (all masters by default); returns the number of rows."""
+    stored = DayOccupancy.objects.all()
+    if master_ids is not None:
+        stored = stored.filter(master_id__in=list(master_ids))
+    stored.delete()
+    created = 0
+    for master_id, masks in _expected_masks(master_ids):
+        DayOccupancy.objects.bulk_create(
+            (DayOccupancy(master_id=master_id, day=day, mask=encode(mask)) for day, mask in masks.items()),
+            batch_size=REBUILD_BATCH_SIZE,
+        )
+        created += len(masks)
+    return created
+
+
+def check(master_ids=None):
+    """``(master_id, day, stored, expected)`` of every mask that differs from the appointments."""
+    stored = DayOccupancy.objects.all()
+    if master_ids is not None:
+        stored = stored.filter(master_id__in=list(master_ids))
+    stored_masks = {}
+    for master_id, day, mask in stored.values_list("master_id", "day", "mask").iterator():
+        stored_masks.setdefault(master_id, {})[day] = decode(mask)
+    mismatches = []
+    for master_id, masks in _expected_masks(master_ids):
+        found = stored_masks.pop(master_id, {})
+        for day in sorted(found.keys() | masks.keys()):
+            if found.get(day, 0) != masks.get(day, 0):
+                mismatches.append((master_id, day, found.get(day, 0), masks.get(day, 0)))
+    for master_id, found in stored_masks.items():
+        mismatches.extend((master_id, day, mask, 0) for day, mask in sorted(found.items()))
+    return mismatches
+
+
+def _stored_masks(master_ids, first_day, last_day):
+    return DayOccupancy.objects.filter(master_id__in=master_ids, day__range=(first_day, last_day)).values_list(
+        "master_id", "day", "mask"
+    )
+
+
+def _combine(master_ids, first_day, last_day, rows, occurrences):
+    masks = {master_id: {} for master_id in master_ids}
+    for master_id, day, mask in rows:
+        masks[master_id][day] = decode(mask)
+    by_master = {}
+    for occurrence in occurrences:
+        by_master.setdefault(occurrence.master_id, []).append((occurrence.starts_at, occurrence.ends_at))
+    for master_id, intervals in by_master.items():
+        for day, mask in interval_masks(intervals).items():
+            if first_day <= day <= last_day:
+                masks[master_id][day] = masks[master_id].get(day, 0) | mask
+    return masks
+
+
+def load_masks(master_ids, first_day, last_day):
+    """``{master_id: {day: mask}}`` of booked slots on local dates ``first_day..last_day``.
+
+    Series occurrences are included. Costs one query for the stored masks and
+    one for the series.
+    """
+    master_ids = list(master_ids)
+    rows = _stored_masks(master_ids, first_day, last_day)
+    occurrences = expand_series(master_ids, *local_date_range(first_day, last_day))
+    return _combine(master_ids, first_day, last_day, rows, occurrences)
+
+
+async def aload_masks(master_ids, first_day, last_day):
+    """Async version of ``load_masks``."""
+    master_ids = list(master_ids)
+    rows = [row async for row in _stored_masks(master_ids, first_day, last_day)]
+    occurrences = await aexpand_series(master_ids, *local_date_range(first_day, last_day))
+    return _combine(master_ids, first_day, last_day, rows, occurrences)
+
+
+def is_aligned(master):
+    """Whether the master's working hours start and end on the slot grid."""
+    return all(
+        (value.hour * 3600 + value.minute * 60 + value.second) % SLOT_SECONDS == 0 and not value.microsecond
+        for value in (master.work_start, master.work_end)
+    )
+
+
+def working_mask(master):
+    """Slots of the master's working hours."""
+    start = (master.work_start.hour * 3600 + master.work_start.minute * 60) // SLOT_SECONDS
+    end = (master.work_end.hour * 3600 + master.work_end.minute * 60) // SLOT_SECONDS
+    return span(start, end) if end > start else 0
+
+
+def fitting_starts(free, slots):
+    """Slots of ``free`` that begin a run of at least ``slots`` free slots."""
+    fits, length = free, 1
+    while length < slots:
+        # A run of ``length + shift`` is two overlapping runs of ``length``.
+        shift = min(length, slots - length)
+        fits &= fits >> shift
+        length += shift
+    return fits
+
+
+def _slot_count(duration):
+    return -(-duration // SLOT_STEP)
+
+
+def _slot_start(day, slot):
+    return timezone.make_aware(datetime.combine(day, time()) + slot * SLOT_STEP, timezone.get_current_timezone())
+
+
+def free_slots_in_mask(master, day, busy, duration):
+    """Free start times on ``day`` given the mask of its ``busy`` slots."""
+    starts = fitting_starts(working_mask(master) & ~busy, _slot_count(duration))
+    return [_slot_start(day, slot) for slot in slot_indexes(starts)]
+
+
+def is_free(master_id, starts_at, ends_at):
+    """Whether no booking or series occurrence overlaps ``[starts_at, ends_at)``."""
+    days = days_of(starts_at, ends_at)
+    masks = load_masks([master_id], days[0], days[-1])[master_id]
+    wanted = interval_masks([(starts_at, ends_at)])
+    return not any(masks.get(day, 0) & mask for day, mask in wanted.items())
+
+
+def free_slots(master, day, duration):
+    """Free start times for ``master`` on ``day`` that fit ``duration``."""
+    if not is_aligned(master):
+        return free_slots_by_intervals(master, day, duration)
+    busy = load_masks([master.pk], day, day)[master.pk].get(day, 0)
+    return free_slots_in_mask(master, day, busy, duration)
+
+
+async def afree_slots(master, day, duration):
+    """Async version of ``free_slots``."""
+    if not is_aligned(master):
+        return await afree_slots_by_intervals(master, day, duration)
+    busy = (await aload_masks([master.pk], day, day))[master.pk].get(day, 0)
+    return free_slots_in_mask(master, day, busy, duration)
+
+
+def free_slots_of_masters(masters, day, duration):
+    """``{master_id: [start times]}`` on ``day``, reading masks and series once for all ``masters``."""
+    masters = list(masters)
+    aligned = [master for master in masters if is_aligned(master)]
+    others = [master for master in masters if not is_aligned(master)]
+    slots = {}
+    if aligned:
+        masks = load_masks([master.pk for master in aligned], day, day)
+        for master in aligned:
+            slots[master.pk] = free_slots_in_mask(master, day, masks[master.pk].get(day, 0), duration)
+    if others:
+        busy = busy_intervals([master.pk for master in others], *local_date_range(day))
+        for master in others:
+            slots[master.pk] = free_slots_by_intervals(master, day, duration, busy[master.pk])
+    return slots
+
+
+def first_free_slot(master, day, duration):
+    """Earliest free start time on ``day`` that fits ``duration``, or ``None``."""
+    slots = free_slots(master, day, duration)
+    return slots[0] if slots else None
+
+
+def free_slots_by_day(master, first_day, duration, days=7):
+    """``{day: [start times]}`` of ``days`` local dates from ``first_day``, from one read of masks."""
+    dates = [first_day + timedelta(days=offset) for offset in range(days)]
+    if not is_aligned(master):
+        return {day: free_slots_by_intervals(master, day, duration) for day in dates}
+    masks = load_masks([master.pk], dates[0], dates[-1])[master.pk]
+    return {day: free_slots_in_mask(master, day, masks.get(day, 0), duration) for day in dates}
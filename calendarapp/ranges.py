@@ -0,0 +1,23 @@
+from datetime import datetime, time, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+
+def local_date_range(first_day, last_day=None, tz=None):
+    """Half-open aware ``[start, end)`` covering local dates ``first_day..last_day``.
+
+    Dates are interpreted in ``tz`` (the active timezone by default), so the
+    resulting bounds can be compared with the raw column and keep index seeks.
+    """
+    tz = tz or timezone.get_current_timezone()
+    last_day = last_day or first_day
+    start = timezone.make_aware(datetime.combine(first_day, time.min), tz)
+    end = timezone.make_aware(datetime.combine(last_day + timedelta(days=1), time.min), tz)
+    return start, end
+
+
+def starts_within(first_day, last_day=None, tz=None, field="starts_at"):
+    """``Q`` matching rows whose ``field`` falls on local dates ``first_day..last_day``."""
+    start, end = local_date_range(first_day, last_day, tz)
+    return Q(**{f"{field}__gte": start, f"{field}__lt": end})
@@ -0,0 +1,102 @@
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+from django.db.models import Prefetch, Q
+from django.utils import timezone
+
+from .models import AppointmentSeries, SeriesException
+
+
+@dataclass(frozen=True)
+class Occurrence:
+    """Occurrence of a series that has no ``Appointment`` row.
+
+    Mirrors the appointment attributes used by templates and serializers.
+    """
+
+    series_id: int
+    occurrence_date: date
+    master_id: int
+    client: object
+    client_name: str
+    client_phone: str
+    notes: str
+    starts_at: datetime
+    ends_at: datetime
+    created_at: datetime
+
+    id = None
+    pk = None
+
+    @property
+    def client_id(self):
+        return self.client.pk if self.client else None
+
+
+def _window_series(master_ids, range_start, range_end):
+    tz = timezone.get_current_timezone()
+    # Bookings are shorter than a day, so only the previous day can spill into the window.
+    first_day = timezone.localtime(range_start, tz).date() - timedelta(days=1)
+    last_day = timezone.localtime(range_end, tz).date()
+    series_list = (
+        AppointmentSeries.objects.filter(master_id__in=list(master_ids), start_date__lte=last_day)
+        .filter(Q(until__isnull=True) | Q(until__gte=first_day))
+        .select_related("client")
+        .prefetch_related(
+            Prefetch(
+                "exceptions",
+                queryset=SeriesException.objects.filter(occurrence_date__range=(first_day, last_day)),
+                to_attr="window_exceptions",
+            )
+        )
+    )
+    return series_list, first_day, last_day
+
+
+def _expand(series_list, first_day, last_day, range_start, range_end):
+    occurrences = []
+    for series in series_list:
+        skipped = {exception.occurrence_date for exception in series.window_exceptions}
+        for day in series.occurrence_dates(first_day, last_day):
+            if day in skipped:
+                continue
+            starts_at, ends_at = series.occurrence_bounds(day)
+            if starts_at < range_end and ends_at > range_start:
+                occurrences.append(
+                    Occurrence(
+                        series_id=series.pk,
+                        occurrence_date=day,
+                        master_id=series.master_id,
+                        client=series.client,
+                        client_name=series.client_name,
+                        client_phone=series.client_phone,
+                        notes=series.notes,
+                        starts_at=starts_at,
+                        ends_at=ends_at,
+                        created_at=series.created_at,
+                    )
+                )
+    occurrences.sort(key=lambda occurrence: occurrence.starts_at)
+    return occurrences
+
+
+def expand_series(master_ids, range_start, range_end):
+    """Occurrences of the masters' series overlapping ``[range_start, range_end)``.
+
+    Costs one query for the series and one for the exceptions inside the window,
+    however long the series run.
+    """
+    series_list, first_day, last_day = _window_series(master_ids, range_start, range_end)
+    return _expand(series_list, first_day, last_day, range_start, range_end)
+
+
+async def aexpand_series(master_ids, range_start, range_end):
+    """Async version of ``expand_series``."""
+    series_list, first_day, last_day = _window_series(master_ids, range_start, range_end)
+    series_list = [series async for series in series_list]
+    return _expand(series_list, first_day, last_day, range_start, range_end)
+
+
+def with_occurrences(appointments, occurrences):
+    """Merge appointment rows and virtual occurrences by start time."""
+    return sorted([*appointments, *occurrences], key=lambda item: (item.starts_at, item.pk or 0))
@@ -0,0 +1,156 @@
+from django.contrib.auth import get_user_model
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from clients import search as client_search
+from clients import visits
+from clients.models import Client
+from masters.models import MasterProfile
+
+from . import occupancy
+from .cache import bump_version
+from .events import appointment_event, publish_on_commit
+from .models import Appointment, AppointmentSeries, DeletedEvent, SeriesException
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def invalidate_master_calendar(sender, instance, **kwargs):
+    bump_version(instance.master_id)
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def reindex_client_search(sender, instance, **kwargs):
+    if instance.client_id:
+        client_search.reindex([instance.client_id], instance.master_id)
+
+
+# Fields that place an appointment in the master–client visit totals.
+VISIT_FIELDS = ("master", "client", "starts_at", "ends_at")
+
+
+@receiver(pre_save, sender=Appointment)
+def remember_visit(sender, instance, update_fields=None, **kwargs):
+    instance._visit_before = None
+    if instance._state.adding or (update_fields is not None and not set(VISIT_FIELDS) & set(update_fields)):
+        return
+    instance._visit_before = Appointment.objects.filter(pk=instance.pk).only(*VISIT_FIELDS).first()
+
+
+def _visit_key(appointment):
+    return appointment.master_id, appointment.client_id, appointment.starts_at, appointment.ends_at
+
+
+@receiver(post_save, sender=Appointment)
+def update_client_visits(sender, instance, created, **kwargs):
+    before = getattr(instance, "_visit_before", None)
+    if created:
+        visits.record_visits([instance])
+    elif before is not None and _visit_key(before) != _visit_key(instance):
+        # The row is already saved, so the affected pairs are simply recounted.
+        for master_id, client_id in {_visit_key(before)[:2], _visit_key(instance)[:2]}:
+            if client_id is not None:
+                visits.refresh_visits(master_id, client_id)
+
+
+@receiver(post_delete, sender=Appointment)
+def forget_client_visit(sender, instance, **kwargs):
+    visits.forget_visit(instance)
+
+
+def _span_key(appointment):
+    return appointment.master_id, appointment.starts_at, appointment.ends_at
+
+
+@receiver(post_save, sender=Appointment)
+def update_occupancy(sender, instance, created, **kwargs):
+    # ``_visit_before`` is the stored row, read by ``remember_visit`` when the time may have changed.
+    before = getattr(instance, "_visit_before", None)
+    if created:
+        occupancy.refresh_appointments([instance])
+    elif before is not None and _span_key(before) != _span_key(instance):
+        occupancy.refresh_appointments([before, instance])
+
+
+@receiver(post_delete, sender=Appointment)
+def clear_occupancy(sender, instance, **kwargs):
+    occupancy.refresh_appointments([instance])
+
+
+@receiver(post_save, sender=AppointmentSeries)
+@receiver(post_delete, sender=AppointmentSeries)
+def invalidate_series_calendar(sender, instance, **kwargs):
+    bump_version(instance.master_id)
+
+
+@receiver(post_save, sender=SeriesException)
+@receiver(post_delete, sender=SeriesException)
+def invalidate_exception_calendar(sender, instance, **kwargs):
+    AppointmentSeries.objects.filter(pk=instance.series_id).update(updated_at=timezone.now())
+    bump_version(instance.series.master_id)
+    publish_on_commit(instance.series.master_id, {"type": "series.changed", "id": instance.series_id})
+
+
+def is_master_deletion(origin):
+    """Whether a delete cascades from a master or their user, whose tombstones go with them."""
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return issubclass(model, (MasterProfile, get_user_model()))
+
+
+@receiver(post_delete, sender=Appointment)
+def record_deleted_appointment(sender, instance, origin=None, **kwargs):
+    if is_master_deletion(origin):
+        return
+    DeletedEvent.objects.create(
+        master_id=instance.master_id,
+        kind=DeletedEvent.Kind.APPOINTMENT,
+        object_id=instance.pk,
+        client_id=instance.client_id,
+        starts_at=instance.starts_at,
+    )
+
+
+@receiver(post_delete, sender=AppointmentSeries)
+def record_deleted_series(sender, instance, origin=None, **kwargs):
+    if is_master_deletion(origin):
+        return
+    DeletedEvent.objects.create(
+        master_id=instance.master_id,
+        kind=DeletedEvent.Kind.SERIES,
+        object_id=instance.pk,
+        client_id=instance.client_id,
+        starts_at=instance.occurrence_bounds(instance.start_date)[0],
+    )
+
+
+@receiver(post_save, sender=MasterProfile)
+def invalidate_profile_calendar(sender, instance, **kwargs):
+    bump_version(instance.pk)
+
+
+@receiver(post_save, sender=Appointment)
+def publish_saved_appointment(sender, instance, created, **kwargs):
+    publish_on_commit(instance.master_id, appointment_event("created" if created else "updated", instance))
+
+
+@receiver(post_delete, sender=Appointment)
+def publish_deleted_appointment(sender, instance, **kwargs):
+    publish_on_commit(instance.master_id, appointment_event("deleted", instance))
+
+
+@receiver(post_save, sender=AppointmentSeries)
+@receiver(post_delete, sender=AppointmentSeries)
+def publish_series_change(sender, instance, **kwargs):
+    publish_on_commit(instance.master_id, {"type": "series.changed", "id": instance.pk})
+
+
+@receiver(post_save, sender=Client)
+def invalidate_client_masters(sender, instance, created, **kwargs):
+    if created:
+        return
+    master_ids = Appointment.objects.filter(client=instance).values_list("master_id", flat=True).distinct()
+    for master_id in master_ids:
+        bump_version(master_id)
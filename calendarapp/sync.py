@@ -0,0 +1,82 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+# Changes are re-sent for this long after a sync token was issued, so a row
+# committed by a transaction that was still open at that moment is not lost.
+SYNC_OVERLAP = timedelta(minutes=5)
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+class InvalidSyncToken(ValueError):
+    pass
+
+
+class SyncTokenExpired(InvalidSyncToken):
+    """The tombstones the token depends on may already be purged; a full resync is needed."""
+
+
+def retention():
+    return timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS)
+
+
+def _to_micros(moment):
+    return int(moment.timestamp() * 1_000_000)
+
+
+def _from_micros(value):
+    return datetime.fromtimestamp(int(value) / 1_000_000, tz=dt_timezone.utc)
+
+
+@dataclass(frozen=True)
+class SyncToken:
+    """Position in a master's change feed.
+
+    ``issued_at`` is when the sync that produced the token started. A token
+    handed out mid-sync also carries the ``(updated_at, id)`` of the last row
+    sent, so the next page continues the same sync without the overlap.
+    """
+
+    issued_at: datetime
+    after: tuple = None
+
+    def encode(self):
+        parts = [_to_micros(self.issued_at)]
+        if self.after:
+            parts += [_to_micros(self.after[0]), self.after[1]]
+        return ".".join(str(part) for part in parts)
+
+    @classmethod
+    def decode(cls, raw):
+        try:
+            parts = [int(part) for part in raw.split(".")]
+            if len(parts) not in (1, 3):
+                raise ValueError(raw)
+            token = cls(_from_micros(parts[0]), (_from_micros(parts[1]), parts[2]) if len(parts) == 3 else None)
+        except (ValueError, OverflowError, OSError) as exc:
+            raise InvalidSyncToken(raw) from exc
+        if token.issued_at < timezone.now() - retention():
+            raise SyncTokenExpired(raw)
+        return token
+
+    @classmethod
+    def full(cls, issued_at):
+        """Position before any change, for the first sync of a device."""
+        return cls(issued_at, (EPOCH, 0))
+
+    @property
+    def changed_after(self):
+        """Lower bound of ``updated_at``/``deleted_at`` for rows the holder has not seen."""
+        return self.issued_at - SYNC_OVERLAP
+
+    def changes(self, queryset, field="updated_at"):
+        """Rows of ``queryset`` the holder has not seen, in feed order."""
+        if self.after:
+            moment, pk = self.after
+            queryset = queryset.filter(Q(**{f"{field}__gt": moment}) | Q(**{field: moment, "pk__gt": pk}))
+        else:
+            queryset = queryset.filter(**{f"{field}__gte": self.changed_after})
+        return queryset.order_by(field, "pk")
@@ -1,3 +1,809 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import tempfile
+from datetime import date, time, timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from clients.models import Client
+from masters.models import MasterProfile, Profession
+
+from . import cache as calendar_cache
+from . import events, export, occupancy
+from .analytics import load_utilization, summarize
+from .availability import free_slots, merge_intervals
+from .forms import AppointmentForm
+from .ics import fold
+from .models import Appointment, AppointmentSeries, CalendarFeed, DayOccupancy, DeletedEvent, SeriesException
+from .ranges import local_date_range, starts_within
+
+User = get_user_model()
+
+
+class AvailabilityTestCase(TestCase):
+    """Test the free-slot engine behind the booking form."""
+
+    def setUp(self):
+        user = User.objects.create_user(email="master@test.com", password="testpass123")
+        profession = Profession.objects.create(name="Парикмахер", slug="hairdresser")
+        self.master = MasterProfile.objects.create(
+            user=user,
+            profession=profession,
+            phone="+71234567890",
+            work_start=time(9, 0),
+            work_end=time(11, 0),
+            status=MasterProfile.Status.ACTIVE,
+        )
+        self.day = timezone.localdate() + timedelta(days=1)
+
+    def test_merge_intervals(self):
+        """Test that overlapping and touching intervals collapse."""
+        self.assertEqual(
+            merge_intervals([(1, 3), (2, 4), (4, 5), (7, 8)]),
+            [(1, 5), (7, 8)],
+        )
+
+    def test_form_offers_only_free_start_times(self):
+        """Test that booked slots are not offered as start times."""
+        Appointment.objects.create(
+            master=self.master,
+            client_name="Клиент",
+            client_phone="+79991234567",
+            starts_at=timezone.make_aware(timezone.datetime.combine(self.day, time(9, 30))),
+            ends_at=timezone.make_aware(timezone.datetime.combine(self.day, time(10, 15))),
+        )
+        form = AppointmentForm(master=self.master, service_date=self.day)
+        offered = [value for value, _ in form.fields["start_time"].choices]
+        self.assertEqual(offered, ["09:00", "09:15", "10:15", "10:30", "10:45"])
+
+    def test_form_rejects_overlapping_booking(self):
+        """Test that the form reports a clash with an existing booking."""
+        Appointment.objects.create(
+            master=self.master,
+            client_name="Клиент",
+            client_phone="+79991234567",
+            starts_at=timezone.make_aware(timezone.datetime.combine(self.day, time(10, 0))),
+            ends_at=timezone.make_aware(timezone.datetime.combine(self.day, time(10, 30))),
+        )
+        form = AppointmentForm(
+            data={
+                "client_name": "Другой клиент",
+                "client_phone": "+79991234568",
+                "service_date": self.day.strftime("%Y-%m-%d"),
+                "start_time": "09:30",
+                "duration_minutes": "60",
+            },
+            master=self.master,
+            service_date=self.day,
+        )
+        self.assertFalse(form.is_valid())
+        self.assertIn("start_time", form.errors)
+
+
+class OccupancyTestCase(TestCase):
+    """Test the per-day occupancy masks."""
+
+    def setUp(self):
+        user = User.objects.create_user(email="master@test.com", password="testpass123")
+        profession = Profession.objects.create(name="Парикмахер", slug="hairdresser")
+        self.master = MasterProfile.objects.create(
+            user=user,
+            profession=profession,
+            phone="+71234567890",
+            work_start=time(9, 0),
+            work_end=time(11, 0),
+            status=MasterProfile.Status.ACTIVE,
+        )
+        self.day = timezone.localdate() + timedelta(days=1)
+
+    def at(self, clock, day=None):
+        return timezone.make_aware(timezone.datetime.combine(day or self.day, clock))
+
+    def book(self, start, end, day=None):
+        return Appointment.objects.create(
+            master=self.master,
+            client_name="Клиент",
+            client_phone="+79991234567",
+            starts_at=self.at(start, day),
+            ends_at=self.at(end, day),
+        )
+
+    def stored(self):
+        return {row.day: occupancy.decode(row.mask) for row in DayOccupancy.objects.filter(master=self.master)}
+
+    def test_masks_follow_appointment_writes(self):
+        """Test that creating, moving and deleting a booking rewrites its day's mask."""
+        appointment = self.book(time(9, 0), time(9, 20))
+        self.assertEqual(self.stored(), {self.day: occupancy.span(36, 38)})
+        appointment.starts_at, appointment.ends_at = self.at(time(10, 0)), self.at(time(10, 45))
+        appointment.save()
+        self.assertEqual(self.stored(), {self.day: occupancy.span(40, 43)})
+        appointment.delete()
+        self.assertEqual(self.stored(), {})
+
+    def test_booking_across_midnight_marks_both_days(self):
+        """Test that a booking past midnight is split between two days."""
+        next_day = self.day + timedelta(days=1)
+        Appointment.objects.create(
+            master=self.master,
+            client_name="Клиент",
+            client_phone="+79991234567",
+            starts_at=self.at(time(23, 30)),
+            ends_at=self.at(time(0, 30), next_day),
+        )
+        self.assertEqual(self.stored(), {self.day: occupancy.span(94, 96), next_day: occupancy.span(0, 2)})
+
+    def test_fitting_starts(self):
+        """Test that only starts of long enough free runs are kept."""
+        free = 0b1110111100
+        self.assertEqual(list(occupancy.slot_indexes(occupancy.fitting_starts(free, 3))), [2, 3, 7])
+        self.assertEqual(occupancy.fitting_starts(free, 5), 0)
+
+    def test_free_slots_match_interval_computation(self):
+        """Test that masks give the same free starts as the booked intervals."""
+        self.book(time(9, 30), time(10, 15))
+        duration = timedelta(minutes=30)
+        with self.assertNumQueries(2):
+            slots = occupancy.free_slots(self.master, self.day, duration)
+        self.assertEqual([timezone.localtime(slot).time() for slot in slots], [time(9, 0), time(10, 15), time(10, 30)])
+        self.assertEqual(slots, free_slots(self.master, self.day, duration))
+        self.assertEqual(occupancy.first_free_slot(self.master, self.day, timedelta(minutes=45)), self.at(time(10, 15)))
+        self.assertFalse(occupancy.is_free(self.master.pk, self.at(time(10, 0)), self.at(time(10, 30))))
+        self.assertTrue(occupancy.is_free(self.master.pk, self.at(time(10, 15)), self.at(time(11, 0))))
+
+    def test_week_includes_series_occurrences(self):
+        """Test that virtual series occurrences are ORed into the stored masks."""
+        AppointmentSeries.objects.create(
+            master=self.master,
+            client_name="Постоянный",
+            client_phone="+79990000000",
+            start_date=self.day,
+            start_time=time(9, 0),
+            duration_minutes=60,
+            frequency=AppointmentSeries.Frequency.DAILY,
+        )
+        self.book(time(10, 0), time(11, 0), self.day + timedelta(days=2))
+        week = occupancy.free_slots_by_day(self.master, self.day, timedelta(minutes=60))
+        self.assertEqual(len(week), 7)
+        self.assertEqual(week[self.day], [self.at(time(10, 0))])
+        self.assertEqual(week[self.day + timedelta(days=2)], [])
+
+    def test_check_and_rebuild_commands(self):
+        """Test that the checker reports drifted masks and both commands repair them."""
+        self.book(time(9, 0), time(10, 0))
+        out = StringIO()
+        call_command("check_occupancy", stdout=out)
+        self.assertIn("matches", out.getvalue())
+
+        DayOccupancy.objects.update(mask=occupancy.encode(1))
+        with self.assertRaises(CommandError):
+            call_command("check_occupancy", stdout=StringIO())
+        call_command("check_occupancy", "--fix", stdout=StringIO())
+        self.assertEqual(occupancy.check(), [])
+
+        DayOccupancy.objects.all().delete()
+        self.assertEqual(len(occupancy.check()), 1)
+        call_command("rebuild_occupancy", stdout=StringIO())
+        self.assertEqual(self.stored(), {self.day: occupancy.span(36, 40)})
+
+
+class MasterCalendarViewTestCase(TestCase):
+    """Test the month grid of the master calendar."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="master@test.com", password="testpass123")
+        profession = Profession.objects.create(name="Парикмахер", slug="hairdresser")
+        self.master = MasterProfile.objects.create(
+            user=self.user,
+            profession=profession,
+            phone="+71234567890",
+            work_start=time(9, 0),
+            work_end=time(18, 0),
+            status=MasterProfile.Status.ACTIVE,
+        )
+        self.day = timezone.localdate().replace(day=10)
+        self.client.force_login(self.user)
+
+    def _fill_day(self, day, count):
+        start = timezone.make_aware(timezone.datetime.combine(day, time(9, 0)))
+        Appointment.objects.bulk_create(
+            Appointment(
+                master=self.master,
+                client_name="Клиент",
+                client_phone="+79991234567",
+                starts_at=start + timedelta(minutes=15 * index),
+                ends_at=start + timedelta(minutes=15 * (index + 1)),
+            )
+            for index in range(count)
+        )
+        # bulk_create() skips the signals that invalidate the calendar cache.
+        calendar_cache.bump_version(self.master.pk)
+
+    def _get(self):
+        return self.client.get(reverse("calendar:list"), {"date": self.day.strftime("%Y-%m-%d")})
+
+    def test_day_counts_and_selected_day(self):
+        """Test that grid counts are aggregated and only the selected day is listed."""
+        self._fill_day(self.day, 3)
+        self._fill_day(self.day + timedelta(days=1), 5)
+        response = self._get()
+        self.assertEqual(response.status_code, 200)
+        counts = {cell["date"]: cell["count"] for week in response.context["weeks"] for cell in week}
+        self.assertEqual(counts[self.day], 3)
+        self.assertEqual(counts[self.day + timedelta(days=1)], 5)
+        self.assertEqual(len(response.context["selected_appointments"]), 3)
+
+    def test_query_count_does_not_grow_with_month_density(self):
+        """Test that a dense month costs the same number of queries as an empty one."""
+        with self.assertNumQueries(7) as empty:
+            self._get()
+        for offset in range(15):
+            self._fill_day(self.day + timedelta(days=offset), 10)
+        with self.assertNumQueries(len(empty)):
+            self._get()
+
+    def test_repeated_view_is_served_from_cache(self):
+        """Test that an unchanged calendar skips the appointment queries."""
+        self._fill_day(self.day, 2)
+        with self.assertNumQueries(7):
+            self._get()
+        # Session, user and the master profile with its profession.
+        with self.assertNumQueries(3):
+            response = self._get()
+        self.assertEqual(len(response.context["selected_appointments"]), 2)
+
+    def test_form_pages_load_the_profile_once(self):
+        """Test that the booking form and the feed page read the profile with one query."""
+        # Session, user, profile; then series and occupancy masks for the free slots.
+        with self.assertNumQueries(5):
+            self.assertEqual(self.client.get(reverse("calendar:add")).status_code, 200)
+        CalendarFeed.objects.create(master=self.master)
+        # Session, user, profile and the feed.
+        with self.assertNumQueries(4):
+            self.assertEqual(self.client.get(reverse("calendar:feed")).status_code, 200)
+
+    def test_appointment_changes_invalidate_cache(self):
+        """Test that saving or deleting an appointment is visible immediately."""
+        self._fill_day(self.day, 2)
+        self._get()
+        start = timezone.make_aware(timezone.datetime.combine(self.day, time(15, 0)))
+        appointment = Appointment.objects.create(
+            master=self.master,
+            client_name="Клиент",
+            client_phone="+79991234567",
+            starts_at=start,
+            ends_at=start + timedelta(minutes=30),
+        )
+        self.assertEqual(len(self._get().context["selected_appointments"]), 3)
+        appointment.delete()
+        self.assertEqual(len(self._get().context["selected_appointments"]), 2)
+
+    def test_versions_are_shared_between_processes(self):
+        """Test that versions live in the shared store, apart from the per-process entries."""
+        self._get()
+        version = calendar_cache.get_version(self.master.pk)
+        # Another worker has none of this worker's entries but sees the same versions.
+        caches["default"].clear()
+        self.assertEqual(calendar_cache.get_version(self.master.pk), version)
+        self._fill_day(self.day, 2)
+        self.assertNotEqual(caches[settings.CALENDAR_VERSION_CACHE].get(f"calendar:version:{self.master.pk}"), version)
+        self.assertEqual(len(self._get().context["selected_appointments"]), 2)
+
+    def test_cache_counts_hits_and_misses(self):
+        """Test that lookups are reflected in the hit/miss counters."""
+        calendar_cache.reset_process_stats()
+        self._get()
+        self._get()
+        stats = calendar_cache.get_process_stats()
+        self.assertEqual(stats["process"], os.getpid())
+        self.assertEqual(stats["misses"], 2)
+        self.assertEqual(stats["hits"], 2)
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+    def test_unchanged_calendar_returns_not_modified(self):
+        """Test that the calendar page honours ETag and Last-Modified validators."""
+        response = self._get()
+        url = reverse("calendar:list")
+        params = {"date": self.day.strftime("%Y-%m-%d")}
+        response = self.client.get(url, params, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self._fill_day(self.day, 1)
+        response = self.client.get(url, params, HTTP_IF_MODIFIED_SINCE="Thu, 01 Jan 2015 00:00:00 GMT")
+        self.assertEqual(response.status_code, 200)
+
+    def test_export_streams_month_with_occurrences(self):
+        """Test that the calendar export includes the series occurrences of the window."""
+        self._fill_day(self.day, 2)
+        AppointmentSeries.objects.create(
+            master=self.master,
+            client_name="Постоянный",
+            client_phone="+79990000000",
+            start_date=self.day,
+            start_time=time(15, 0),
+            duration_minutes=60,
+            frequency=AppointmentSeries.Frequency.DAILY,
+            until=self.day,
+        )
+        day = self.day.strftime("%Y-%m-%d")
+        response = self.client.get(reverse("calendar:export"), {"from": day, "to": day})
+        lines = b"".join(response.streaming_content).decode("utf-8-sig").splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[-1].startswith(","))
+        self.assertIn("Постоянный", lines[-1])
+        response = self.client.get(reverse("calendar:export"), {"from": "bad"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_export_expands_series_window_by_window(self):
+        """Test that occurrences crossing a window boundary are exported once each."""
+        AppointmentSeries.objects.create(
+            master=self.master,
+            client_name="Поздний",
+            client_phone="+79990000000",
+            start_date=self.day,
+            start_time=time(23, 30),
+            duration_minutes=60,
+            frequency=AppointmentSeries.Frequency.DAILY,
+        )
+        last_day = self.day + timedelta(days=4)
+        with mock.patch.object(export, "EXPORT_SERIES_WINDOW_DAYS", 2):
+            rows = list(export.export_rows(self.master.pk, self.day, last_day))[1:]
+        self.assertEqual([row[1][:10] for row in rows], [str(self.day + timedelta(days=n)) for n in range(5)])
+
+
+class DateRangeQueryTestCase(TestCase):
+    """Test that local-date filters become index-friendly datetime ranges."""
+
+    def setUp(self):
+        user = User.objects.create_user(email="master@test.com", password="testpass123")
+        profession = Profession.objects.create(name="Парикмахер", slug="hairdresser")
+        self.master = MasterProfile.objects.create(
+            user=user,
+            profession=profession,
+            phone="+71234567890",
+            work_start=time(9, 0),
+            work_end=time(18, 0),
+        )
+
+    def test_local_date_range_is_half_open(self):
+        """Test that the range ends at midnight after the last day in the given timezone."""
+        tz = timezone.get_fixed_timezone(180)
+        start, end = local_date_range(date(2025, 3, 1), date(2025, 3, 2), tz=tz)
+        self.assertEqual(start, timezone.make_aware(timezone.datetime(2025, 3, 1), tz))
+        self.assertEqual(end - start, timedelta(days=2))
+
+    def test_day_filter_excludes_next_midnight(self):
+        """Test that an appointment at midnight belongs to the following day."""
+        day = date(2025, 3, 1)
+        midnight = timezone.make_aware(timezone.datetime(2025, 3, 2))
+        Appointment.objects.create(
+            master=self.master,
+            client_name="Клиент",
+            client_phone="+79991234567",
+            starts_at=midnight,
+            ends_at=midnight + timedelta(minutes=30),
+        )
+        self.assertFalse(Appointment.objects.filter(starts_within(day)).exists())
+        self.assertTrue(Appointment.objects.filter(starts_within(day + timedelta(days=1))).exists())
+
+    def test_day_filter_uses_master_start_index(self):
+        """Test that EXPLAIN shows an index range seek on (master_id, starts_at)."""
+        plan = Appointment.objects.filter(starts_within(date(2025, 3, 1)), master=self.master).explain()
+        self.assertIn("USING", plan)
+        self.assertIn("INDEX", plan)
+        self.assertIn("master_id=? AND starts_at>? AND starts_at<?", plan)
+
+
+class SeriesRuleTestCase(TestCase):
+    """Test occurrence dates produced by series rules."""
+
+    def _series(self, **kwargs):
+        defaults = {"start_date": date(2025, 1, 7), "start_time": time(10, 0), "duration_minutes": 60}
+        defaults.update(kwargs)
+        return AppointmentSeries(**defaults)
+
+    def test_every_second_week(self):
+        """Test that a biweekly rule yields every other Tuesday in the window."""
+        series = self._series(frequency=AppointmentSeries.Frequency.WEEKLY, interval=2)
+        self.assertEqual(
+            list(series.occurrence_dates(date(2025, 1, 10), date(2025, 2, 28))),
+            [date(2025, 1, 21), date(2025, 2, 4), date(2025, 2, 18)],
+        )
+
+    def test_until_limits_occurrences(self):
+        """Test that no occurrence is produced after the end date."""
+        series = self._series(frequency=AppointmentSeries.Frequency.DAILY, until=date(2025, 1, 9))
+        self.assertEqual(
+            list(series.occurrence_dates(date(2025, 1, 1), date(2025, 1, 31))),
+            [date(2025, 1, 7), date(2025, 1, 8), date(2025, 1, 9)],
+        )
+
+    def test_monthly_skips_short_months(self):
+        """Test that a rule on the 31st skips months without that day."""
+        series = self._series(frequency=AppointmentSeries.Frequency.MONTHLY, start_date=date(2025, 1, 31))
+        self.assertEqual(
+            list(series.occurrence_dates(date(2025, 2, 1), date(2025, 6, 30))),
+            [date(2025, 3, 31), date(2025, 5, 31)],
+        )
+
+
+class CalendarFeedTestCase(TestCase):
+    """Test the iCalendar subscription feed."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="master@test.com", password="testpass123")
+        profession = Profession.objects.create(name="Парикмахер", slug="hairdresser")
+        self.master = MasterProfile.objects.create(
+            user=self.user,
+            profession=profession,
+            phone="+71234567890",
+            work_start=time(9, 0),
+            work_end=time(18, 0),
+            status=MasterProfile.Status.ACTIVE,
+        )
+        self.feed = CalendarFeed.objects.create(master=self.master)
+        self.url = reverse("calendar:feed-ics", kwargs={"token": self.feed.token})
+        self.day = timezone.localdate() + timedelta(days=1)
+
+    def _book(self, hour, **kwargs):
+        start = timezone.make_aware(timezone.datetime.combine(self.day, time(hour, 0)))
+        return Appointment.objects.create(
+            master=self.master,
+            client_name="Иван, Иванов",
+            client_phone="+79991234567",
+            starts_at=start,
+            ends_at=start + timedelta(minutes=30),
+            **kwargs,
+        )
+
+    def _read(self, response):
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content).decode("utf-8").replace("\r\n ", "")
+
+    def test_full_feed_lists_appointments_and_series(self):
+        """Test that bookings become events and series keep their rule and exceptions."""
+        appointment = self._book(10)
+        series = AppointmentSeries.objects.create(
+            master=self.master,
+            client_name="Постоянный",
+            client_phone="+79990000000",
+            start_date=self.day,
+            start_time=time(15, 0),
+            duration_minutes=60,
+            frequency=AppointmentSeries.Frequency.WEEKLY,
+        )
+        SeriesException.objects.create(series=series, occurrence_date=self.day + timedelta(days=7))
+        response = self.client.get(self.url)
+        self.assertEqual(response["Content-Type"], "text/calendar; charset=utf-8")
+        body = self._read(response)
+        self.assertTrue(body.startswith("BEGIN:VCALENDAR\r\n"))
+        self.assertIn(f"UID:appointment-{appointment.pk}@haircut", body)
+        self.assertIn("SUMMARY:Иван\\, Иванов", body)
+        self.assertIn("RRULE:FREQ=WEEKLY;INTERVAL=1", body)
+        self.assertIn(f"EXDATE;TZID=UTC:{self.day + timedelta(days=7):%Y%m%d}T150000", body)
+        self.assertIn("BEGIN:VTIMEZONE\r\nTZID:UTC\r\n", body)
+        self.assertIn("X-Sync-Token", response)
+
+    @override_settings(TIME_ZONE="Europe/Berlin")
+    def test_feed_defines_zone_of_series(self):
+        """Test that the zone series refer to is described with its daylight saving rules."""
+        AppointmentSeries.objects.create(
+            master=self.master,
+            client_name="Постоянный",
+            client_phone="+79990000000",
+            start_date=self.day,
+            start_time=time(15, 0),
+            duration_minutes=60,
+            frequency=AppointmentSeries.Frequency.WEEKLY,
+        )
+        body = self._read(self.client.get(self.url))
+        self.assertIn("DTSTART;TZID=Europe/Berlin:", body)
+        self.assertIn("TZID:Europe/Berlin\r\n", body)
+        self.assertIn(
+            "BEGIN:DAYLIGHT\r\nDTSTART:19700329T020000\r\nRRULE:FREQ=YEARLY;BYMONTH=3;BYDAY=-1SU\r\n"
+            "TZOFFSETFROM:+0100\r\nTZOFFSETTO:+0200\r\n",
+            body,
+        )
+        self.assertIn("RRULE:FREQ=YEARLY;BYMONTH=10;BYDAY=-1SU\r\nTZOFFSETFROM:+0200\r\nTZOFFSETTO:+0100\r\n", body)
+
+    def test_unchanged_feed_returns_not_modified(self):
+        """Test that polls of an unchanged calendar do not render the feed."""
+        self._book(10)
+        etag = self.client.get(self.url)["ETag"]
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self._book(11)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_delta_returns_changes_and_deletions(self):
+        """Test that a sync token limits the feed to changes made after it."""
+        unchanged = self._book(9)
+        removed = self._book(10)
+        long_ago = timezone.now() - timedelta(days=1)
+        Appointment.objects.filter(pk__in=[unchanged.pk, removed.pk]).update(updated_at=long_ago)
+        token = self.client.get(self.url)["X-Sync-Token"]
+        added = self._book(12)
+        removed_pk = removed.pk
+        removed.delete()
+        body = self._read(self.client.get(self.url, {"since": token}))
+        self.assertNotIn(f"UID:appointment-{unchanged.pk}@", body)
+        self.assertIn(f"UID:appointment-{added.pk}@", body)
+        self.assertIn(f"UID:appointment-{removed_pk}@haircut\r\nDTSTAMP", body)
+        self.assertIn("STATUS:CANCELLED", body)
+
+    def test_feed_rejects_unknown_or_rotated_token(self):
+        """Test that only the current token opens the feed."""
+        self.assertEqual(self.client.get(self.url, {"since": "abc"}).status_code, 400)
+        self.client.force_login(self.user)
+        self.client.post(reverse("calendar:feed"))
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.feed.refresh_from_db()
+        page = self.client.get(reverse("calendar:feed"))
+        self.assertContains(page, self.feed.token)
+
+    def test_purge_removes_only_expired_tombstones(self):
+        """Test that tombstones outlive the sync retention window and no longer."""
+        self._book(10).delete()
+        self._book(11).delete()
+        DeletedEvent.objects.filter(pk=DeletedEvent.objects.first().pk).update(
+            deleted_at=timezone.now() - timedelta(days=365)
+        )
+        call_command("purge_tombstones", stdout=StringIO())
+        self.assertEqual(DeletedEvent.objects.count(), 1)
+
+    def test_long_lines_are_folded_on_character_boundaries(self):
+        """Test that folding keeps lines within 75 octets without splitting characters."""
+        folded = fold("SUMMARY:" + "Я" * 60)
+        lines = folded.split("\r\n")
+        self.assertTrue(all(len(line.encode("utf-8")) <= 75 for line in lines))
+        unfolded = "".join(line[1:] if index else line for index, line in enumerate(lines))
+        self.assertEqual(unfolded, "SUMMARY:" + "Я" * 60)
+
+
+class MasterDeletionTestCase(TransactionTestCase):
+    """Test that masters with bookings can be deleted; foreign keys are checked on commit."""
+
+    def _master(self, email):
+        master = MasterProfile.objects.create(
+            user=User.objects.create_user(email=email, password="testpass123"),
+            profession=Profession.objects.get_or_create(name="Парикмахер", slug="hairdresser")[0],
+            phone="+71234567890",
+            work_start=time(9, 0),
+            work_end=time(18, 0),
+            status=MasterProfile.Status.ACTIVE,
+        )
+        client = Client.objects.get_or_create(phone="+79991234567", defaults={"full_name": "Иван"})[0]
+        day = timezone.localdate() + timedelta(days=1)
+        for hour in (10, 11):
+            start = timezone.make_aware(timezone.datetime.combine(day, time(hour, 0)))
+            Appointment.objects.create(
+                master=master,
+                client=client,
+                client_name="Иван",
+                client_phone="+79991234567",
+                starts_at=start,
+                ends_at=start + timedelta(minutes=30),
+            )
+        AppointmentSeries.objects.create(
+            master=master,
+            client_name="Иван",
+            client_phone="+79991234567",
+            start_date=day,
+            start_time=time(15, 0),
+            duration_minutes=60,
+            frequency=AppointmentSeries.Frequency.WEEKLY,
+        )
+        return master
+
+    def test_master_and_user_deletion_skip_tombstones(self):
+        """Test that deleting a master or their user cascades without tombstones."""
+        master = self._master("first@test.com")
+        other = self._master("second@test.com")
+        master.delete()
+        other.user.delete()
+        self.assertFalse(Appointment.objects.exists())
+        self.assertFalse(DeletedEvent.objects.exists())
+
+    def test_single_deletions_still_leave_tombstones(self):
+        """Test that removing one appointment or series is still reported to sync clients."""
+        master = self._master("master@test.com")
+        master.appointments.first().delete()
+        master.series.get().delete()
+        self.assertEqual(
+            sorted(DeletedEvent.objects.values_list("kind", flat=True)),
+            [DeletedEvent.Kind.APPOINTMENT, DeletedEvent.Kind.SERIES],
+        )
+
+
+@override_settings(CALENDAR_EVENTS_ENABLED=True)
+class CalendarEventsTestCase(TestCase):
+    """Test live calendar updates over Server-Sent Events."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="master@test.com", password="testpass123")
+        profession = Profession.objects.create(name="Парикмахер", slug="hairdresser")
+        self.master = MasterProfile.objects.create(
+            user=self.user,
+            profession=profession,
+            phone="+71234567890",
+            work_start=time(9, 0),
+            work_end=time(18, 0),
+            status=MasterProfile.Status.ACTIVE,
+        )
+
+    def _book(self):
+        start = timezone.make_aware(timezone.datetime.combine(timezone.localdate(), time(10, 0)))
+        with self.captureOnCommitCallbacks(execute=True):
+            return Appointment.objects.create(
+                master=self.master,
+                client_name="Клиент",
+                client_phone="+79991234567",
+                starts_at=start,
+                ends_at=start + timedelta(minutes=30),
+            )
+
+    async def test_stream_pushes_committed_bookings(self):
+        """Test that a booking reaches an open stream of its master."""
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse("calendar:events"))
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b"retry: 5000\n\n")
+        pending = asyncio.ensure_future(anext(stream))
+        appointment = await sync_to_async(self._book)()
+        frame = (await asyncio.wait_for(pending, 1)).decode()
+        self.assertTrue(frame.startswith("event: appointment.created\n"))
+        self.assertEqual(json.loads(frame.split("data: ", 1)[1])["id"], appointment.pk)
+        # A client disconnect cancels the pending read.
+        pending = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0)
+        pending.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await pending
+        self.assertFalse(events.get_broker().has_subscribers())
+
+    async def test_stream_requires_master(self):
+        """Test that anonymous users get no stream."""
+        response = await self.async_client.get(reverse("calendar:events"))
+        self.assertEqual(response.status_code, 401)
+
+    def test_stream_needs_asgi(self):
+        """Test that a WSGI request or disabled live updates end the stream at once."""
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse("calendar:events")).status_code, 204)
+        self.assertContains(self.client.get(reverse("calendar:list")), "EventSource")
+        with self.settings(CALENDAR_EVENTS_ENABLED=False):
+            self.assertNotContains(self.client.get(reverse("calendar:list")), "EventSource")
+
+    async def test_disabled_stream_is_not_opened(self):
+        """Test that live updates switched off answer 204 even under ASGI."""
+        await self.async_client.aforce_login(self.user)
+        with self.settings(CALENDAR_EVENTS_ENABLED=False):
+            response = await self.async_client.get(reverse("calendar:events"))
+        self.assertEqual(response.status_code, 204)
+
+    async def test_slow_subscriber_is_told_to_reset(self):
+        """Test that an overflowing queue collapses into a single reset event."""
+        subscription = events.Broker().subscribe(self.master.pk)
+        for index in range(events.SUBSCRIBER_BACKLOG + 5):
+            subscription.push({"type": "appointment.created", "id": index})
+        self.assertEqual(await subscription.get(), {"type": "reset"})
+        self.assertTrue(subscription.queue.empty())
+        subscription.push({"type": "appointment.created", "id": 1})
+        self.assertEqual((await subscription.get())["id"], 1)
+
+    async def test_file_broker_fans_out_across_processes(self):
+        """Test that events published by another process reach local subscribers once."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = str(Path(directory) / "events.log")
+            local, remote = events.FileBroker(path), events.FileBroker(path)
+            subscription = local.subscribe(self.master.pk)
+            remote.publish(self.master.pk, {"type": "series.changed", "id": 7})
+            local.publish(self.master.pk, {"type": "series.changed", "id": 8})
+            received = [await asyncio.wait_for(subscription.get(), 2) for _ in range(2)]
+            self.assertEqual(sorted(event["id"] for event in received), [7, 8])
+            await asyncio.sleep(events.FILE_POLL_INTERVAL * 2)
+            self.assertTrue(subscription.queue.empty())
+            subscription.close()
+            await asyncio.wait_for(local._tail_task, 2)
+
+
+class UtilizationTestCase(TestCase):
+    """Test the occupancy matrices behind the utilization report."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="master@test.com", password="testpass123")
+        self.master = MasterProfile.objects.create(
+            user=self.user,
+            profession=Profession.objects.create(name="Парикмахер", slug="hairdresser"),
+            phone="+71234567890",
+            work_start=time(9, 0),
+            work_end=time(11, 0),
+            status=MasterProfile.Status.ACTIVE,
+        )
+        # A Monday.
+        self.day = date(2026, 3, 2)
+        self.book(self.day, time(9, 0), time(9, 30))
+        self.book(self.day, time(10, 0), time(10, 15))
+        self.book(self.day + timedelta(days=3), time(8, 30), time(9, 15))
+        series = AppointmentSeries.objects.create(
+            master=self.master,
+            client_name="Постоянный",
+            client_phone="+79990000000",
+            start_date=self.day + timedelta(days=1),
+            start_time=time(10, 30),
+            duration_minutes=30,
+            frequency=AppointmentSeries.Frequency.DAILY,
+            until=self.day + timedelta(days=2),
+        )
+        SeriesException.objects.create(series=series, occurrence_date=self.day + timedelta(days=2))
+
+    def book(self, day, start, end):
+        Appointment.objects.create(
+            master=self.master,
+            client_name="Клиент",
+            client_phone="+79991234567",
+            starts_at=timezone.make_aware(timezone.datetime.combine(day, start)),
+            ends_at=timezone.make_aware(timezone.datetime.combine(day, end)),
+        )
+
+    def test_daily_counts_booked_working_slots(self):
+        """Test that appointments and series occurrences fill slots only inside working hours."""
+        with self.assertNumQueries(3):
+            utilization = load_utilization([self.master], self.day, self.day + timedelta(days=3))
+        booked, working = utilization.daily()
+        self.assertEqual(booked.tolist(), [[3, 2, 0, 1]])
+        self.assertEqual(working.tolist(), [[8, 8, 8, 8]])
+        self.assertEqual(utilization.shares().tolist(), [6 / 32])
+
+    def test_weeks_start_on_monday(self):
+        """Test that the first week is cut at the start of the range."""
+        utilization = load_utilization([self.master], self.day - timedelta(days=2), self.day + timedelta(days=3))
+        week_starts, booked, working = utilization.weekly()
+        self.assertEqual(week_starts, [self.day - timedelta(days=2), self.day])
+        self.assertEqual(booked.tolist(), [[0, 6]])
+        self.assertEqual(working.tolist(), [[16, 32]])
+
+    def test_gap_histogram_counts_idle_runs_between_bookings(self):
+        """Test that only gaps with bookings on both sides are counted."""
+        utilization = load_utilization([self.master], self.day, self.day + timedelta(days=3))
+        histogram = utilization.gap_histogram()
+        self.assertEqual(histogram.tolist(), [[0, 1, 0, 0, 0, 0, 0]])
+        report = summarize(utilization)
+        self.assertEqual(report["gaps"]["counts"], [0, 1, 0, 0, 0, 0, 0])
+        self.assertEqual(report["days"][0]["booked_minutes"], 45)
+        self.assertEqual(len(report["heatmap"]), 7)
+
+    def test_masters_without_bookings_are_idle(self):
+        """Test that several masters are laid out in one matrix."""
+        other = MasterProfile.objects.create(
+            user=User.objects.create_user(email="other@test.com", password="testpass123"),
+            profession=self.master.profession,
+            phone="+71234567891",
+            work_start=time(10, 0),
+            work_end=time(12, 0),
+            status=MasterProfile.Status.ACTIVE,
+        )
+        utilization = load_utilization([other, self.master], self.day, self.day)
+        booked, working = utilization.daily()
+        self.assertEqual(booked.tolist(), [[0], [3]])
+        self.assertEqual(utilization.shares().tolist(), [0.0, 3 / 8])
+
+    def test_dashboard_shows_utilization(self):
+        """Test that the dashboard of an active master has the utilization widget."""
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("masters:dashboard"))
+        self.assertContains(response, "Загрузка за 4 недели")
+        self.assertEqual(len(response.context["utilization"]["gaps"]), 7)
@@ -1,11 +1,22 @@
 from django.urls import path
 
-from .views import AppointmentCreateView, MasterCalendarView
+from .views import (
+    AppointmentCreateView,
+    AppointmentExportView,
+    CalendarEventsView,
+    CalendarFeedICSView,
+    CalendarFeedView,
+    MasterCalendarView,
+)
 
 app_name = "calendar"
 
 urlpatterns = [
     path("", MasterCalendarView.as_view(), name="list"),
     path("appointments/add/", AppointmentCreateView.as_view(), name="add"),
+    path("export.csv", AppointmentExportView.as_view(), name="export"),
+    path("events/", CalendarEventsView.as_view(), name="events"),
+    path("feed/", CalendarFeedView.as_view(), name="feed"),
+    path("feed/<slug:token>.ics", CalendarFeedICSView.as_view(), name="feed-ics"),
 ]
 
@@ -1,35 +1,71 @@
+import asyncio
 import calendar
-from datetime import date, timedelta
+from datetime import date, datetime, time, timedelta
 
-from django.contrib.auth.mixins import LoginRequiredMixin
-from django.shortcuts import redirect, render
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.http import (
+    HttpResponse,
+    HttpResponseBadRequest,
+    HttpResponseForbidden,
+    HttpResponseGone,
+    StreamingHttpResponse,
+)
+from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse_lazy
 from django.utils import timezone
+from django.utils.decorators import method_decorator
 from django.views import View
+from django.views.decorators.http import condition
 
+from masters.mixins import MasterProfileRequiredMixin, get_master_profile
 from masters.models import MasterProfile
 
+from . import cache as calendar_cache
+from .booking import AppointmentConflict
+from .events import format_event, get_broker
+from .export import stream_csv
 from .forms import AppointmentForm
-from .models import Appointment
+from .ics import iter_feed
+from .models import Appointment, CalendarFeed
+from .ranges import local_date_range, starts_within
+from .recurrence import expand_series, with_occurrences
+from .sync import InvalidSyncToken, SyncToken, SyncTokenExpired
 
 
-class MasterProfileRequiredMixin(LoginRequiredMixin):
-    """Ensure the authenticated user has a master profile."""
+def calendar_etag(request, *args, **kwargs):
+    return calendar_cache.get_etag(get_master_profile(request).pk, request.get_full_path(), timezone.localdate())
 
-    def dispatch(self, request, *args, **kwargs):
-        if not request.user.is_authenticated:
-            return super().dispatch(request, *args, **kwargs)
 
-        if not hasattr(request.user, "masterprofile"):
-            return redirect("masters:register")
+def calendar_last_modified(request, *args, **kwargs):
+    # The grid highlights today, so the page also changes at local midnight.
+    midnight = timezone.make_aware(datetime.combine(timezone.localdate(), time.min))
+    return max(calendar_cache.get_changed_at(get_master_profile(request).pk), midnight)
 
-        self.master_profile = request.user.masterprofile
-        return super().dispatch(request, *args, **kwargs)
+
+def _feed_master_id(request, token):
+    # Resolved once for both validators and the body.
+    if not hasattr(request, "calendar_feed"):
+        request.calendar_feed = get_object_or_404(
+            CalendarFeed.objects.select_related("master__user", "master__profession"), token=token
+        )
+    return request.calendar_feed.master_id
+
+
+def feed_etag(request, token):
+    return calendar_cache.get_etag(_feed_master_id(request, token), request.get_full_path())
+
+
+def feed_last_modified(request, token):
+    return calendar_cache.get_changed_at(_feed_master_id(request, token))
 
 
 class MasterCalendarView(MasterProfileRequiredMixin, View):
     template_name = "calendarapp/calendar.html"
 
+    @method_decorator(condition(etag_func=calendar_etag, last_modified_func=calendar_last_modified))
     def get(self, request):
         today = timezone.localdate()
         selected_date = self._get_selected_date(request, fallback=today)
@@ -41,23 +77,20 @@ class MasterCalendarView(MasterProfileRequiredMixin, View):
         start_range = month_grid[0][0]
         end_range = month_grid[-1][-1]
 
-        appointments = (
-            Appointment.objects.filter(
-                master=self.master_profile,
-                starts_at__date__range=(start_range, end_range),
-            )
-            .select_related("client")
-            .order_by("starts_at")
-        )
-
-        appointments_by_day = {}
-        for appointment in appointments:
-            day = appointment.starts_at.date()
-            appointments_by_day.setdefault(day, []).append(appointment)
-
         if selected_date < start_range or selected_date > end_range:
             selected_date = month_anchor
 
+        day_counts = calendar_cache.get_or_compute(
+            self.master_profile.pk,
+            f"month:{start_range:%Y-%m-%d}:{end_range:%Y-%m-%d}",
+            lambda: self._count_by_day(start_range, end_range),
+        )
+        selected_appointments = calendar_cache.get_or_compute(
+            self.master_profile.pk,
+            f"day:{selected_date:%Y-%m-%d}",
+            lambda: self._list_day(selected_date),
+        )
+
         weeks = []
         for week in month_grid:
             week_cells = []
@@ -68,7 +101,7 @@ class MasterCalendarView(MasterProfileRequiredMixin, View):
                         "in_month": day.month == month_anchor.month,
                         "is_today": day == today,
                         "is_selected": day == selected_date,
-                        "count": len(appointments_by_day.get(day, [])),
+                        "count": day_counts.get(day, 0),
                         "url": f"?month={month_anchor:%Y-%m}&date={day:%Y-%m-%d}",
                     }
                 )
@@ -76,6 +109,7 @@ class MasterCalendarView(MasterProfileRequiredMixin, View):
 
         prev_month = (month_anchor - timedelta(days=1)).replace(day=1)
         next_month = (month_anchor.replace(day=28) + timedelta(days=4)).replace(day=1)
+        month_end = next_month - timedelta(days=1)
 
         context = {
             "master": self.master_profile,
@@ -84,13 +118,40 @@ class MasterCalendarView(MasterProfileRequiredMixin, View):
             "prev_month_url": f"?month={prev_month:%Y-%m}&date={prev_month:%Y-%m-%d}",
             "next_month_url": f"?month={next_month:%Y-%m}&date={next_month:%Y-%m-%d}",
             "selected_date": selected_date,
-            "selected_appointments": appointments_by_day.get(selected_date, []),
+            "selected_appointments": selected_appointments,
             "can_manage": self.master_profile.status == MasterProfile.Status.ACTIVE,
             "add_appointment_url": f"{reverse_lazy('calendar:add')}?date={selected_date:%Y-%m-%d}",
+            "export_url": f"{reverse_lazy('calendar:export')}?from={month_anchor:%Y-%m-%d}&to={month_end:%Y-%m-%d}",
             "weekdays": ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"],
+            "live_updates": settings.CALENDAR_EVENTS_ENABLED,
         }
         return render(request, self.template_name, context)
 
+    def _count_by_day(self, first_day, last_day):
+        counts = dict(
+            Appointment.objects.filter(
+                starts_within(first_day, last_day),
+                master=self.master_profile,
+            )
+            .annotate(day=TruncDate("starts_at", tzinfo=timezone.get_current_timezone()))
+            .values("day")
+            .annotate(count=Count("id"))
+            .order_by()
+            .values_list("day", "count")
+        )
+        for occurrence in expand_series([self.master_profile.pk], *local_date_range(first_day, last_day)):
+            day = timezone.localtime(occurrence.starts_at).date()
+            counts[day] = counts.get(day, 0) + 1
+        return counts
+
+    def _list_day(self, day):
+        appointments = Appointment.objects.filter(
+            starts_within(day),
+            master=self.master_profile,
+        ).order_by("starts_at")
+        occurrences = expand_series([self.master_profile.pk], *local_date_range(day))
+        return with_occurrences(appointments, occurrences)
+
     @staticmethod
     def _get_selected_date(request, fallback: date) -> date:
         raw_value = request.GET.get("date")
@@ -114,6 +175,113 @@ class MasterCalendarView(MasterProfileRequiredMixin, View):
         return selected.replace(day=1)
 
 
+class AppointmentExportView(MasterProfileRequiredMixin, View):
+    """Stream the master's appointments as CSV, optionally for ``?from=&to=`` dates."""
+
+    def get(self, request):
+        try:
+            first_day, last_day = (self._parse_date(request.GET.get(name)) for name in ("from", "to"))
+        except ValueError:
+            return HttpResponseBadRequest("Некорректная дата.")
+        if first_day and last_day and first_day > last_day:
+            return HttpResponseBadRequest("Конец диапазона должен быть не раньше начала.")
+        return stream_csv(self.master_profile.pk, "appointments.csv", first_day, last_day)
+
+    @staticmethod
+    def _parse_date(raw_value):
+        return date.fromisoformat(raw_value) if raw_value else None
+
+
+class CalendarFeedView(MasterProfileRequiredMixin, View):
+    """Show the master's subscription URL and let them replace a leaked one."""
+
+    template_name = "calendarapp/feed.html"
+
+    def get(self, request):
+        feed, _ = CalendarFeed.objects.get_or_create(master=self.master_profile)
+        feed_url = request.build_absolute_uri(reverse_lazy("calendar:feed-ics", kwargs={"token": feed.token}))
+        return render(
+            request,
+            self.template_name,
+            {"feed_url": feed_url, "webcal_url": "webcal://" + feed_url.split("://", 1)[1]},
+        )
+
+    def post(self, request):
+        feed, created = CalendarFeed.objects.get_or_create(master=self.master_profile)
+        if not created:
+            feed.rotate()
+        return redirect("calendar:feed")
+
+
+class CalendarFeedICSView(View):
+    """iCalendar subscription authorised by the secret token in the URL.
+
+    Polls of an unchanged calendar are answered with 304. Clients that pass the
+    ``X-Sync-Token`` of a previous response as ``?since=`` get only the events
+    changed since then, with deletions as cancelled events.
+    """
+
+    @method_decorator(condition(etag_func=feed_etag, last_modified_func=feed_last_modified))
+    def get(self, request, token):
+        raw_since = request.GET.get("since")
+        try:
+            since = SyncToken.decode(raw_since) if raw_since else None
+        except SyncTokenExpired:
+            return HttpResponseGone("Токен синхронизации устарел, загрузите календарь целиком.")
+        except InvalidSyncToken:
+            return HttpResponseBadRequest("Некорректный токен синхронизации.")
+        issued_at = timezone.now()
+        response = StreamingHttpResponse(
+            iter_feed(request.calendar_feed.master, since, issued_at),
+            content_type="text/calendar; charset=utf-8",
+        )
+        response["X-Sync-Token"] = SyncToken(issued_at).encode()
+        return response
+
+
+class CalendarEventsView(View):
+    """Server-Sent Events stream of the current master's calendar changes.
+
+    Needs an ASGI server: every open connection is a suspended coroutine
+    waiting on its queue, so one worker holds thousands of idle screens.
+    A WSGI server would have to drain the endless stream in a worker thread,
+    so there and with ``CALENDAR_EVENTS_ENABLED`` off the view answers 204,
+    which tells ``EventSource`` not to reconnect.
+    """
+
+    heartbeat_interval = 25
+
+    async def get(self, request):
+        if not (settings.CALENDAR_EVENTS_ENABLED and isinstance(request, ASGIRequest)):
+            return HttpResponse(status=204)
+        user = await request.auser()
+        if not user.is_authenticated:
+            return HttpResponse(status=401)
+        master_id = await MasterProfile.objects.filter(user=user).values_list("pk", flat=True).afirst()
+        if master_id is None:
+            return HttpResponseForbidden()
+        return StreamingHttpResponse(
+            self._stream(master_id),
+            content_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    async def _stream(self, master_id):
+        subscription = get_broker().subscribe(master_id)
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), self.heartbeat_interval)
+                except TimeoutError:
+                    # Keeps proxies from closing an idle connection.
+                    yield ": keep-alive\n\n"
+                else:
+                    yield format_event(event)
+        finally:
+            subscription.close()
+
+
 class AppointmentCreateView(MasterProfileRequiredMixin, View):
     template_name = "calendarapp/appointment_form.html"
     success_url = reverse_lazy("calendar:list")
@@ -145,10 +313,13 @@ class AppointmentCreateView(MasterProfileRequiredMixin, View):
         service_date = self._resolve_service_date(request)
         form = AppointmentForm(request.POST, master=self.master_profile, service_date=service_date)
         if form.is_valid():
-            appointment = form.save()
-            appointment.created_by = request.user
-            appointment.save(update_fields=["created_by"])
-            return redirect(self.success_url)
+            form.instance.created_by = request.user
+            try:
+                form.save()
+            except AppointmentConflict as exc:
+                form.add_error("start_time", str(exc))
+            else:
+                return redirect(self.success_url)
         return render(
             request,
             self.template_name,
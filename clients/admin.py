@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Client
+from .models import Client, MasterClient
 
 
 @admin.register(Client)
@@ -10,3 +10,10 @@ class ClientAdmin(admin.ModelAdmin):
 from django.contrib import admin
 
 # Register your models here.
+
+
+@admin.register(MasterClient)
+class MasterClientAdmin(admin.ModelAdmin):
+    list_display = ("master", "client", "visit_count", "total_minutes", "first_visit", "last_visit")
+    list_select_related = ("master__user", "client")
+    raw_id_fields = ("master", "client")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from clients import visits
+
+
+class Command(BaseCommand):
+    help = "Recompute the master–client visit totals from appointments."
+
+    def handle(self, *args, **options):
+        pairs = visits.rebuild()
+        self.stdout.write(f"Rebuilt visit totals of {pairs} master–client pairs.")
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from clients import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text client search index from clients and appointments."
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            raise CommandError("Full-text client search needs SQLite with FTS5.")
+        documents = search.rebuild()
+        self.stdout.write(f"Indexed {documents} client documents.")
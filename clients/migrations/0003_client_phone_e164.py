@@ -0,0 +1,50 @@
+from collections import defaultdict
+
+from django.db import migrations, models
+
+from clients.phones import normalize_phone
+
+
+def merge_by_phone(apps, schema_editor):
+    """Fill ``phone_e164`` and fold clients whose numbers differ only in notation into the oldest one."""
+    Client = apps.get_model("clients", "Client")
+    DeletedClient = apps.get_model("clients", "DeletedClient")
+    Appointment = apps.get_model("calendarapp", "Appointment")
+    AppointmentSeries = apps.get_model("calendarapp", "AppointmentSeries")
+
+    groups = defaultdict(list)
+    for client in Client.objects.order_by("id"):
+        groups[normalize_phone(client.phone)].append(client)
+    for phone_e164, clients in groups.items():
+        keeper, duplicates = clients[0], clients[1:]
+        if duplicates:
+            duplicate_ids = [client.pk for client in duplicates]
+            Appointment.objects.filter(client_id__in=duplicate_ids).update(client=keeper)
+            AppointmentSeries.objects.filter(client_id__in=duplicate_ids).update(client=keeper)
+            keeper.full_name = max(clients, key=lambda client: client.updated_at).full_name
+            Client.objects.filter(pk__in=duplicate_ids).delete()
+            DeletedClient.objects.bulk_create(DeletedClient(client_id=pk) for pk in duplicate_ids)
+        keeper.phone_e164 = phone_e164
+        keeper.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0002_deleted_client'),
+        ('calendarapp', '0008_deletedevent_kind'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='phone_e164',
+            field=models.CharField(editable=False, max_length=16, null=True),
+        ),
+        migrations.RunPython(merge_by_phone, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='client',
+            name='phone_e164',
+            field=models.CharField(editable=False, max_length=16, unique=True),
+        ),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations
+
+from clients import search
+
+
+def create_search_table(apps, schema_editor):
+    connection = schema_editor.connection
+    if not search.is_supported(connection):
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(search.CREATE_TABLE_SQL)
+    search.rebuild(connection)
+
+
+def drop_search_table(apps, schema_editor):
+    connection = schema_editor.connection
+    if not search.is_supported(connection):
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {search.SEARCH_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0003_client_phone_e164'),
+        ('calendarapp', '0008_deletedevent_kind'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
@@ -0,0 +1,62 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Max, Min, Sum
+
+
+def fill_master_clients(apps, schema_editor):
+    Appointment = apps.get_model("calendarapp", "Appointment")
+    MasterClient = apps.get_model("clients", "MasterClient")
+    pairs = (
+        Appointment.objects.filter(client__isnull=False)
+        .values("master_id", "client_id")
+        .annotate(
+            first_visit=Min("starts_at"),
+            last_visit=Max("starts_at"),
+            visit_count=Count("id"),
+            duration=Sum(ExpressionWrapper(F("ends_at") - F("starts_at"), output_field=DurationField())),
+        )
+        .order_by()
+    )
+    MasterClient.objects.bulk_create(
+        (
+            MasterClient(
+                master_id=pair["master_id"],
+                client_id=pair["client_id"],
+                first_visit=pair["first_visit"],
+                last_visit=pair["last_visit"],
+                visit_count=pair["visit_count"],
+                total_minutes=int(pair["duration"].total_seconds() // 60),
+            )
+            for pair in pairs.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0004_client_search'),
+        ('masters', '0001_initial'),
+        ('calendarapp', '0008_deletedevent_kind'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MasterClient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_visit', models.DateTimeField()),
+                ('last_visit', models.DateTimeField()),
+                ('visit_count', models.PositiveIntegerField(default=0)),
+                ('total_minutes', models.PositiveIntegerField(default=0)),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='master_links', to='clients.client')),
+                ('master', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='client_links', to='masters.masterprofile')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['master', '-last_visit', '-id'], name='master_client_recent_idx')],
+                'constraints': [models.UniqueConstraint(fields=('master', 'client'), name='master_client_uniq')],
+            },
+        ),
+        migrations.RunPython(fill_master_clients, migrations.RunPython.noop),
+    ]
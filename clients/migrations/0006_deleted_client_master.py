@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0005_master_client'),
+        ('masters', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deletedclient',
+            name='master',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='deleted_clients', to='masters.masterprofile'),
+        ),
+        migrations.AddIndex(
+            model_name='deletedclient',
+            index=models.Index(fields=['master', 'deleted_at'], name='deleted_client_master_idx'),
+        ),
+    ]
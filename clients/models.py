@@ -1,11 +1,16 @@
+from django.core.exceptions import ValidationError
 from django.db import models
 
+from .phones import normalize_phone
+
 
 class Client(models.Model):
     """Customer who visits masters."""
 
     full_name = models.CharField(max_length=150)
     phone = models.CharField(max_length=32, unique=True)
+    # Lookup key: the same number written differently belongs to one client.
+    phone_e164 = models.CharField(max_length=16, unique=True, editable=False)
     email = models.EmailField(blank=True)
     notes = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -13,9 +18,73 @@ class Client(models.Model):
 
     class Meta:
         ordering = ("full_name",)
+        indexes = [
+            models.Index(fields=["updated_at"], name="client_updated_idx"),
+        ]
 
     def __str__(self):
         return f"{self.full_name} ({self.phone})"
+
+    def clean(self):
+        self.phone_e164 = normalize_phone(self.phone)
+        if Client.objects.filter(phone_e164=self.phone_e164).exclude(pk=self.pk).exists():
+            raise ValidationError({"phone": "Клиент с этим номером телефона уже есть."})
+
+    def save(self, *args, **kwargs):
+        self.phone_e164 = normalize_phone(self.phone)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "phone" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "phone_e164"}
+        super().save(*args, **kwargs)
+
+
+class MasterClient(models.Model):
+    """Client as seen by one master, with totals over their appointments.
+
+    Maintained from appointment writes, so "clients of a master" and the
+    visit summary are read from one row instead of the appointment history.
+    """
+
+    master = models.ForeignKey("masters.MasterProfile", on_delete=models.CASCADE, related_name="client_links")
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name="master_links")
+    first_visit = models.DateTimeField()
+    last_visit = models.DateTimeField()
+    visit_count = models.PositiveIntegerField(default=0)
+    total_minutes = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["master", "client"], name="master_client_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["master", "-last_visit", "-id"], name="master_client_recent_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.master} · {self.client}"
+
+
+class DeletedClient(models.Model):
+    """Tombstone of a deleted client for the delta sync of one master.
+
+    Rows without a master predate per-master tombstones and are sent to every
+    master until ``purge_tombstones`` drops them.
+    """
+
+    master = models.ForeignKey(
+        "masters.MasterProfile", on_delete=models.CASCADE, related_name="deleted_clients", null=True, blank=True
+    )
+    client_id = models.PositiveBigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ("deleted_at",)
+        indexes = [
+            models.Index(fields=["master", "deleted_at"], name="deleted_client_master_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.client_id} · {self.deleted_at:%Y-%m-%d %H:%M}"
 from django.db import models
 
 # Create your models here.
@@ -0,0 +1,16 @@
+import re
+
+# Numbers written without a country code are Russian.
+DEFAULT_COUNTRY_CODE = "7"
+NON_DIGITS = re.compile(r"\D")
+
+
+def normalize_phone(phone):
+    """Canonical E.164 form of ``phone``: ``8 912 345-67-89`` and ``+79123456789`` give ``+79123456789``."""
+    digits = NON_DIGITS.sub("", phone)
+    if not phone.strip().startswith("+"):
+        if len(digits) == 11 and digits.startswith("8"):
+            digits = DEFAULT_COUNTRY_CODE + digits[1:]
+        elif len(digits) == 10:
+            digits = DEFAULT_COUNTRY_CODE + digits
+    return f"+{digits}"
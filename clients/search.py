@@ -0,0 +1,168 @@
+"""Full-text search over the clients of a master.
+
+On SQLite the ``client_search`` FTS5 table holds one document per master
+and client they have served: name, phone digits, email and the notes of
+their appointments. Every token is stored with the master's id in front
+(``12xиван``), so a prefix query reads only that master's part of the
+vocabulary and stays fast however many clients there are in total.
+
+Documents are refreshed by signals on clients and appointments; code that
+writes around signals (``bulk_create``, the client upsert) calls
+``reindex`` itself. Other databases fall back to ``icontains`` lookups.
+"""
+
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Client
+
+SEARCH_TABLE = "client_search"
+SEARCH_LIMIT = 10
+REBUILD_CHUNK_SIZE = 5000
+# bm25() weights of the name, phone, email and notes columns.
+RANK_WEIGHTS = (10.0, 5.0, 3.0, 1.0)
+PHONE_QUERY = re.compile(r"^[\d\s()+-]+$")
+# Same word boundaries as the unicode61 tokenizer.
+TERM = re.compile(r"[^\W_]+")
+
+CREATE_TABLE_SQL = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+    name, phone, email, notes,
+    tokenize = 'unicode61 remove_diacritics 2'
+)
+"""
+
+# Documents of the (master, client) pairs matching ``{where}``.
+DOCUMENTS_SQL = """
+SELECT a.master_id, a.client_id, c.full_name, c.phone_e164, c.email, group_concat(a.notes, ' ')
+FROM calendarapp_appointment a
+JOIN clients_client c ON c.id = a.client_id
+WHERE {where}
+GROUP BY a.master_id, a.client_id
+"""
+
+
+def is_supported(using=connection):
+    return using.vendor == "sqlite"
+
+
+def document_id(master_id, client_id):
+    # Packing both ids into the rowid lets a pair be replaced without a
+    # lookup; client ids stay below 2**32.
+    return (master_id << 32) | client_id
+
+
+def _scoped(master_id, text):
+    return " ".join(f"{master_id}x{term}" for term in TERM.findall(text or ""))
+
+
+def _phone_terms(phone_e164):
+    digits = phone_e164.lstrip("+")
+    if digits.startswith("7"):
+        # Russian numbers are also typed in the national forms: 912... and 8912...
+        return f"{digits} {digits[1:]} 8{digits[1:]}"
+    return digits
+
+
+def _document(row):
+    master_id, client_id, full_name, phone_e164, email, notes = row
+    return (
+        document_id(master_id, client_id),
+        _scoped(master_id, full_name),
+        _scoped(master_id, _phone_terms(phone_e164)),
+        _scoped(master_id, email),
+        _scoped(master_id, notes),
+    )
+
+
+def _write(cursor, rows):
+    cursor.executemany(
+        f"INSERT OR REPLACE INTO {SEARCH_TABLE} (rowid, name, phone, email, notes) VALUES (%s, %s, %s, %s, %s)",
+        [_document(row) for row in rows],
+    )
+
+
+def reindex(client_ids, master_id=None):
+    """Refresh the documents of ``client_ids``, for one master or all of them.
+
+    With ``master_id`` the documents of clients the master no longer has any
+    appointment with are dropped.
+    """
+    client_ids = list(client_ids)
+    if not client_ids or not is_supported():
+        return
+    placeholders = ", ".join(["%s"] * len(client_ids))
+    where, params = f"a.client_id IN ({placeholders})", client_ids
+    if master_id is not None:
+        where, params = f"a.master_id = %s AND {where}", [master_id, *client_ids]
+    with connection.cursor() as cursor:
+        cursor.execute(DOCUMENTS_SQL.format(where=where), params)
+        rows = cursor.fetchall()
+        if master_id is not None:
+            gone = set(client_ids) - {row[1] for row in rows}
+            if gone:
+                cursor.executemany(
+                    f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s",
+                    [(document_id(master_id, client_id),) for client_id in gone],
+                )
+        if rows:
+            _write(cursor, rows)
+
+
+def rebuild(using=connection):
+    """Re-create every document, e.g. after restoring a dump without the table."""
+    documents = 0
+    with using.cursor() as cursor, using.cursor() as reader:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+        reader.execute(DOCUMENTS_SQL.format(where="a.client_id IS NOT NULL"))
+        while rows := reader.fetchmany(REBUILD_CHUNK_SIZE):
+            _write(cursor, rows)
+            documents += len(rows)
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')")
+    return documents
+
+
+def query_terms(text):
+    """Search terms of ``text``; a phone typed with separators is one term."""
+    if PHONE_QUERY.match(text) and any(char.isdigit() for char in text):
+        return ["".join(char for char in text if char.isdigit())]
+    return TERM.findall(text)
+
+
+def match_expression(master_id, terms):
+    """FTS5 query for documents of the master having every term as a prefix."""
+    return " AND ".join(f'"{master_id}x{term}"*' for term in terms)
+
+
+def search_clients(master_id, text, limit=SEARCH_LIMIT):
+    """Clients the master has served that match ``text``, best match first."""
+    terms = query_terms(text)
+    if not terms:
+        return []
+    if not is_supported():
+        return list(_search_fallback(master_id, terms)[:limit])
+
+    weights = ", ".join(str(weight) for weight in RANK_WEIGHTS)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid & 4294967295 FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s "
+            f"ORDER BY bm25({SEARCH_TABLE}, {weights}) LIMIT %s",
+            [match_expression(master_id, terms), limit],
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+    clients = Client.objects.in_bulk(ids)
+    return [clients[pk] for pk in ids if pk in clients]
+
+
+def _search_fallback(master_id, terms):
+    served = Client.objects.filter(master_links__master_id=master_id).distinct()
+    for term in terms:
+        served = served.filter(
+            Q(full_name__icontains=term)
+            | Q(phone_e164__contains=term)
+            | Q(email__icontains=term)
+            | Q(appointments__master_id=master_id, appointments__notes__icontains=term)
+        )
+    return served.order_by("full_name")
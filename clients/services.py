@@ -0,0 +1,163 @@
+"""Finding or creating the client behind a booking.
+
+Clients are keyed by the E.164 form of their phone. Known numbers are
+answered from a bounded per-process cache whose entries expire after
+``RESOLVE_CACHE_TTL`` seconds, as a client deleted or merged by another
+process is only forgotten here then; anything else costs one upsert
+statement, which also stores the latest name the client gave. Untrusted
+callers pass ``rename=False``: unknown numbers are inserted and known
+clients are left as they are. Writes run through ``with_fresh_clients`` so
+a cached id of a deleted client costs a retry instead of an error.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+
+from django.db import IntegrityError, transaction
+
+from calendarapp.cache import bump_version
+from calendarapp.models import Appointment, AppointmentSeries
+
+from . import search
+from .models import Client
+from .phones import normalize_phone
+
+RESOLVE_CACHE_SIZE = 10_000
+RESOLVE_CACHE_TTL = 60
+CACHED_FIELDS = ("id", "phone", "phone_e164", "full_name")
+# Ids served from the cache inside ``with_fresh_clients``, to drop if the write fails.
+_served_ids = ContextVar("served_client_ids", default=None)
+
+
+class ClientCache:
+    """Thread-safe LRU of ``phone_e164`` to the cached fields of a client, expiring after ``ttl`` seconds."""
+
+    timer = time.monotonic
+
+    def __init__(self, maxsize=RESOLVE_CACHE_SIZE, ttl=RESOLVE_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, phone_e164):
+        with self._lock:
+            entry = self._entries.get(phone_e164)
+            if entry is None:
+                return None
+            values, expires_at = entry
+            if expires_at <= self.timer():
+                del self._entries[phone_e164]
+                return None
+            self._entries.move_to_end(phone_e164)
+            return values
+
+    def put_many(self, clients):
+        expires_at = self.timer() + self.ttl
+        with self._lock:
+            for client in clients:
+                values = tuple(getattr(client, field) for field in CACHED_FIELDS)
+                self._entries[client.phone_e164] = (values, expires_at)
+                self._entries.move_to_end(client.phone_e164)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard_id(self, client_id):
+        with self._lock:
+            for key in [key for key, (values, _) in self._entries.items() if values[0] == client_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+cache = ClientCache()
+
+
+def _from_cache(values):
+    # Other fields stay deferred and are loaded only if something reads them.
+    return Client.from_db("default", CACHED_FIELDS, values)
+
+
+def invalidate_masters(client_ids):
+    """Bump the calendar versions of the masters with appointments or series of the clients."""
+    client_ids = list(client_ids)
+    appointments = Appointment.objects.filter(client_id__in=client_ids).values_list("master_id", flat=True)
+    series = AppointmentSeries.objects.filter(client_id__in=client_ids).values_list("master_id", flat=True)
+    for master_id in appointments.order_by().union(series.order_by()):
+        bump_version(master_id)
+
+
+def resolve_clients(pairs, rename=True):
+    """Clients for ``(phone, full_name)`` pairs, keyed by the E.164 phone.
+
+    Numbers are created or renamed in a single upsert; when a number occurs
+    more than once the last name wins. With ``rename=False`` existing
+    clients keep their name and notation, at the cost of a lookup.
+    """
+    names = {normalize_phone(phone): (phone, full_name) for phone, full_name in pairs}
+    resolved = {}
+    missing = []
+    for phone_e164, (phone, full_name) in names.items():
+        values = cache.get(phone_e164)
+        if values is not None and (values[3] == full_name or not rename):
+            resolved[phone_e164] = _from_cache(values)
+            served = _served_ids.get()
+            if served is not None:
+                served.append(values[0])
+        else:
+            missing.append(Client(phone=phone, phone_e164=phone_e164, full_name=full_name))
+    if missing and rename:
+        # On conflict the row takes the phone as typed this time, so the
+        # objects match the database and RETURNING supplies their ids.
+        Client.objects.bulk_create(
+            missing,
+            update_conflicts=True,
+            unique_fields=["phone_e164"],
+            update_fields=["phone", "full_name", "updated_at"],
+        )
+        # The upsert may have renamed clients other masters see, and it sends no post_save.
+        search.reindex(client.pk for client in missing)
+        invalidate_masters(client.pk for client in missing)
+    elif missing:
+        Client.objects.bulk_create(missing, ignore_conflicts=True)
+        phones = [client.phone_e164 for client in missing]
+        missing = list(Client.objects.filter(phone_e164__in=phones).only(*CACHED_FIELDS))
+    if missing:
+        for client in missing:
+            resolved[client.phone_e164] = client
+        # A rolled-back insert must not leave an id behind in the cache.
+        transaction.on_commit(lambda: cache.put_many(missing))
+    return resolved
+
+
+def resolve_client(phone, full_name, rename=True):
+    """Client with ``phone`` in any notation, created or renamed to ``full_name`` as needed."""
+    return resolve_clients([(phone, full_name)], rename=rename)[normalize_phone(phone)]
+
+
+def with_fresh_clients(write):
+    """Return ``write()`` run in a transaction, run once more if a cached client was gone.
+
+    Foreign keys are checked on commit, so an id served from the cache whose
+    row another process deleted fails the commit with ``IntegrityError``.
+    The ids served during that attempt are dropped and the second attempt
+    resolves them from the database. Inside an outer transaction nothing
+    commits here and errors pass through.
+    """
+    for attempt in range(2):
+        served = []
+        token = _served_ids.set(served)
+        try:
+            with transaction.atomic():
+                return write()
+        except IntegrityError:
+            if attempt or not served:
+                raise
+            for client_id in served:
+                cache.discard_id(client_id)
+        finally:
+            _served_ids.reset(token)
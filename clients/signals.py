@@ -0,0 +1,36 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from calendarapp.models import DeletedEvent
+from calendarapp.sync import retention
+
+from . import search
+from .models import Client, DeletedClient
+from .services import cache
+
+
+@receiver(post_delete, sender=Client)
+def record_deleted_client(sender, instance, **kwargs):
+    """Tell the masters that had the client's appointments or series within the sync retention."""
+    # Appointments protect their client, so by now every one of them left an event tombstone.
+    master_ids = (
+        DeletedEvent.objects.filter(client_id=instance.pk, deleted_at__gte=timezone.now() - retention())
+        .values_list("master_id", flat=True)
+        .distinct()
+    )
+    DeletedClient.objects.bulk_create(
+        DeletedClient(master_id=master_id, client_id=instance.pk) for master_id in master_ids
+    )
+
+
+@receiver(post_save, sender=Client)
+@receiver(post_delete, sender=Client)
+def forget_resolved_client(sender, instance, **kwargs):
+    cache.discard_id(instance.pk)
+
+
+@receiver(post_save, sender=Client)
+def reindex_client_search(sender, instance, created, **kwargs):
+    if not created:
+        search.reindex([instance.pk])
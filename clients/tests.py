@@ -1,3 +1,319 @@
+from datetime import time, timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.exceptions import ValidationError
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from calendarapp import cache as calendar_cache
+from calendarapp.models import Appointment
+from masters.models import MasterProfile, Profession
+
+from . import services, visits
+from .models import Client, MasterClient
+from .phones import normalize_phone
+from .search import query_terms, rebuild, search_clients
+from .services import ClientCache, resolve_client, resolve_clients
+
+
+class NormalizePhoneTestCase(TestCase):
+    def test_russian_notations_share_a_key(self):
+        for phone in ("+79123456789", "89123456789", "79123456789", "9123456789", "+7 (912) 345-67-89"):
+            with self.subTest(phone=phone):
+                self.assertEqual(normalize_phone(phone), "+79123456789")
+
+    def test_foreign_numbers_keep_their_code(self):
+        self.assertEqual(normalize_phone("+380441234567"), "+380441234567")
+
+    def test_model_fills_key_and_rejects_duplicates(self):
+        client = Client.objects.create(full_name="Иван", phone="89123456789")
+        self.assertEqual(client.phone_e164, "+79123456789")
+        with self.assertRaises(ValidationError):
+            Client(full_name="Иван", phone="+79123456789").full_clean()
+
+
+class ResolveClientTestCase(TestCase):
+    def setUp(self):
+        services.cache.clear()
+        self.addCleanup(services.cache.clear)
+
+    def test_other_notation_reuses_and_renames_client(self):
+        existing = Client.objects.create(full_name="Старое имя", phone="+79123456789")
+        # The upsert, the search refresh and the masters to invalidate for the rename.
+        with self.assertNumQueries(3):
+            client = resolve_client("8 912 345 67 89", "Новое имя")
+        self.assertEqual(client.pk, existing.pk)
+        existing.refresh_from_db()
+        self.assertEqual(existing.full_name, "Новое имя")
+        self.assertEqual(Client.objects.count(), 1)
+
+    def test_known_client_is_served_from_cache_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            created = resolve_client("+79123456789", "Иван")
+        with self.assertNumQueries(0):
+            cached = resolve_client("89123456789", "Иван")
+        self.assertEqual(cached.pk, created.pk)
+        self.assertEqual(cached.phone, "+79123456789")
+        # A different name goes to the database again.
+        with self.assertNumQueries(3):
+            resolve_client("89123456789", "Иван Петров")
+
+    def test_rolled_back_upsert_is_not_cached(self):
+        resolve_client("+79123456789", "Иван")
+        self.assertIsNone(services.cache.get("+79123456789"))
+
+    def test_client_changes_invalidate_cache(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            client = resolve_client("+79123456789", "Иван")
+        client = Client.objects.get(pk=client.pk)
+        client.phone = "+79120000000"
+        client.save()
+        self.assertIsNone(services.cache.get("+79123456789"))
+        self.assertNotEqual(resolve_client("+79123456789", "Иван").pk, client.pk)
+
+    def test_batch_resolves_in_one_upsert(self):
+        Client.objects.create(full_name="Анна", phone="+79990000001")
+        with self.assertNumQueries(3):
+            clients = resolve_clients(
+                [("89990000001", "Анна"), ("+79990000002", "Ольга"), ("+79990000002", "Ольга Иванова")]
+            )
+        self.assertEqual(set(clients), {"+79990000001", "+79990000002"})
+        self.assertEqual(clients["+79990000002"].full_name, "Ольга Иванова")
+        self.assertEqual(Client.objects.count(), 2)
+
+    def test_rename_invalidates_calendars_of_every_master(self):
+        """Test that a rename by one master's booking reaches the cached calendars of the others."""
+        profession = Profession.objects.create(name="Парикмахер", slug="hairdresser")
+        first, second, stranger = (
+            MasterProfile.objects.create(
+                user=get_user_model().objects.create_user(email=email, password="testpass123"),
+                profession=profession,
+                phone="+71234567890",
+                work_start=time(9, 0),
+                work_end=time(18, 0),
+            )
+            for email in ("first@test.com", "second@test.com", "stranger@test.com")
+        )
+        client = Client.objects.create(full_name="Иван", phone="+79123456789")
+        for master in (first, second):
+            Appointment.objects.create(
+                master=master,
+                client=client,
+                client_name=client.full_name,
+                client_phone=client.phone,
+                starts_at=timezone.now(),
+                ends_at=timezone.now() + timedelta(hours=1),
+            )
+        versions = {master.pk: calendar_cache.get_version(master.pk) for master in (first, second, stranger)}
+        resolve_client(client.phone, "Иван Петров")
+        self.assertNotEqual(calendar_cache.get_version(first.pk), versions[first.pk])
+        self.assertNotEqual(calendar_cache.get_version(second.pk), versions[second.pk])
+        self.assertEqual(calendar_cache.get_version(stranger.pk), versions[stranger.pk])
+
+    def test_cache_is_bounded(self):
+        cache = ClientCache(maxsize=2)
+        cache.put_many(Client(pk=pk, phone=f"+7999000000{pk}", phone_e164=f"+7999000000{pk}") for pk in range(3))
+        self.assertIsNone(cache.get("+79990000000"))
+        self.assertIsNotNone(cache.get("+79990000002"))
+
+    def test_cache_entries_expire(self):
+        cache = ClientCache(ttl=60)
+        cache.timer = mock.Mock(return_value=1000.0)
+        cache.put_many([Client(pk=1, phone="+79990000001", phone_e164="+79990000001", full_name="Анна")])
+        cache.timer.return_value = 1059.0
+        self.assertIsNotNone(cache.get("+79990000001"))
+        cache.timer.return_value = 1060.0
+        self.assertIsNone(cache.get("+79990000001"))
+
+    def test_cached_client_can_be_booked(self):
+        master = MasterProfile.objects.create(
+            user=get_user_model().objects.create_user(email="master@test.com", password="testpass123"),
+            profession=Profession.objects.create(name="Парикмахер", slug="hairdresser"),
+            phone="+71234567890",
+            work_start=time(9, 0),
+            work_end=time(18, 0),
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            resolve_client("+79123456789", "Иван")
+        client = resolve_client("89123456789", "Иван")
+        appointment = Appointment.objects.create(
+            master=master,
+            client=client,
+            client_name=client.full_name,
+            client_phone=client.phone,
+            starts_at=timezone.now(),
+            ends_at=timezone.now() + timedelta(hours=1),
+        )
+        self.assertEqual(appointment.client.email, "")
+
+
+class ClientSearchTestCase(TestCase):
+    def setUp(self):
+        profession = Profession.objects.create(name="Парикмахер", slug="hairdresser")
+        self.master, self.other_master = (
+            MasterProfile.objects.create(
+                user=get_user_model().objects.create_user(email=email, password="testpass123"),
+                profession=profession,
+                phone="+71234567890",
+                work_start=time(9, 0),
+                work_end=time(18, 0),
+            )
+            for email in ("master@test.com", "other@test.com")
+        )
+        self.ivan = Client.objects.create(full_name="Иван Петров", phone="+79123456789", email="ivan@mail.ru")
+        self.irina = Client.objects.create(full_name="Ирина Иванова", phone="+79990000001")
+        self.stranger = Client.objects.create(full_name="Иван Чужой", phone="+79990000002")
+        self.start = timezone.now().replace(microsecond=0)
+        self.book(self.master, self.ivan, "окрашивание")
+        self.book(self.master, self.irina, "")
+        self.book(self.other_master, self.stranger, "")
+
+    def book(self, master, client, notes):
+        self.start += timedelta(hours=1)
+        return Appointment.objects.create(
+            master=master,
+            client=client,
+            client_name=client.full_name,
+            client_phone=client.phone,
+            starts_at=self.start,
+            ends_at=self.start + timedelta(hours=1),
+            notes=notes,
+        )
+
+    def search(self, text):
+        return [client.pk for client in search_clients(self.master.pk, text)]
+
+    def test_prefix_search_is_scoped_to_the_master(self):
+        self.assertCountEqual(self.search("ива"), [self.ivan.pk, self.irina.pk])
+        self.assertEqual(self.search("Ив Пет"), [self.ivan.pk])
+        self.assertEqual(self.search("Чужой"), [])
+
+    def test_name_matches_rank_above_notes(self):
+        marina = Client.objects.create(full_name="Марина", phone="+79990000003")
+        self.book(self.master, marina, "стрижка как у Петрова")
+        self.assertEqual(self.search("петров"), [self.ivan.pk, marina.pk])
+
+    def test_matches_phone_in_any_notation_email_and_notes(self):
+        for text in ("+7 912 345", "8912", "912-34", "ivan@mail", "окраш"):
+            with self.subTest(text=text):
+                self.assertEqual(self.search(text), [self.ivan.pk])
+
+    def test_index_follows_changes(self):
+        appointment = self.book(self.master, self.stranger, "")
+        self.assertEqual(self.search("Чужой"), [self.stranger.pk])
+        # Renames through the resolve upsert bypass model signals.
+        resolve_client(self.stranger.phone, "Пётр Новый")
+        self.assertEqual(self.search("Чужой"), [])
+        self.assertEqual(self.search("Новый"), [self.stranger.pk])
+        appointment.notes = "стрижка бороды"
+        appointment.save()
+        self.assertEqual(self.search("бород"), [self.stranger.pk])
+        appointment.delete()
+        self.assertEqual(self.search("Новый"), [])
+
+    def test_punctuation_only_query_matches_nothing(self):
+        self.assertEqual(query_terms("\"*:"), [])
+        self.assertEqual(self.search("\"*:"), [])
+
+    def test_rebuild_command(self):
+        out = StringIO()
+        call_command("reindex_client_search", stdout=out)
+        self.assertIn("Indexed 3", out.getvalue())
+        self.assertEqual(rebuild(), 3)
+        self.assertEqual(self.search("окраш"), [self.ivan.pk])
+
+
+class MasterClientTestCase(TestCase):
+    def setUp(self):
+        self.master = MasterProfile.objects.create(
+            user=get_user_model().objects.create_user(email="master@test.com", password="testpass123"),
+            profession=Profession.objects.create(name="Парикмахер", slug="hairdresser"),
+            phone="+71234567890",
+            work_start=time(9, 0),
+            work_end=time(18, 0),
+        )
+        self.client_obj = Client.objects.create(full_name="Иван", phone="+79123456789")
+        self.day = timezone.now().replace(microsecond=0)
+
+    def book(self, days, minutes=60, client=None):
+        starts_at = self.day + timedelta(days=days)
+        return Appointment.objects.create(
+            master=self.master,
+            client=client or self.client_obj,
+            client_name="Иван",
+            client_phone="+79123456789",
+            starts_at=starts_at,
+            ends_at=starts_at + timedelta(minutes=minutes),
+        )
+
+    def link(self):
+        return MasterClient.objects.filter(master=self.master, client=self.client_obj).first()
+
+    def assertTotals(self, first_days, last_days, count, minutes):
+        link = self.link()
+        self.assertEqual(
+            (link.first_visit, link.last_visit, link.visit_count, link.total_minutes),
+            (self.day + timedelta(days=first_days), self.day + timedelta(days=last_days), count, minutes),
+        )
+
+    def test_bookings_add_up(self):
+        self.book(0)
+        self.book(-10, minutes=30)
+        self.book(5, minutes=90)
+        self.assertTotals(-10, 5, 3, 180)
+
+    def test_removing_visits(self):
+        self.book(-10, minutes=30)
+        middle = self.book(0)
+        last = self.book(5, minutes=90)
+        middle.delete()
+        self.assertTotals(-10, 5, 2, 120)
+        last.delete()
+        self.assertTotals(-10, -10, 1, 30)
+        Appointment.objects.get().delete()
+        self.assertIsNone(self.link())
+
+    def test_moved_appointment(self):
+        self.book(0)
+        moved = self.book(1)
+        moved.starts_at += timedelta(days=2)
+        moved.ends_at = moved.starts_at + timedelta(minutes=45)
+        moved.save()
+        self.assertTotals(0, 3, 2, 105)
+        other = Client.objects.create(full_name="Пётр", phone="+79990000000")
+        moved.client = other
+        moved.save()
+        self.assertTotals(0, 0, 1, 60)
+        self.assertEqual(MasterClient.objects.get(client=other).visit_count, 1)
+
+    def test_rebuild_matches_incremental_totals(self):
+        for days in (-3, 0, 4):
+            self.book(days, minutes=40)
+        expected = MasterClient.objects.values().get()
+        out = StringIO()
+        call_command("rebuild_client_visits", stdout=out)
+        self.assertIn("1 master", out.getvalue())
+        rebuilt = MasterClient.objects.values().get()
+        self.assertEqual({**rebuilt, "id": None}, {**expected, "id": None})
+        self.assertEqual(visits.rebuild(), 1)
 
-# Create your tests here.
+    def test_detail_page_reads_summary_and_authorizes_from_totals(self):
+        self.book(-1, minutes=30)
+        self.book(-2, minutes=30)
+        self.client.force_login(self.master.user)
+        # Session, user, profile, totals and the appointments, however many there are.
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse("clients:detail", args=[self.client_obj.pk]))
+        self.assertContains(response, "Визитов: 2")
+        self.assertContains(response, "всего 60 мин.")
+        stranger = Client.objects.create(full_name="Пётр", phone="+79990000000")
+        self.assertRedirects(
+            self.client.get(reverse("clients:detail", args=[stranger.pk])),
+            reverse("calendar:list"),
+            fetch_redirect_response=False,
+        )
+        self.assertEqual(self.client.get(reverse("clients:detail", args=[10**6])).status_code, 404)
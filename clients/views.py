@@ -1,45 +1,31 @@
-from django.contrib.auth.mixins import LoginRequiredMixin
 from django.shortcuts import get_object_or_404, redirect, render
 from django.views import View
 
-from masters.models import MasterProfile
+from masters.mixins import MasterProfileRequiredMixin
 
-from .models import Client
-
-
-class MasterProfileRequiredMixin(LoginRequiredMixin):
-    """Ensure only authenticated masters access client history."""
-
-    def dispatch(self, request, *args, **kwargs):
-        if not request.user.is_authenticated:
-            return super().dispatch(request, *args, **kwargs)
-        if not hasattr(request.user, "masterprofile"):
-            return redirect("masters:register")
-        self.master_profile = request.user.masterprofile
-        return super().dispatch(request, *args, **kwargs)
+from .models import Client, MasterClient
 
 
 class ClientDetailView(MasterProfileRequiredMixin, View):
     template_name = "clients/client_detail.html"
 
     def get(self, request, pk):
-        client = get_object_or_404(Client, pk=pk)
-        appointments = (
-            client.appointments.filter(master=self.master_profile)
-            .select_related("master")
-            .order_by("-starts_at")
+        link = (
+            MasterClient.objects.filter(master=self.master_profile, client_id=pk).select_related("client").first()
         )
-        if not appointments.exists():
+        if link is None:
             # Prevent masters from accessing foreign clients
+            get_object_or_404(Client, pk=pk)
             return redirect("calendar:list")
+        # Reading through the profile's manager gives every row this same
+        # master, profession and user included.
+        appointments = self.master_profile.appointments.filter(client=link.client).order_by("-starts_at")
         return render(
             request,
             self.template_name,
             {
-                "client": client,
+                "client": link.client,
+                "visits": link,
                 "appointments": appointments,
             },
         )
-from django.shortcuts import render
-
-# Create your views here.
@@ -0,0 +1,142 @@
+"""Upkeep of the ``MasterClient`` totals from appointment writes.
+
+Created appointments are added to the totals in place;
+removed ones are subtracted, and only removing the first or last visit
+makes the bounds be read again from the pair's appointments. Moved
+appointments are rare enough to simply recount their pairs.
+"""
+
+from functools import reduce
+from operator import or_
+
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Max, Min, Q, Sum, Value
+from django.db.models.functions import Greatest, Least
+
+from calendarapp.models import Appointment
+
+from .models import MasterClient
+
+
+def _minutes(appointment):
+    return int((appointment.ends_at - appointment.starts_at).total_seconds() // 60)
+
+
+def _pairs(appointments):
+    totals = {}
+    for appointment in appointments:
+        if appointment.client_id is None:
+            continue
+        key = (appointment.master_id, appointment.client_id)
+        first, last, count, minutes = totals.get(key, (appointment.starts_at, appointment.starts_at, 0, 0))
+        totals[key] = (
+            min(first, appointment.starts_at),
+            max(last, appointment.starts_at),
+            count + 1,
+            minutes + _minutes(appointment),
+        )
+    return totals
+
+
+def record_visits(appointments):
+    """Add newly stored appointments to the totals of their master–client pairs.
+
+    Costs one read, one ``UPDATE`` of the known pairs and one ``INSERT`` of
+    the new ones. Bookings of a master hold ``lock_master``, so no other
+    transaction creates the same pair in between.
+    """
+    totals = _pairs(appointments)
+    if not totals:
+        return
+    masters = {}
+    for master_id, client_id in totals:
+        masters.setdefault(master_id, []).append(client_id)
+    known = MasterClient.objects.filter(
+        reduce(or_, (Q(master_id=master_id, client_id__in=client_ids) for master_id, client_ids in masters.items()))
+    )
+    links = []
+    for link in known:
+        first, last, count, minutes = totals.pop((link.master_id, link.client_id))
+        link.first_visit = Least("first_visit", Value(first))
+        link.last_visit = Greatest("last_visit", Value(last))
+        link.visit_count = F("visit_count") + count
+        link.total_minutes = F("total_minutes") + minutes
+        links.append(link)
+    if links:
+        MasterClient.objects.bulk_update(links, ["first_visit", "last_visit", "visit_count", "total_minutes"])
+    if totals:
+        MasterClient.objects.bulk_create(
+            MasterClient(
+                master_id=master_id,
+                client_id=client_id,
+                first_visit=first,
+                last_visit=last,
+                visit_count=count,
+                total_minutes=minutes,
+            )
+            for (master_id, client_id), (first, last, count, minutes) in totals.items()
+        )
+
+
+def forget_visit(appointment):
+    """Subtract a removed appointment from its pair's totals."""
+    if appointment.client_id is None:
+        return
+    links = MasterClient.objects.filter(master_id=appointment.master_id, client_id=appointment.client_id)
+    link = links.first()
+    if link is None:
+        return
+    if link.visit_count <= 1:
+        link.delete()
+    elif appointment.starts_at in (link.first_visit, link.last_visit):
+        refresh_visits(appointment.master_id, appointment.client_id)
+    else:
+        links.update(visit_count=F("visit_count") - 1, total_minutes=F("total_minutes") - _minutes(appointment))
+
+
+def refresh_visits(master_id, client_id):
+    """Recompute one pair from its appointments."""
+    stats = Appointment.objects.filter(master_id=master_id, client_id=client_id).aggregate(
+        first_visit=Min("starts_at"),
+        last_visit=Max("starts_at"),
+        visit_count=Count("id"),
+        duration=Sum(ExpressionWrapper(F("ends_at") - F("starts_at"), output_field=DurationField())),
+    )
+    if not stats["visit_count"]:
+        MasterClient.objects.filter(master_id=master_id, client_id=client_id).delete()
+        return
+    duration = stats.pop("duration")
+    MasterClient.objects.update_or_create(
+        master_id=master_id,
+        client_id=client_id,
+        defaults={**stats, "total_minutes": int(duration.total_seconds() // 60)},
+    )
+
+
+def rebuild():
+    """Recompute every pair; returns the number of pairs."""
+    MasterClient.objects.all().delete()
+    pairs = (
+        Appointment.objects.filter(client__isnull=False)
+        .values("master_id", "client_id")
+        .annotate(
+            first_visit=Min("starts_at"),
+            last_visit=Max("starts_at"),
+            visit_count=Count("id"),
+            duration=Sum(ExpressionWrapper(F("ends_at") - F("starts_at"), output_field=DurationField())),
+        )
+    )
+    links = MasterClient.objects.bulk_create(
+        (
+            MasterClient(
+                master_id=pair["master_id"],
+                client_id=pair["client_id"],
+                first_visit=pair["first_visit"],
+                last_visit=pair["last_visit"],
+                visit_count=pair["visit_count"],
+                total_minutes=int(pair["duration"].total_seconds() // 60),
+            )
+            for pair in pairs.order_by().iterator()
+        ),
+        batch_size=1000,
+    )
+    return len(links)
@@ -0,0 +1,32 @@
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.shortcuts import redirect
+
+from .models import MasterProfile
+
+
+def get_master_profile(request):
+    """Master profile of the signed-in user with profession and user, or ``None``.
+
+    Loaded with one query per request and also cached as
+    ``request.user.masterprofile``, so templates and helpers reuse it.
+    """
+    if not hasattr(request, "_master_profile"):
+        profile = None
+        if request.user.is_authenticated:
+            profile = MasterProfile.objects.select_related("profession", "user").filter(user=request.user).first()
+            MasterProfile.user.field.remote_field.set_cached_value(request.user, profile)
+        request._master_profile = profile
+    return request._master_profile
+
+
+class MasterProfileRequiredMixin(LoginRequiredMixin):
+    """Ensure the authenticated user has a master profile, available as ``self.master_profile``."""
+
+    def dispatch(self, request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return super().dispatch(request, *args, **kwargs)
+
+        self.master_profile = get_master_profile(request)
+        if self.master_profile is None:
+            return redirect("masters:register")
+        return super().dispatch(request, *args, **kwargs)
@@ -1,3 +1,77 @@
-from django.test import TestCase
+from datetime import time
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+
+from .mixins import get_master_profile
+from .models import MasterProfile, Profession
+
+User = get_user_model()
+
+
+class MasterPagesTestCase(TestCase):
+    """Test that the master pages load the profile once per request."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="master@test.com", password="testpass123", first_name="Анна")
+        self.master = MasterProfile.objects.create(
+            user=self.user,
+            profession=Profession.objects.create(name="Парикмахер", slug="hairdresser"),
+            phone="+71234567890",
+            work_start=time(9, 0),
+            work_end=time(18, 0),
+        )
+
+    def test_profile_is_shared_with_the_user(self):
+        """Test that the profile, its profession and user come from one query."""
+        request = RequestFactory().get("/")
+        request.user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(1):
+            profile = get_master_profile(request)
+            self.assertIs(get_master_profile(request), profile)
+            self.assertIs(request.user.masterprofile, profile)
+            self.assertEqual(str(profile), "Анна · Парикмахер")
+
+    def test_users_without_profile_are_remembered(self):
+        """Test that a missing profile is not looked up again."""
+        request = RequestFactory().get("/")
+        request.user = User.objects.create_user(email="client@test.com")
+        with self.assertNumQueries(1):
+            self.assertIsNone(get_master_profile(request))
+            self.assertIsNone(get_master_profile(request))
+            self.assertFalse(hasattr(request.user, "masterprofile"))
+
+    def test_anonymous_pages(self):
+        """Test the login form and the registration page."""
+        with self.assertNumQueries(0):
+            self.assertContains(self.client.get(reverse("masters:dashboard")), "form")
+        # Professions for the registration form.
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(reverse("masters:register")).status_code, 200)
+
+    def test_pending_dashboard(self):
+        """Test that a pending master's dashboard needs the session, user and profile only."""
+        self.client.force_login(self.user)
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("masters:dashboard"))
+        self.assertContains(response, "Парикмахер")
+        self.assertTrue(response.context["is_pending"])
+
+    def test_active_dashboard(self):
+        """Test that the utilization widget is read once and then served from the cache."""
+        self.master.status = MasterProfile.Status.ACTIVE
+        self.master.save()
+        self.client.force_login(self.user)
+        # Session, user, profile, then the appointments and series of the widget.
+        with self.assertNumQueries(5):
+            self.client.get(reverse("masters:dashboard"))
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("masters:dashboard"))
+        self.assertContains(response, "Загрузка за 4 недели")
+
+    def test_users_without_profile_are_sent_to_registration(self):
+        """Test that the dashboard and calendar redirect users who are not masters."""
+        self.client.force_login(User.objects.create_user(email="client@test.com", password="testpass123"))
+        for url in (reverse("masters:dashboard"), reverse("calendar:list")):
+            self.assertRedirects(self.client.get(url), reverse("masters:register"), fetch_redirect_response=False)
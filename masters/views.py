@@ -1,13 +1,37 @@
+from datetime import timedelta
+
 from django.contrib.auth import login
 from django.contrib.auth.forms import AuthenticationForm
 from django.shortcuts import redirect, render
 from django.urls import reverse_lazy
+from django.utils import timezone
 from django.views import View
 
+from calendarapp import cache as calendar_cache
+from calendarapp.analytics import GAP_BINS, load_utilization, summarize
+
 from .forms import MasterRegistrationForm
+from .mixins import get_master_profile
 from .models import MasterProfile
 
 
+UTILIZATION_WIDGET_DAYS = 28
+
+
+def utilization_widget(profile, today):
+    """Weekly utilization and idle gaps of the last four weeks, in percent and counts."""
+    first_day = today - timedelta(days=UTILIZATION_WIDGET_DAYS - 1)
+    report = summarize(load_utilization([profile], first_day, today))
+    labels = [f"{low}–{high} мин" for low, high in zip(GAP_BINS, GAP_BINS[1:])] + [f"от {GAP_BINS[-1]} мин"]
+    return {
+        "percent": round(report["utilization"] * 100),
+        "weeks": [
+            {"week_start": week["week_start"], "percent": round(week["utilization"] * 100)} for week in report["weeks"]
+        ],
+        "gaps": [{"label": label, "count": count} for label, count in zip(labels, report["gaps"]["counts"])],
+    }
+
+
 class MasterRegistrationView(View):
     template_name = "masters/register_master.html"
     success_url = reverse_lazy("masters:dashboard")
@@ -34,7 +58,7 @@ class MasterDashboardView(View):
             form = self.form_class(request=request)
             return render(request, self.template_name, {"login_form": form})
 
-        profile = getattr(request.user, "masterprofile", None)
+        profile = get_master_profile(request)
         if not profile:
             return redirect("masters:register")
 
@@ -43,6 +67,13 @@ class MasterDashboardView(View):
             "is_pending": profile.status == MasterProfile.Status.PENDING,
             "is_active": profile.status == MasterProfile.Status.ACTIVE,
         }
+        if context["is_active"]:
+            today = timezone.localdate()
+            context["utilization"] = calendar_cache.get_or_compute(
+                profile.pk,
+                calendar_cache.make_name("dashboard:utilization", today),
+                lambda: utilization_widget(profile, today),
+            )
         return render(request, self.template_name, context)
 
     def post(self, request):